@@ -23,6 +23,8 @@ from .data.text_featurizer import TextFeaturizer
 
 # layers
 from .layers.functional import make_positional_encoding
+from .layers.functional import positional_encoding
+from .layers.functional import relative_positional_encoding
 from .layers.functional import collapse4d
 from .layers.functional import gelu
 from .layers.commons import PositionalEncoding
@@ -53,8 +55,13 @@ from .solver import HorovodSolver
 from .solver import DecoderSolver
 from .loss import CTCLoss
 from .loss import Seq2SeqSparseCategoricalCrossentropy
+from .loss import sparse_categorical_crossentropy
+from .loss import Seq2SeqSampledSoftmaxCrossentropy
+from .loss import sampled_softmax_crossentropy
+from .metrics import CharactorAccuracy
 from .metrics import CTCAccuracy
 from .metrics import Seq2SeqSparseCategoricalAccuracy
+from .metrics import ErrorRate
 
 # utils
 from .utils.checkpoint import Checkpoint
@@ -67,6 +74,9 @@ from .utils.hparam import HParams, register_and_parse_hparams
 from .utils.misc import generate_square_subsequent_mask
 from .utils.misc import get_wave_file_length
 from .utils.misc import set_default_summary_writer
+from .utils.misc import make_dummy_samples
+from .utils.misc import edit_distance
 
 # tools
 from .tools.beam_search import BeamSearchDecoder
+from .tools.inference import build_inference_module
@@ -0,0 +1,116 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# Only support tensorflow 2.0
+# pylint: disable=invalid-name, no-member
+r""" benchmark ScaledDotProductAttention against ChunkedScaledDotProductAttention
+
+    python athena/attention_benchmark.py [chunk_size] [seq_len ...]
+
+For each sequence length, the forward and backward passes of both layers are timed
+on random self-attention inputs with a padding mask (batch 8, 8 heads, depth 64 as
+in the default SpeechTransformer). The peak device memory is reported when
+tensorflow can measure it (GPU with tensorflow 2.5 or later), the size of the
+largest attention intermediate otherwise. OOM is reported for lengths a layer
+cannot fit.
+"""
+import sys
+import time
+import tensorflow as tf
+from absl import logging
+from athena.layers.attention import (
+    ScaledDotProductAttention,
+    ChunkedScaledDotProductAttention
+)
+
+BATCH_SIZE = 8
+NUM_HEADS = 8
+DEPTH = 64
+NUM_RUNS = 5
+
+
+def peak_memory_mb():
+    """ the peak memory of the first GPU since the last reset, None if unknown """
+    try:
+        return tf.config.experimental.get_memory_info("GPU:0")["peak"] / 1024 / 1024
+    except (AttributeError, ValueError):
+        return None
+
+
+def reset_peak_memory():
+    """ reset the peak memory of the first GPU if possible """
+    try:
+        tf.config.experimental.reset_memory_stats("GPU:0")
+    except (AttributeError, ValueError):
+        pass
+
+
+def benchmark(attention, seq_len):
+    """ time the forward and backward passes of attention over seq_len
+    returns: seconds per run and the peak memory in MB (None if unknown)
+    """
+    q = tf.random.normal([BATCH_SIZE, NUM_HEADS, seq_len, DEPTH])
+    k = tf.random.normal([BATCH_SIZE, NUM_HEADS, seq_len, DEPTH])
+    v = tf.random.normal([BATCH_SIZE, NUM_HEADS, seq_len, DEPTH])
+    lengths = tf.random.uniform([BATCH_SIZE], seq_len // 2, seq_len + 1, dtype=tf.int32)
+    mask = 1.0 - tf.sequence_mask(lengths, seq_len, dtype=tf.float32)
+    mask = mask[:, tf.newaxis, tf.newaxis, :]
+
+    @tf.function
+    def step(q, k, v, mask):
+        with tf.GradientTape() as tape:
+            tape.watch([q, k, v])
+            output, _ = attention(q, k, v, mask)
+            loss = tf.reduce_sum(output)
+        return tape.gradient(loss, [q, k, v])
+
+    step(q, k, v, mask)  # trace
+    reset_peak_memory()
+    start = time.time()
+    for _ in range(NUM_RUNS):
+        grads = step(q, k, v, mask)
+    grads[0].numpy()
+    return (time.time() - start) / NUM_RUNS, peak_memory_mb()
+
+
+def run_benchmark(chunk_size, seq_lens):
+    """ print a markdown table comparing both layers """
+    layers = [
+        ("full", ScaledDotProductAttention(), lambda t: t * t),
+        ("chunked-{}".format(chunk_size),
+         ChunkedScaledDotProductAttention(chunk_size, chunk_size),
+         lambda t: chunk_size * chunk_size),
+    ]
+    print("attention | seq_len | sec/iter | peak memory (MB) | largest logits (MB) |")
+    print(":-------:|:-------:|:-------:|:-------:|:-------:|")
+    for seq_len in seq_lens:
+        for name, attention, num_logits in layers:
+            logits_mb = BATCH_SIZE * NUM_HEADS * num_logits(seq_len) * 4 / 1024 / 1024
+            try:
+                sec_per_iter, peak_mb = benchmark(attention, seq_len)
+                sec_per_iter = "%.4f" % sec_per_iter
+                peak_mb = "n/a" if peak_mb is None else "%.1f" % peak_mb
+            except tf.errors.ResourceExhaustedError:
+                sec_per_iter, peak_mb = "OOM", "OOM"
+            print("%s | %d | %s | %s | %.1f |"
+                  % (name, seq_len, sec_per_iter, peak_mb, logits_mb), flush=True)
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    CHUNK_SIZE = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    SEQ_LENS = [int(n) for n in sys.argv[2:]] if len(sys.argv) > 2 else [256, 1024, 4096]
+    run_benchmark(CHUNK_SIZE, SEQ_LENS)
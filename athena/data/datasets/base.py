@@ -21,6 +21,7 @@ from absl import logging
 import tensorflow as tf
 
 from ...utils.data_queue import DataQueue
+from ...transform.feats.read_audio import split_archive_path
 
 def data_loader(dataset_builder, batch_size=16, num_threads=1):
     """ dataloader
@@ -52,13 +53,13 @@ def data_loader(dataset_builder, batch_size=16, num_threads=1):
     dataset = tf.compat.v2.data.Dataset.from_generator(
         _gen_data,
         output_types=dataset_builder.sample_type,
-        output_shapes=dataset_builder.sample_shape,
+        output_shapes=dataset_builder.generator_shape,
     )
 
     # Padding the features to its max length dimensions.
     dataset = dataset.padded_batch(
         batch_size=batch_size,
-        padded_shapes=dataset_builder.sample_shape,
+        padded_shapes=dataset_builder.generator_shape,
         drop_remainder=True,
     )
 
@@ -100,6 +101,18 @@ class BaseDatasetBuilder:
         """ examples signature """
         raise NotImplementedError
 
+    @property
+    def generator_shape(self):
+        """ shapes of the examples before batching, which differ from sample_shape
+        only if batch_transform changes them after batching
+        """
+        return self.sample_shape
+
+    @property
+    def batch_transform(self):
+        """ a function applied by the solver on each batch before the model, or None """
+        return None
+
     def as_dataset(self, batch_size=16, num_threads=1):
         """ return tf.data.Dataset object """
         return data_loader(self, batch_size, num_threads)
@@ -123,6 +136,7 @@ class BaseDatasetBuilder:
         Each data entry is in the format of (audio_file, file_size, transcript).
         If epoch_index is 0 and sortagrad is true, we don't perform shuffling and
         return entries in sorted file_size order. Otherwise, do batch_wise shuffling.
+        Batches from packed audio archives are grouped by archive shard.
 
         Args:
             batch_size: an integer for the batch size. default=64
@@ -133,6 +147,7 @@ class BaseDatasetBuilder:
         max_buckets = int(math.floor(len(self.entries) / batch_size))
         total_buckets = [i for i in range(max_buckets)]
         random.shuffle(total_buckets)
+        total_buckets = self.group_buckets_by_archive(total_buckets, batch_size)
         shuffled_entries = []
         for i in total_buckets:
             shuffled_entries.extend(self.entries[i * batch_size : (i + 1) * batch_size])
@@ -140,6 +155,24 @@ class BaseDatasetBuilder:
         self.entries = shuffled_entries
         return self
 
+    def group_buckets_by_archive(self, buckets, batch_size):
+        """Reorder shuffled buckets so that buckets whose audio lives in the same
+        packed archive are read one after another. The archives are visited in a
+        random order and the buckets of an archive keep their shuffled order, so
+        each shard is read in one pass and stays in the page cache meanwhile.
+        Buckets of plain audio files are left untouched.
+        """
+        if not self.entries or not isinstance(self.entries[0][0], str):
+            return buckets
+        archives = [split_archive_path(self.entries[i * batch_size][0])[0] for i in buckets]
+        if all(archive is None for archive in archives):
+            return buckets
+        archive_rank = {}
+        for archive in archives:
+            archive_rank.setdefault(archive, len(archive_rank))
+        order = sorted(range(len(buckets)), key=lambda i: archive_rank[archives[i]])
+        return [buckets[i] for i in order]
+
     # pylint: disable=unused-argument
     def compute_cmvn_if_necessary(self, is_necessary=True):
         """ vitural interface """
@@ -17,14 +17,20 @@
 """ audio dataset """
 
 import os
+import threading
+import collections
 from absl import logging
 import tensorflow as tf
 from athena.transform import AudioFeaturizer
+from athena.layers.commons import DeltaDelta
 from ...utils.hparam import register_and_parse_hparams
 from ..text_featurizer import TextFeaturizer
 from ..feature_normalizer import FeatureNormalizer
 from .base import BaseDatasetBuilder
 
+# the number of audio files whose features at the other speeds are kept in multi_speed
+MULTI_SPEED_CACHE_SIZE = 64
+
 
 class SpeechRecognitionDatasetBuilder(BaseDatasetBuilder):
     """ SpeechRecognitionDatasetBuilder
@@ -35,6 +41,10 @@ class SpeechRecognitionDatasetBuilder(BaseDatasetBuilder):
     Config::
         audio_config: the config file for feature extractor, default={'type':'Fbank'}
         vocab_file: the vocab file, default='data/utils/ch-en.vocab'
+        speed_permutation: the speeds of each audio file, default=[1.0]
+        multi_speed: featurize each audio file at all the speeds of speed_permutation
+          at once, reading and decoding it once, default=False. The speeds of a file
+          are then sorted next to each other
 
     Interfaces::
         __len__(self): return the number of data samples
@@ -55,6 +65,7 @@ class SpeechRecognitionDatasetBuilder(BaseDatasetBuilder):
         "input_length_range": [20, 50000],
         "output_length_range": [1, 10000],
         "speed_permutation": [1.0],
+        "multi_speed": False,
     }
 
     def __init__(self, config=None):
@@ -67,6 +78,13 @@ class SpeechRecognitionDatasetBuilder(BaseDatasetBuilder):
         self.audio_featurizer = AudioFeaturizer(self.hparams.audio_config)
         self.feature_normalizer = FeatureNormalizer(self.hparams.cmvn_file)
         self.text_featurizer = TextFeaturizer(self.hparams.text_config)
+        # Fbank with static_only leaves the deltas to be computed after batching
+        self.delta_layer = None
+        if self.audio_featurizer.batch_delta is not None:
+            self.delta_layer = DeltaDelta(*self.audio_featurizer.batch_delta)
+        # the features of the speeds not yet read, by audio file, for multi_speed
+        self.speed_cache = collections.OrderedDict()
+        self.speed_cache_lock = threading.Lock()
 
     def reload_config(self, config):
         """ reload the config """
@@ -114,7 +132,12 @@ class SpeechRecognitionDatasetBuilder(BaseDatasetBuilder):
                     float(wav_len) / float(speed), transcripts, speed, speaker
                 ]))
 
-        self.entries.sort(key=lambda item: float(item[1]))
+        if self.hparams.multi_speed:
+            # by the original length, the speeds of a file following each other
+            wav_lengths = {wav_filename: float(wav_len) for wav_filename, wav_len, _, _ in entries}
+            self.entries.sort(key=lambda item: (wav_lengths[item[0]], item[0]))
+        else:
+            self.entries.sort(key=lambda item: float(item[1]))
 
         # apply some filter
         self.filter_sample_by_unk()
@@ -128,7 +151,10 @@ class SpeechRecognitionDatasetBuilder(BaseDatasetBuilder):
 
     def __getitem__(self, index):
         audio_data, _, transcripts, speed, speaker = self.entries[index]
-        feat = self.audio_featurizer(audio_data, speed=speed)
+        if self.hparams.multi_speed and len(self.hparams.speed_permutation) > 1:
+            feat = self.featurize_multi_speed(audio_data, speed)
+        else:
+            feat = self.audio_featurizer(audio_data, speed=speed)
         feat = self.feature_normalizer(feat, speaker)
         feat_length = feat.shape[0]
 
@@ -141,6 +167,42 @@ class SpeechRecognitionDatasetBuilder(BaseDatasetBuilder):
             "output": label,
         }
 
+    def featurize_multi_speed(self, audio_file, speed):
+        """ the features of audio_file at speed. On the first of its speeds, the file is
+        featurized at all the speeds of speed_permutation by one multi-speed op, the
+        others being cached until their entries are read. Only the last
+        MULTI_SPEED_CACHE_SIZE files are cached, an evicted speed is featurized again
+        """
+        with self.speed_cache_lock:
+            feats = self.speed_cache.get(audio_file)
+            if feats is not None and speed in feats:
+                feat = feats.pop(speed)
+                if not feats:
+                    del self.speed_cache[audio_file]
+                return feat
+        speeds = self.hparams.speed_permutation
+        feats = dict(zip(speeds, self.audio_featurizer.multi_speed(audio_file, speeds)))
+        feat = feats.pop(speed)
+        with self.speed_cache_lock:
+            self.speed_cache[audio_file] = feats
+            while len(self.speed_cache) > MULTI_SPEED_CACHE_SIZE:
+                self.speed_cache.popitem(last=False)
+        return feat
+
+    def featurize(self, audio, sample_rate=None, speaker="global"):
+        """ the normalized features of an audio file, or of waveform samples in int16
+        scale, as a batch of 1 sample with the batch_transform applied, ready for the
+        inference of a model without transcripts
+        """
+        feat = self.feature_normalizer(self.audio_featurizer(audio, sample_rate), speaker)
+        samples = {
+            "input": feat[tf.newaxis],
+            "input_length": tf.shape(feat, out_type=tf.int32)[:1],
+        }
+        if self.batch_transform is not None:
+            samples = self.batch_transform(samples)
+        return samples
+
     def __len__(self):
         """ return the number of data samples """
         return len(self.entries)
@@ -169,10 +231,17 @@ class SpeechRecognitionDatasetBuilder(BaseDatasetBuilder):
             "output": tf.int32,
         }
 
+    @property
+    def num_channels(self):
+        """ return the number of feature channels the model sees """
+        if self.delta_layer is not None:
+            return self.delta_layer.order + 1
+        return self.audio_featurizer.num_channels
+
     @property
     def sample_shape(self):
         dim = self.audio_featurizer.dim
-        nc = self.audio_featurizer.num_channels
+        nc = self.num_channels
         return {
             "input": tf.TensorShape([None, dim, nc]),
             "input_length": tf.TensorShape([]),
@@ -180,10 +249,28 @@ class SpeechRecognitionDatasetBuilder(BaseDatasetBuilder):
             "output": tf.TensorShape([None]),
         }
 
+    @property
+    def generator_shape(self):
+        shape = self.sample_shape
+        shape["input"] = tf.TensorShape(
+            [None, self.audio_featurizer.dim, self.audio_featurizer.num_channels])
+        return shape
+
+    @property
+    def batch_transform(self):
+        if self.delta_layer is None:
+            return None
+        return self.compute_batch_delta
+
+    def compute_batch_delta(self, samples):
+        """ compute the deltas of batched static features """
+        samples["input"] = self.delta_layer(samples["input"], samples["input_length"])
+        return samples
+
     @property
     def sample_signature(self):
         dim = self.audio_featurizer.dim
-        nc = self.audio_featurizer.num_channels
+        nc = self.num_channels
         return (
             {
                 "input": tf.TensorSpec(shape=(None, None, dim, nc), dtype=tf.float32),
@@ -160,14 +160,18 @@ class SpeechDatasetBuilder(BaseDatasetBuilder):
 
     @property
     def sample_signature(self):
+        dim = self.audio_featurizer.dim
+        nc = self.audio_featurizer.num_channels
         return (
             {
                 "input": tf.TensorSpec(
-                    shape=(None, None, None, None), dtype=tf.float32
+                    shape=(None, None, dim, nc), dtype=tf.float32
                 ),
                 "input_length": tf.TensorSpec(shape=([None]), dtype=tf.int32),
                 "output": tf.TensorSpec(shape=(None, None, None), dtype=tf.float32),
                 "output_length": tf.TensorSpec(shape=([None]), dtype=tf.int32),
+                # the compact mask of MaskedPredictCoding.prepare_samples
+                "mpc_mask": tf.TensorSpec(shape=(None, None), dtype=tf.float32),
             },
         )
 
@@ -32,7 +32,8 @@ def decode(jsonfile):
     """ entry point for model decoding, do some preparation work """
     p, model, _, checkpointer, dataset_builder = build_model_from_jsonfile(jsonfile, 0)
     checkpointer.restore_from_best()
-    solver = DecoderSolver(model, config=p.decode_config)
+    solver = DecoderSolver(model, config=p.decode_config,
+                           batch_transform=dataset_builder.batch_transform)
     dataset_builder = dataset_builder.load_csv(p.test_csv).compute_cmvn_if_necessary(True)
     solver.decode(dataset_builder.as_dataset(batch_size=1))
 
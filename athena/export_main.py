@@ -0,0 +1,83 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# Only support tensorflow 2.0
+# pylint: disable=invalid-name, no-member
+r""" export a trained model as a SavedModel for serving
+
+    python athena/export_main.py config.json export_dir [--tflite] [max_frames]
+
+The model of the json config is restored from the best checkpoint and exported with
+the signatures of athena/tools/inference.py: encode, decode_step (SpeechTransformer
+and MtlTransformerCtc), greedy_decode and beam_decode. The beam size is the one of
+decode_config. The SavedModel holds the model only, it is loaded without the
+dataset, the optimizer or the model code:
+
+    model = tf.saved_model.load(export_dir)
+    outputs = model.signatures["greedy_decode"](input=feats, input_length=lengths)
+
+With --tflite, encode and decode_steps are also converted by athena/tools/tflite.py
+to export_dir/encode.tflite and export_dir/decode_steps.tflite, for one utterance
+padded to max_frames frames (default 3000), with the tensorflow ops unsupported by
+TFLite kept as select ops.
+"""
+import os
+import sys
+import tensorflow as tf
+from absl import logging
+from athena.main import build_model_from_jsonfile
+from athena.tools.inference import build_inference_module
+from athena.tools.tflite import static_signatures, convert, MAX_FRAMES
+
+
+def convert_to_tflite(export_dir, max_frames=MAX_FRAMES):
+    """ convert the encode and decode_steps signatures of the SavedModel in export_dir
+    to TFLite models in export_dir
+    """
+    functions = static_signatures(tf.saved_model.load(export_dir), max_frames)
+    for key, function in functions.items():
+        tflite_file = os.path.join(export_dir, "{}.tflite".format(key))
+        convert(function, tflite_file)
+        logging.info("converted %s to %s" % (key, tflite_file))
+
+
+def export(jsonfile, export_dir, tflite=False, max_frames=MAX_FRAMES):
+    """ restore the best checkpoint of the model in jsonfile and export it """
+    p, model, _, checkpointer, dataset_builder = build_model_from_jsonfile(jsonfile)
+    checkpointer.restore_from_best()
+    decode_config = p.decode_config if p.decode_config is not None else {}
+    module = build_inference_module(
+        model,
+        dataset_builder.sample_signature[0]["input"],
+        beam_size=decode_config.get("beam_size", 4),
+    )
+    tf.saved_model.save(module, export_dir, signatures=module.signatures())
+    logging.info("exported %s to %s" % (sorted(module.signatures()), export_dir))
+    if tflite:
+        convert_to_tflite(export_dir, max_frames)
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    tf.random.set_seed(1)
+    if len(sys.argv) < 3:
+        logging.warning(
+            "Usage: python {} config.json export_dir [--tflite] [max_frames]".format(sys.argv[0]))
+        sys.exit()
+    TFLITE = "--tflite" in sys.argv[3:]
+    ARGS = [arg for arg in sys.argv[3:] if arg != "--tflite"]
+    MAX_FRAMES_ARG = int(ARGS[0]) if ARGS else MAX_FRAMES
+    export(sys.argv[1], sys.argv[2], TFLITE, MAX_FRAMES_ARG)
@@ -0,0 +1,58 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# Only support tensorflow 2.0
+# pylint: disable=invalid-name, no-member
+r""" convert a checkpoint to fused attention projections
+
+The model of the json config is built without fused_projection and restored from
+the latest checkpoint in its ckpt directory. The wq, wk and wv projections of all
+its MultiHeadAttention layers are then fused and the model is saved into
+output_ckpt_dir, which can be used as the ckpt of the same config with
+"fused_projection": true in model_config. The optimizer slots of the fused
+kernels start from zero.
+"""
+import sys
+import tensorflow as tf
+from absl import logging
+from athena import MultiHeadAttention, Checkpoint
+from athena.main import build_model_from_jsonfile
+
+
+def fuse_attention(jsonfile, output_ckpt_dir):
+    """ fuse the attention projections of the model in jsonfile and save it """
+    _, model, optimizer, _, _ = build_model_from_jsonfile(jsonfile)
+    num_layers = 0
+    for layer in model.submodules:
+        if isinstance(layer, MultiHeadAttention) and not layer.fused_projection:
+            layer.fuse_projection()
+            num_layers += 1
+    logging.info("fused the projections of %d attention layers" % num_layers)
+    checkpointer = Checkpoint(
+        checkpoint_directory=output_ckpt_dir,
+        model=model,
+        optimizer=optimizer,
+    )
+    checkpointer()
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    tf.random.set_seed(1)
+    if len(sys.argv) < 3:
+        logging.warning("Usage: python {} config.json output_ckpt_dir".format(sys.argv[0]))
+        sys.exit()
+    fuse_attention(sys.argv[1], sys.argv[2])
@@ -0,0 +1,119 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# Only support tensorflow 2.0
+# pylint: disable=invalid-name, no-member
+r""" benchmark the training time of 1 epoch against the number of Horovod workers
+
+This reproduces the table of docs/TheTrainningEfficiency.md with local CPU worker
+processes, so that scaling regressions can be measured without a GPU cluster:
+
+    python athena/horovod_benchmark.py examples/asr/hkust/transformer.json 1 2 4
+
+For each number of workers, horovodrun launches the workers on localhost, each
+trains on its shard of train_csv for 1 epoch with the CPU cores split evenly
+between the workers. The time of the slowest worker, the speedup and the scaling
+efficiency against the first run are printed as a markdown table.
+"""
+import os
+import re
+import sys
+import json
+import time
+import subprocess
+import tensorflow as tf
+import horovod.tensorflow as hvd
+from absl import logging
+from athena import HorovodSolver
+from athena.main import parse_config, build_model_from_jsonfile
+
+EPOCH_TIME_PATTERN = re.compile(r"EPOCH_TIME (\d+(?:\.\d*)?)")
+
+
+def run_worker(jsonfile, num_threads):
+    """ train 1 epoch as a Horovod worker and print the time of the slowest worker """
+    tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(num_threads)
+    tf.random.set_seed(1)
+    with open(jsonfile) as file:
+        p = parse_config(json.load(file))
+    HorovodSolver.initialize_devices(solver_config=p.solver_config)
+    p, model, optimizer, _, dataset_builder = build_model_from_jsonfile(jsonfile, hvd.rank())
+    dataset_builder.load_csv(p.train_csv).compute_cmvn_if_necessary(hvd.rank() == 0)
+    solver = HorovodSolver(
+        model,
+        optimizer,
+        sample_signature=dataset_builder.sample_signature,
+        config=p.solver_config,
+        batch_transform=dataset_builder.batch_transform,
+    )
+    dataset_builder.load_csv(p.train_csv).shard(hvd.size(), hvd.rank())
+    dataset = dataset_builder.as_dataset(p.batch_size, p.num_data_threads)
+    start = time.time()
+    solver.train(dataset)
+    elapsed = hvd.allgather(tf.constant([time.time() - start], dtype=tf.float64))
+    if hvd.rank() == 0:
+        print("EPOCH_TIME {:.3f}".format(float(tf.reduce_max(elapsed))), flush=True)
+
+
+def run_benchmark(jsonfile, workers_list):
+    """ run 1 epoch for each number of workers and print the scaling table """
+    num_cores = os.cpu_count()
+    epoch_times = []
+    for num_workers in workers_list:
+        logging.info("training 1 epoch with {} workers".format(num_workers))
+        command = [
+            "horovodrun", "-np", str(num_workers), "-H", "localhost:{}".format(num_workers),
+            sys.executable, os.path.abspath(__file__), "--worker", jsonfile,
+            str(max(num_cores // num_workers, 1))
+        ]
+        env = dict(os.environ, CUDA_VISIBLE_DEVICES="")
+        output = subprocess.run(
+            command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True, check=True
+        ).stdout
+        matched = EPOCH_TIME_PATTERN.search(output)
+        if matched is None:
+            raise RuntimeError("no epoch time in the output of {} workers:\n{}".format(
+                num_workers, output))
+        epoch_times.append(float(matched.group(1)))
+        logging.info("{} workers: {:.3f}s/1 epoch".format(num_workers, epoch_times[-1]))
+
+    columns = ["1S-{}CPU{}".format(n, "s" if n > 1 else "") for n in workers_list]
+    speedups = [epoch_times[0] / epoch_time for epoch_time in epoch_times]
+    efficiencies = [
+        speedup * workers_list[0] / num_workers
+        for speedup, num_workers in zip(speedups, workers_list)
+    ]
+    print("Server and CPU worker number | " + " | ".join(columns) + " |")
+    print(":-------:|" + ":-------:|" * len(columns))
+    print("training time(s/1 epoch) | "
+          + " | ".join("{:.3f}".format(t) for t in epoch_times) + " |")
+    print("speedup | " + " | ".join("{:.2f}".format(s) for s in speedups) + " |")
+    print("scaling efficiency | "
+          + " | ".join("{:.2f}".format(e) for e in efficiencies) + " |")
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        run_worker(sys.argv[2], int(sys.argv[3]))
+        sys.exit()
+    if len(sys.argv) < 3:
+        logging.warning(
+            "Usage: python {} config.json num_workers [num_workers ...]".format(sys.argv[0]))
+        sys.exit()
+    run_benchmark(sys.argv[1], [int(n) for n in sys.argv[2:]])
@@ -34,5 +34,5 @@ if __name__ == "__main__":
     with open(JSON_FILE) as f:
         CONFIG = json.load(f)
     PARAMS = parse_config(CONFIG)
-    HorovodSolver.initialize_devices()
+    HorovodSolver.initialize_devices(solver_config=PARAMS.solver_config)
     train(JSON_FILE, HorovodSolver, hvd.size(), hvd.local_rank())
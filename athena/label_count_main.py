@@ -0,0 +1,81 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# Only support tensorflow 2.0
+# pylint: disable=invalid-name, no-member
+r""" count the labels of a csv for the sampled softmax
+
+    python athena/label_count_main.py config.json data_csv_file output_file
+
+The labels of data_csv_file are encoded with the vocabulary of the dataset_config
+and counted. output_file holds one count per line in the order of the labels, and
+the number of sequences last as the count of eos. It is used as "unigram_counts" in
+the model_config of SpeechTransformer, MtlTransformerCtc or RNNLM, so that the
+sampled classes follow the label frequencies. The number of the most frequent
+labels covering 50%, 80%, 95% and 99% of the tokens is logged.
+"""
+import sys
+import json
+import numpy as np
+from absl import logging
+from athena.main import parse_config, SUPPORTED_DATASET_BUILDER
+
+COVERAGES = [0.5, 0.8, 0.95, 0.99]
+
+
+def count_labels(dataset_builder):
+    """ count the output labels of all the samples in dataset_builder
+    returns: the counts with shape [num_class] and the number of sequences
+    """
+    counts = np.zeros([dataset_builder.num_class], dtype=np.int64)
+    text_featurizer = getattr(dataset_builder, "text_featurizer", None)
+    for index, entry in enumerate(dataset_builder.entries):
+        if text_featurizer is not None:
+            # avoid computing the features of speech samples
+            labels = text_featurizer.encode(entry[2])
+        else:
+            labels = dataset_builder[index]["output"]
+        np.add.at(counts, np.asarray(labels, dtype=np.int64), 1)
+    return counts, len(dataset_builder.entries)
+
+
+def log_coverages(counts):
+    """ log the number of the most frequent labels covering COVERAGES of the tokens """
+    cumulative = np.cumsum(np.sort(counts)[::-1]) / max(np.sum(counts), 1)
+    for coverage in COVERAGES:
+        num_labels = int(np.searchsorted(cumulative, coverage)) + 1
+        logging.info("{} of {} labels cover {:.0%} of the tokens".format(
+            min(num_labels, len(counts)), len(counts), coverage))
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    if len(sys.argv) < 4:
+        logging.warning(
+            "Usage: python {} config.json data_csv_file output_file".format(sys.argv[0]))
+        sys.exit()
+    with open(sys.argv[1]) as file:
+        p = parse_config(json.load(file))
+    if p.dataset_config is not None and "speed_permutation" in p.dataset_config:
+        p.dataset_config["speed_permutation"] = [1.0]
+    builder = SUPPORTED_DATASET_BUILDER[p.dataset_builder](p.dataset_config)
+    builder.load_csv(sys.argv[2])
+    label_counts, num_sequences = count_labels(builder)
+    log_coverages(label_counts)
+    with open(sys.argv[3], "w") as output_file:
+        for label_count in label_counts:
+            output_file.write("{}\n".format(label_count))
+        output_file.write("{}\n".format(num_sequences))
@@ -34,7 +34,8 @@ class ScaledDotProductAttention(tf.keras.layers.Layer):
         k: key shape == (..., seq_len_k, depth)
         v: value shape == (..., seq_len_v, depth_v)
         mask: Float tensor with shape broadcastable
-          to (..., seq_len_q, seq_len_k). Defaults to None.
+          to (..., seq_len_q, seq_len_k). Defaults to None. It is added to the
+          logits in float32 whatever the dtype of q, k and v.
 
     Returns:
         output, attention_weights
@@ -43,6 +44,8 @@ class ScaledDotProductAttention(tf.keras.layers.Layer):
     def call(self, q, k, v, mask):
         """This is where the layer's logic lives."""
         matmul_qk = tf.matmul(q, k, transpose_b=True)  # (..., seq_len_q, seq_len_k)
+        # the logits and softmax stay in float32 under mixed precision
+        matmul_qk = tf.cast(matmul_qk, tf.float32)
 
         # scale matmul_qk
         dk = tf.cast(tf.shape(k)[-1], tf.float32)
@@ -57,11 +60,110 @@ class ScaledDotProductAttention(tf.keras.layers.Layer):
         # (..., seq_len_q, seq_len_k)
         attention_weights = tf.nn.softmax(scaled_attention_logits, axis=-1)
 
-        output = tf.matmul(attention_weights, v)  # (..., seq_len_q, depth_v)
+        # (..., seq_len_q, depth_v)
+        output = tf.matmul(tf.cast(attention_weights, v.dtype), v)
 
         return output, attention_weights
 
 
+class ChunkedScaledDotProductAttention(tf.keras.layers.Layer):
+    """Calculate the same attention as ScaledDotProductAttention in chunks, without
+    ever storing the full (..., seq_len_q, seq_len_k) logits.
+
+    The queries are split into chunks of query_chunk_size. For each query chunk,
+    the keys are visited in chunks of key_chunk_size with an online softmax: the
+    running max of the logits, the running sum of their exponentials and the
+    weighted sum of the values are rescaled whenever the max grows. The gradients
+    of a query chunk are computed by recomputing its forward pass, so the memory
+    grows with seq_len_q * key_chunk_size rather than seq_len_q * seq_len_k.
+
+    Args:
+        q: query shape == (batch_size, num_heads, seq_len_q, depth)
+        k: key shape == (batch_size, num_heads, seq_len_k, depth)
+        v: value shape == (batch_size, num_heads, seq_len_v, depth_v)
+        mask: Float tensor with shape broadcastable to
+          (batch_size, num_heads, seq_len_q, seq_len_k), whose last dim is seq_len_k.
+          Defaults to None.
+
+    Returns:
+        output, None as the attention weights are not materialized
+    """
+
+    def __init__(self, query_chunk_size=128, key_chunk_size=128):
+        super().__init__()
+        self.query_chunk_size = query_chunk_size
+        self.key_chunk_size = key_chunk_size
+
+    def call(self, q, k, v, mask):
+        """This is where the layer's logic lives."""
+        shape = tf.shape(q)
+        batch_size, num_heads, q_len, depth = shape[0], shape[1], shape[2], shape[3]
+        k_len = tf.shape(k)[2]
+        query_chunk, key_chunk = self.query_chunk_size, self.key_chunk_size
+        num_q_chunks = (q_len + query_chunk - 1) // query_chunk
+        num_k_chunks = (k_len + key_chunk - 1) // key_chunk
+
+        # pad to whole chunks, the padded keys are masked and the padded queries dropped
+        q = q / tf.cast(tf.math.sqrt(tf.cast(depth, tf.float32)), q.dtype)
+        q = tf.pad(q, [[0, 0], [0, 0], [0, num_q_chunks * query_chunk - q_len], [0, 0]])
+        k_paddings = [[0, 0], [0, 0], [0, num_k_chunks * key_chunk - k_len], [0, 0]]
+        k = tf.pad(k, k_paddings)
+        v = tf.pad(v, k_paddings)
+        if mask is None:
+            mask = tf.zeros([1, 1, 1, k_len], dtype=tf.float32)
+        mask = tf.cast(mask, tf.float32)
+        # a mask of lower rank, e.g. the 2-D look-ahead mask, broadcasts over the leading dims
+        for _ in range(4 - len(mask.shape)):
+            mask = mask[tf.newaxis]
+        mask = tf.pad(mask, [[0, 0], [0, 0], [0, 0], k_paddings[2]], constant_values=1.0)
+
+        # (num_q_chunks, batch_size, num_heads, query_chunk, depth)
+        q_chunks = tf.reshape(q, [batch_size, num_heads, num_q_chunks, query_chunk, depth])
+        q_chunks = tf.transpose(q_chunks, perm=[2, 0, 1, 3, 4])
+        starts = tf.range(num_q_chunks) * query_chunk
+        attend = tf.recompute_grad(self.attend_query_chunk)
+        outputs = tf.map_fn(
+            lambda elems: attend(elems[0], elems[1], k, v, mask),
+            (q_chunks, starts),
+            dtype=tf.float32,
+        )
+        # (batch_size, num_heads, seq_len_q, depth_v)
+        outputs = tf.transpose(outputs, perm=[1, 2, 0, 3, 4])
+        outputs = tf.reshape(outputs, [batch_size, num_heads, -1, tf.shape(v)[-1]])
+        return tf.cast(outputs[:, :, :q_len], v.dtype), None
+
+    def attend_query_chunk(self, q, start, k, v, mask):
+        """ attend a chunk of scaled queries starting at start to all the keys """
+        # the rows of a mask broadcast over the queries are all the same
+        rows = tf.minimum(tf.range(start, start + self.query_chunk_size), tf.shape(mask)[2] - 1)
+        mask = tf.gather(mask, rows, axis=2)
+        shape = tf.shape(q)
+        max_logits = tf.fill([shape[0], shape[1], shape[2], 1], float("-inf"))
+        sum_exp = tf.zeros([shape[0], shape[1], shape[2], 1], dtype=tf.float32)
+        outputs = tf.zeros([shape[0], shape[1], shape[2], tf.shape(v)[-1]], dtype=tf.float32)
+        key_chunk = self.key_chunk_size
+
+        def attend_key_chunk(i, max_logits, sum_exp, outputs):
+            begin, end = i * key_chunk, (i + 1) * key_chunk
+            logits = tf.cast(tf.matmul(q, k[:, :, begin:end], transpose_b=True), tf.float32)
+            logits += mask[:, :, :, begin:end] * -1e9
+            new_max_logits = tf.maximum(max_logits, tf.reduce_max(logits, -1, keepdims=True))
+            weights = tf.exp(logits - new_max_logits)
+            correction = tf.exp(max_logits - new_max_logits)
+            sum_exp = sum_exp * correction + tf.reduce_sum(weights, -1, keepdims=True)
+            values = tf.matmul(tf.cast(weights, v.dtype), v[:, :, begin:end])
+            outputs = outputs * correction + tf.cast(values, tf.float32)
+            return i + 1, new_max_logits, sum_exp, outputs
+
+        num_k_chunks = tf.shape(k)[2] // key_chunk
+        _, _, sum_exp, outputs = tf.while_loop(
+            lambda i, *_: i < num_k_chunks,
+            attend_key_chunk,
+            [tf.constant(0), max_logits, sum_exp, outputs],
+        )
+        return outputs / sum_exp
+
+
 class MultiHeadAttention(tf.keras.layers.Layer):
     """ Multi-head attention
 
@@ -78,40 +180,88 @@ class MultiHeadAttention(tf.keras.layers.Layer):
     different representational spaces. After the split each head has a reduced dimensionality,
     so the total computation cost is the same as a single head attention with full
     dimensionality.
+
+    With fused_projection, the Q, K and V projections share one (d_model, 3 * d_model)
+    kernel. Self-attention then computes them in one GEMM and splits the heads of all
+    three with one transpose, and cross-attention computes K and V together from the
+    memory. fuse_projection() converts the weights of a layer built without it, see
+    athena/fuse_attention_main.py to convert checkpoints.
+
+    With attention_chunk_size > 0, the attention is computed by
+    ChunkedScaledDotProductAttention in chunks of that size, whose memory grows
+    linearly with the sequence length, and no attention weights are returned.
     """
 
-    def __init__(self, d_model, num_heads):
+    def __init__(self, d_model, num_heads, fused_projection=False, attention_chunk_size=0):
         super().__init__()
         self.num_heads = num_heads
         self.d_model = d_model
+        self.fused_projection = fused_projection
 
         assert d_model % self.num_heads == 0
 
         self.depth = d_model // self.num_heads
 
-        self.wq = tf.keras.layers.Dense(
+        if not fused_projection:
+            self.wq = tf.keras.layers.Dense(
+                d_model,
+                kernel_initializer=tf.compat.v1.truncated_normal_initializer(stddev=0.02),
+                input_shape=(d_model,),
+            )
+            self.wk = tf.keras.layers.Dense(
+                d_model,
+                kernel_initializer=tf.compat.v1.truncated_normal_initializer(stddev=0.02),
+                input_shape=(d_model,),
+            )
+            self.wv = tf.keras.layers.Dense(
+                d_model,
+                kernel_initializer=tf.compat.v1.truncated_normal_initializer(stddev=0.02),
+                input_shape=(d_model,),
+            )
+
+        if attention_chunk_size > 0:
+            self.attention = ChunkedScaledDotProductAttention(
+                attention_chunk_size, attention_chunk_size
+            )
+        else:
+            self.attention = ScaledDotProductAttention()
+
+        self.dense = tf.keras.layers.Dense(
             d_model,
             kernel_initializer=tf.compat.v1.truncated_normal_initializer(stddev=0.02),
             input_shape=(d_model,),
         )
-        self.wk = tf.keras.layers.Dense(
-            d_model,
-            kernel_initializer=tf.compat.v1.truncated_normal_initializer(stddev=0.02),
-            input_shape=(d_model,),
+
+    def build(self, input_shape):
+        if self.fused_projection:
+            self.add_fused_weights(
+                tf.compat.v1.truncated_normal_initializer(stddev=0.02), "zeros"
+            )
+        super().build(input_shape)
+
+    def add_fused_weights(self, kernel_initializer, bias_initializer):
+        """ add the fused kernel and bias of the Q, K and V projections """
+        self.qkv_kernel = self.add_weight(
+            "qkv_kernel", shape=(self.d_model, 3 * self.d_model),
+            initializer=kernel_initializer
         )
-        self.wv = tf.keras.layers.Dense(
-            d_model,
-            kernel_initializer=tf.compat.v1.truncated_normal_initializer(stddev=0.02),
-            input_shape=(d_model,),
+        self.qkv_bias = self.add_weight(
+            "qkv_bias", shape=(3 * self.d_model,), initializer=bias_initializer
         )
 
-        self.attention = ScaledDotProductAttention()
-
-        self.dense = tf.keras.layers.Dense(
-            d_model,
-            kernel_initializer=tf.compat.v1.truncated_normal_initializer(stddev=0.02),
-            input_shape=(d_model,),
+    def fuse_projection(self):
+        """ convert the separate wq, wk and wv projections of a built layer into the
+        fused kernel, the layer then computes the same outputs with fused_projection
+        """
+        if self.fused_projection:
+            return
+        kernel = tf.concat([self.wq.kernel, self.wk.kernel, self.wv.kernel], axis=-1)
+        bias = tf.concat([self.wq.bias, self.wk.bias, self.wv.bias], axis=-1)
+        del self.wq, self.wk, self.wv
+        self.add_fused_weights(
+            tf.constant_initializer(kernel.numpy()), tf.constant_initializer(bias.numpy())
         )
+        self.fused_projection = True
 
     def split_heads(self, x, batch_size):
         """Split the last dimension into (num_heads, depth).
@@ -121,17 +271,74 @@ class MultiHeadAttention(tf.keras.layers.Layer):
         x = tf.reshape(x, (batch_size, -1, self.num_heads, self.depth))
         return tf.transpose(x, perm=[0, 2, 1, 3])
 
+    def split_fused_heads(self, x, batch_size, num_splits):
+        """Split the last dimension of fused projections into (num_splits, num_heads, depth).
+
+        Transpose the result once such that the shape is
+        (num_splits, batch_size, num_heads, seq_len, depth)
+        """
+        x = tf.reshape(x, (batch_size, -1, num_splits, self.num_heads, self.depth))
+        return tf.transpose(x, perm=[2, 0, 3, 1, 4])
+
+    def project(self, v, k, q):
+        """ project v, k and q and split their heads to
+        (batch_size, num_heads, seq_len, depth)
+        """
+        batch_size = tf.shape(q)[0]
+        if not self.fused_projection:
+            q = self.split_heads(self.wq(q), batch_size)
+            k = self.split_heads(self.wk(k), batch_size)
+            v = self.split_heads(self.wv(v), batch_size)
+            return v, k, q
+        if q is k and k is v:
+            # self-attention: one GEMM for the three projections
+            qkv = tf.einsum("btd,de->bte", q, self.qkv_kernel) + self.qkv_bias
+            q, k, v = tf.unstack(self.split_fused_heads(qkv, batch_size, 3))
+            return v, k, q
+        # cross-attention: the query alone, the key and value together from the memory
+        d_model = self.d_model
+        q = tf.einsum("btd,de->bte", q, self.qkv_kernel[:, :d_model]) + self.qkv_bias[:d_model]
+        q = self.split_heads(q, batch_size)
+        if k is v:
+            kv = tf.einsum("btd,de->bte", k, self.qkv_kernel[:, d_model:])
+            kv = kv + self.qkv_bias[d_model:]
+            k, v = tf.unstack(self.split_fused_heads(kv, batch_size, 2))
+            return v, k, q
+        k = tf.einsum("btd,de->bte", k, self.qkv_kernel[:, d_model : 2 * d_model])
+        k = self.split_heads(k + self.qkv_bias[d_model : 2 * d_model], batch_size)
+        v = tf.einsum("btd,de->bte", v, self.qkv_kernel[:, 2 * d_model :])
+        v = self.split_heads(v + self.qkv_bias[2 * d_model :], batch_size)
+        return v, k, q
+
+    def call_with_cache(self, x, cache=None, mask=None):
+        """ self-attention of x over the cached keys and values of the previous inputs
+        followed by x, as used by streaming encoders. The layer must be built.
+
+        Args:
+            x: the new inputs, shape == (batch_size, seq_len, d_model)
+            cache: the (k, v) of the previous inputs, each of shape
+                (batch_size, num_heads, cache_len, depth), or None
+            mask: Float tensor broadcastable to (..., seq_len, cache_len + seq_len)
+
+        Returns:
+            output, the (k, v) of the previous inputs and x
+        """
+        batch_size = tf.shape(x)[0]
+        v, k, q = self.project(x, x, x)
+        if cache is not None:
+            k = tf.concat([cache[0], k], axis=2)
+            v = tf.concat([cache[1], v], axis=2)
+        scaled_attention, _ = self.attention(q, k, v, mask)
+        scaled_attention = tf.transpose(scaled_attention, perm=[0, 2, 1, 3])
+        concat_attention = tf.reshape(scaled_attention, (batch_size, -1, self.d_model))
+        return self.dense(concat_attention), (k, v)
+
     def call(self, v, k, q, mask):
         """ call function """
         batch_size = tf.shape(q)[0]
 
-        q = self.wq(q)  # (batch_size, seq_len, hiddn_dim)
-        k = self.wk(k)  # (batch_size, seq_len, hiddn_dim)
-        v = self.wv(v)  # (batch_size, seq_len, hiddn_dim)
-
-        q = self.split_heads(q, batch_size)  # (batch_size, num_heads, seq_len_q, depth)
-        k = self.split_heads(k, batch_size)  # (batch_size, num_heads, seq_len_k, depth)
-        v = self.split_heads(v, batch_size)  # (batch_size, num_heads, seq_len_v, depth)
+        # (batch_size, num_heads, seq_len, depth)
+        v, k, q = self.project(v, k, q)
 
         # scaled_attention.shape == (batch_size, num_heads, seq_len_q, depth)
         # attention_weights.shape == (batch_size, num_heads, seq_len_q, seq_len_k)
@@ -0,0 +1,60 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""The model tests the chunked attention against the full attention."""
+
+import tensorflow as tf
+from athena.layers.attention import (
+    ScaledDotProductAttention,
+    ChunkedScaledDotProductAttention,
+)
+from athena.utils.misc import generate_square_subsequent_mask
+
+
+class ChunkedScaledDotProductAttentionTest(tf.test.TestCase):
+    """
+        Outputs and gradients of the chunked attention against ScaledDotProductAttention,
+        with lengths which are not multiples of the chunk size.
+    """
+    def check_attention(self, q_len, k_len, mask):
+        tf.random.set_seed(1)
+        q = tf.random.normal([2, 3, q_len, 8])
+        k = tf.random.normal([2, 3, k_len, 8])
+        v = tf.random.normal([2, 3, k_len, 5])
+        results = []
+        for attention in [ScaledDotProductAttention(), ChunkedScaledDotProductAttention(4, 3)]:
+            with tf.GradientTape() as tape:
+                tape.watch([q, k, v])
+                output, _ = attention(q, k, v, mask)
+                loss = tf.reduce_sum(output * tf.range(5, dtype=tf.float32))
+            results.append([output] + tape.gradient(loss, [q, k, v]))
+        for expected, chunked in zip(*results):
+            self.assertAllClose(expected, chunked, atol=1e-5)
+
+    def test_no_mask(self):
+        self.check_attention(7, 10, None)
+
+    def test_padding_mask(self):
+        lengths = tf.constant([10, 6])
+        mask = 1.0 - tf.sequence_mask(lengths, 10, dtype=tf.float32)
+        self.check_attention(7, 10, mask[:, tf.newaxis, tf.newaxis, :])
+
+    def test_look_ahead_mask(self):
+        self.check_attention(9, 9, generate_square_subsequent_mask(9))
+
+
+if __name__ == "__main__":
+    tf.test.main()
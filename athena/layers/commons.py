@@ -18,26 +18,33 @@
 """Utils for common layers."""
 
 import tensorflow as tf
-from athena.layers.functional import make_positional_encoding, collapse4d, gelu
+from athena.layers.functional import positional_encoding, collapse4d, gelu
+from athena.layers.functional import positional_encoding_tensor
+from athena.layers.functional import delta_delta
 
 from athena.layers.functional import splice
 
 
 class PositionalEncoding(tf.keras.layers.Layer):
-    """ positional encoding can be used in transformer """
+    """ positional encoding can be used in transformer
 
-    def __init__(self, d_model, max_position=800, scale=False):
+    The encodings come from a table shared by all the layers of the same d_model,
+    which grows lazily, and longer inputs are encoded on the fly, so the input
+    length is not limited. max_position positions are precomputed up front.
+    """
+
+    def __init__(self, d_model, max_position=1024, scale=False):
         super().__init__()
         self.d_model = d_model
         self.scale = scale
-        self.pos_encoding = make_positional_encoding(max_position, d_model)
+        positional_encoding_tensor(max_position, d_model)
 
     def call(self, x):
         """ call function """
         seq_len = tf.shape(x)[1]
         if self.scale:
-            x *= tf.math.sqrt(tf.cast(self.d_model, tf.float32))
-        x += self.pos_encoding[:, :seq_len, :]
+            x *= tf.math.sqrt(tf.cast(self.d_model, x.dtype))
+        x += tf.cast(positional_encoding(seq_len, self.d_model), x.dtype)
         return x
 
 
@@ -50,6 +57,21 @@ class Collapse4D(tf.keras.layers.Layer):
         return collapse4d(x)
 
 
+class DeltaDelta(tf.keras.layers.Layer):
+    """ compute delta and delta-delta features of a padded batch, the same as
+    Fbank with delta_delta, which allows Fbank to emit static features only
+    reshape from [N T D 1] -> [N T D order+1]
+    """
+
+    def __init__(self, order=2, window=2, **kwargs):
+        super().__init__(**kwargs)
+        self.order = order
+        self.window = window
+
+    def call(self, x, x_length):
+        return delta_delta(x, x_length, self.order, self.window)
+
+
 class Gelu(tf.keras.layers.Layer):
     """Gaussian Error Linear Unit.
     This is a smoother version of the RELU.
@@ -22,15 +22,15 @@ from ..utils.misc import tensor_shape
 from tensorflow.python.framework import ops
 
 
-def make_positional_encoding(position, d_model):
-    """ generate a postional encoding list """
+def make_positional_encoding(position, d_model, start=0):
+    """ generate a postional encoding list of the positions [start, position) """
 
     def get_angles(pos, i, d_model):
         angle_rates = 1 / np.power(10000, (2 * (i // 2)) / np.float32(d_model))
         return pos * angle_rates
 
     angle_rads = get_angles(
-        np.arange(position)[:, np.newaxis], np.arange(d_model)[np.newaxis, :], d_model
+        np.arange(start, position)[:, np.newaxis], np.arange(d_model)[np.newaxis, :], d_model
     )
     angle_rads[:, 0::2] = np.sin(angle_rads[:, 0::2])
     angle_rads[:, 1::2] = np.cos(angle_rads[:, 1::2])
@@ -38,6 +38,126 @@ def make_positional_encoding(position, d_model):
     return tf.cast(pos_encoding, dtype=tf.float32)
 
 
+# the positional encoding tables shared by all layers, keyed by d_model, as numpy
+# arrays and as eager tensors on the default device rebuilt when a table grows
+POSITIONAL_ENCODING_TABLES = {}
+POSITIONAL_ENCODING_TENSORS = {}
+POSITIONAL_ENCODING_CHUNK = 1024
+
+
+def positional_encoding_table(length, d_model):
+    """ the shared positional encoding table of d_model covering at least length
+    positions, grown in chunks of POSITIONAL_ENCODING_CHUNK positions
+    returns: a float32 numpy array with shape [num_positions, d_model]
+    """
+    table = POSITIONAL_ENCODING_TABLES.get(d_model)
+    if table is None:
+        table = np.zeros([0, d_model], dtype=np.float32)
+    while len(table) < length:
+        chunk = make_positional_encoding(
+            len(table) + POSITIONAL_ENCODING_CHUNK, d_model, start=len(table)
+        ).numpy()[0]
+        table = np.concatenate([table, chunk], axis=0)
+    POSITIONAL_ENCODING_TABLES[d_model] = table
+    return table
+
+
+def positional_encoding_tensor(length, d_model):
+    """ the shared positional encoding table of positional_encoding_table as an eager
+    tensor, which is created once per size of the table, even while tracing, so
+    that the decoding steps and the traced graphs slice it instead of copying it
+    returns: a float32 tensor with shape [num_positions, d_model]
+    """
+    table = positional_encoding_table(length, d_model)
+    tensor = POSITIONAL_ENCODING_TENSORS.get(d_model)
+    if tensor is None or tensor.shape[0] != len(table):
+        with tf.init_scope():
+            # tf.identity places the host constant on the default device once
+            tensor = tf.identity(tf.constant(table))
+        POSITIONAL_ENCODING_TENSORS[d_model] = tensor
+    return tensor
+
+
+def compute_positional_encoding(positions, d_model):
+    """ compute the positional encoding of arbitrary float32 positions in graph
+    returns: a tensor with shape [len(positions), d_model]
+    """
+    i = np.arange(d_model)
+    angle_rates = 1 / np.power(10000, (2 * (i // 2)) / np.float32(d_model))
+    angle_rads = positions[:, tf.newaxis] * tf.constant(angle_rates, dtype=tf.float32)
+    return tf.where(i % 2 == 0, tf.sin(angle_rads), tf.cos(angle_rads))
+
+
+def positional_encoding(length, d_model):
+    """ the positional encoding of positions [0, length)
+
+    It is sliced from the shared table of d_model, which grows to cover length if
+    length is known when tracing, and it is computed in graph for longer inputs,
+    so there is no limit on length.
+    returns: a float32 tensor with shape [1, length, d_model]
+    """
+    static_length = tf.get_static_value(length)
+    table = positional_encoding_tensor(
+        static_length if static_length is not None else 0, d_model
+    )
+    pos_encoding = tf.cond(
+        length <= tf.shape(table)[0],
+        lambda: table[:length],
+        lambda: compute_positional_encoding(tf.range(length, dtype=tf.float32), d_model),
+    )
+    return pos_encoding[tf.newaxis, ...]
+
+
+def relative_positional_encoding(length, d_model):
+    """ the positional encoding of the relative positions length - 1, ..., -(length - 1)
+    of a sequence of length, as used by relative position attention, derived from
+    the shared table since sin(-x) = -sin(x) and cos(-x) = cos(x)
+    returns: a float32 tensor with shape [1, 2 * length - 1, d_model]
+    """
+    pos_encoding = positional_encoding(length, d_model)[0]
+    sign = np.where(np.arange(d_model) % 2 == 0, -1.0, 1.0).astype(np.float32)
+    negative = pos_encoding[1:] * sign
+    pos_encoding = tf.concat([tf.reverse(pos_encoding, axis=[0]), negative], axis=0)
+    return pos_encoding[tf.newaxis, ...]
+
+
+def make_delta_filters(order, window):
+    """ generate the filters computing static and delta features up to order,
+    with the same scales as the delta_delta op
+    returns: an array with shape [2 * order * window + 1, order + 1]
+    """
+    width = order * window
+    filters = np.zeros([2 * width + 1, order + 1], dtype=np.float32)
+    delta = np.arange(-window, window + 1, dtype=np.float64)
+    delta /= np.sum(delta ** 2)
+    scales = np.array([1.0])
+    for i in range(order + 1):
+        if i > 0:
+            scales = np.convolve(scales, delta)
+        offset = width - (len(scales) - 1) // 2
+        filters[offset : offset + len(scales), i] = scales
+    return filters
+
+
+def delta_delta(x, x_length, order=2, window=2):
+    """ compute deltas of a padded batch as one convolution over time,
+    reshape from [N T D 1] -> [N T D order+1]
+    the first and last valid frames of each utterance are replicated at its
+    edges, frames beyond x_length are zeros
+    """
+    width = order * window
+    time = tf.shape(x)[1]
+    x_length = tf.reshape(tf.cast(x_length, tf.int32), [-1, 1])
+    index = tf.range(-width, time + width)[tf.newaxis, :]
+    index = tf.minimum(tf.maximum(index, 0), tf.maximum(x_length - 1, 0))
+    padded = tf.gather(x, index, batch_dims=1)
+    filters = tf.constant(make_delta_filters(order, window), dtype=x.dtype)
+    filters = filters[:, tf.newaxis, tf.newaxis, :]
+    out = tf.nn.conv2d(padded, filters, strides=1, padding="VALID")
+    mask = tf.sequence_mask(x_length[:, 0], time, dtype=x.dtype)
+    return out * mask[:, :, tf.newaxis, tf.newaxis]
+
+
 def collapse4d(x, name=None):
     """ reshape from [N T D C] -> [N T D*C]
     using tf.shape(x), which generate a tensor instead of x.shape
@@ -0,0 +1,68 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""The model tests the shared positional encoding tables."""
+
+import numpy as np
+import tensorflow as tf
+from athena.layers.functional import (
+    make_positional_encoding,
+    positional_encoding,
+    relative_positional_encoding,
+    POSITIONAL_ENCODING_CHUNK,
+)
+
+
+def reference_encoding(positions, d_model):
+    """ the sinusoidal encoding of positions computed in float64 """
+    i = np.arange(d_model)
+    angles = positions[:, np.newaxis] / np.power(10000, (2 * (i // 2)) / d_model)
+    return np.where(i % 2 == 0, np.sin(angles), np.cos(angles)).astype(np.float32)
+
+
+class PositionalEncodingTest(tf.test.TestCase):
+    """
+        Positional encodings sliced from the grown tables or computed in graph,
+        each test using its own d_model so that the tables start empty.
+    """
+    def test_grown_table(self):
+        length = POSITIONAL_ENCODING_CHUNK + 500
+        self.assertAllClose(positional_encoding(10, 16), make_positional_encoding(10, 16))
+        self.assertAllClose(
+            positional_encoding(length, 16), make_positional_encoding(length, 16), atol=1e-5
+        )
+
+    def test_in_graph_fallback(self):
+        length = POSITIONAL_ENCODING_CHUNK + 500
+        encode = tf.function(
+            lambda length: positional_encoding(length, 12),
+            input_signature=[tf.TensorSpec([], tf.int32)],
+        )
+        # the traced length is unknown, longer than the empty table
+        self.assertAllClose(encode(length), make_positional_encoding(length, 12), atol=1e-3)
+
+    def test_relative(self):
+        length = 7
+        positions = np.arange(length - 1, -length, -1, dtype=np.float64)
+        self.assertAllClose(
+            relative_positional_encoding(length, 10)[0],
+            reference_encoding(positions, 10),
+            atol=1e-5,
+        )
+
+
+if __name__ == "__main__":
+    tf.test.main()
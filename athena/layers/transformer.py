@@ -21,6 +21,7 @@
 import tensorflow as tf
 from .attention import MultiHeadAttention
 from .commons import ACTIVATIONS
+from ..utils.misc import generate_chunk_mask
 
 
 class Transformer(tf.keras.layers.Layer):
@@ -42,6 +43,14 @@ class Transformer(tf.keras.layers.Layer):
             (default=relu).
         custom_encoder: custom encoder (default=None).
         custom_decoder: custom decoder (default=None).
+        fused_projection: fuse the Q, K and V projections of the attention layers
+            (default=False).
+        attention_chunk_size: compute the attention in chunks of this size to save
+            memory on long sequences, 0 for the full attention (default=0).
+        encoder_chunk_size: the chunk size of the chunk-wise encoder self-attention,
+            0 to attend to the whole sequence (default=0).
+        encoder_left_chunks: the number of left chunks each encoder chunk attends to,
+            -1 for all of them (default=-1).
 
     Examples::
         >>> transformer_model = Transformer(nhead=16, num_encoder_layers=12)
@@ -64,6 +73,10 @@ class Transformer(tf.keras.layers.Layer):
         activation="gelu",
         custom_encoder=None,
         custom_decoder=None,
+        fused_projection=False,
+        attention_chunk_size=0,
+        encoder_chunk_size=0,
+        encoder_left_chunks=-1,
     ):
         super().__init__()
         if custom_encoder is not None:
@@ -71,18 +84,24 @@ class Transformer(tf.keras.layers.Layer):
         else:
             encoder_layers = [
                 TransformerEncoderLayer(
-                    d_model, nhead, dim_feedforward, dropout, activation
+                    d_model, nhead, dim_feedforward, dropout, activation,
+                    fused_projection=fused_projection,
+                    attention_chunk_size=attention_chunk_size,
                 )
                 for _ in range(num_encoder_layers)
             ]
-            self.encoder = TransformerEncoder(encoder_layers)
+            self.encoder = TransformerEncoder(
+                encoder_layers, encoder_chunk_size, encoder_left_chunks
+            )
 
         if custom_decoder is not None:
             self.decoder = custom_decoder
         else:
             decoder_layers = [
                 TransformerDecoderLayer(
-                    d_model, nhead, dim_feedforward, dropout, activation
+                    d_model, nhead, dim_feedforward, dropout, activation,
+                    fused_projection=fused_projection,
+                    attention_chunk_size=attention_chunk_size,
                 )
                 for _ in range(num_decoder_layers)
             ]
@@ -155,6 +174,17 @@ class TransformerEncoder(tf.keras.layers.Layer):
         num_layers: the number of sub-encoder-layers in the encoder (required).
         norm: the layer normalization component (optional).
 
+        chunk_size: split the sequence into chunks of chunk_size, where each position
+            attends to its own chunk and left_chunks chunks before it, 0 to attend to
+            the whole sequence (default=0).
+        left_chunks: the number of left chunks each chunk attends to, -1 for all of
+            them (default=-1).
+
+    With chunk_size > 0, the latency of the encoder is bounded by the chunk size:
+    stream() encodes a sequence chunk by chunk with call_chunk(), which caches the
+    keys and values of the left chunks in each layer and gives the same outputs as
+    call() in eager mode.
+
     Examples::
         >>> encoder_layer = [TransformerEncoderLayer(d_model=512, nhead=8)
         >>>                    for _ in range(num_layers)]
@@ -163,9 +193,11 @@ class TransformerEncoder(tf.keras.layers.Layer):
         >>> out = transformer_encoder(src)
     """
 
-    def __init__(self, encoder_layers):
+    def __init__(self, encoder_layers, chunk_size=0, left_chunks=-1):
         super().__init__()
         self.layers = encoder_layers
+        self.chunk_size = chunk_size
+        self.left_chunks = left_chunks
 
     def call(self, src, src_mask=None, training=None):
         """Pass the input through the endocder layers in turn.
@@ -177,11 +209,70 @@ class TransformerEncoder(tf.keras.layers.Layer):
         Shape:
             see the docs in Transformer class.
         """
+        if self.chunk_size > 0:
+            chunk_mask = generate_chunk_mask(tf.shape(src)[1], self.chunk_size, self.left_chunks)
+            chunk_mask = chunk_mask[tf.newaxis, tf.newaxis, :, :]
+            src_mask = chunk_mask if src_mask is None else tf.maximum(src_mask, chunk_mask)
         output = src
         for i in range(len(self.layers)):
             output = self.layers[i](output, src_mask=src_mask, training=training)
         return output
 
+    def call_chunk(self, chunk, caches=None, mask=None):
+        """Encode the next chunk of a stream, the layers must be built.
+
+        Args:
+            chunk: the next chunk of the sequence, (N, C, E) with C <= chunk_size.
+            caches: the caches returned for the previous chunk, None for the first one.
+            mask: the mask for the cached and the new positions (optional).
+
+        Returns:
+            the encoder output of the chunk, the caches for the next chunk
+        """
+        if caches is None:
+            caches = [None] * len(self.layers)
+        output, new_caches = chunk, []
+        for layer, cache in zip(self.layers, caches):
+            output, cache = layer.call_with_cache(output, cache, mask=mask)
+            new_caches.append(self.trim_cache(cache))
+        return output, new_caches
+
+    def trim_cache(self, cache):
+        """ keep the keys and values of the left_chunks chunks seen by the next chunk """
+        if self.left_chunks < 0:
+            return cache
+        if self.left_chunks == 0:
+            return None
+        num_cached = self.left_chunks * self.chunk_size
+        return cache[0][:, :, -num_cached:], cache[1][:, :, -num_cached:]
+
+    def num_cached(self, position):
+        """ the number of positions cached before the chunk starting at position """
+        if self.left_chunks < 0:
+            return position
+        return min(position, self.left_chunks * self.chunk_size)
+
+    def stream(self, src, src_mask=None):
+        """Encode src chunk by chunk as a streaming recognizer would, only in eager mode.
+
+        Args:
+            src: the sequnce to the encoder (required).
+            src_mask: the padding mask for the src sequence (optional).
+
+        Shape:
+            see the docs in Transformer class.
+        """
+        length = src.shape[1]
+        outputs, caches = [], None
+        for start in range(0, length, self.chunk_size):
+            end = min(start + self.chunk_size, length)
+            mask = None
+            if src_mask is not None:
+                mask = src_mask[:, :, :, start - self.num_cached(start) : end]
+            output, caches = self.call_chunk(src[:, start:end], caches, mask)
+            outputs.append(output)
+        return tf.concat(outputs, axis=1)
+
 
 class TransformerDecoder(tf.keras.layers.Layer):
     """TransformerDecoder is a stack of N decoder layers
@@ -244,6 +335,9 @@ class TransformerEncoderLayer(tf.keras.layers.Layer):
         dim_feedforward: the dimension of the feedforward network model (default=2048).
         dropout: the dropout value (default=0.1).
         activation: the activation function of intermediate layer, relu or gelu (default=relu).
+        fused_projection: fuse the Q, K and V projections of the attention (default=False).
+        attention_chunk_size: compute the attention in chunks of this size, 0 for the full
+            attention (default=0).
 
     Examples::
         >>> encoder_layer = TransformerEncoderLayer(d_model=512, nhead=8)
@@ -252,10 +346,13 @@ class TransformerEncoderLayer(tf.keras.layers.Layer):
     """
 
     def __init__(
-        self, d_model, nhead, dim_feedforward=2048, dropout=0.1, activation="gelu"
+        self, d_model, nhead, dim_feedforward=2048, dropout=0.1, activation="gelu",
+        fused_projection=False, attention_chunk_size=0
     ):
         super().__init__()
-        self.self_attn = MultiHeadAttention(d_model, nhead)
+        self.self_attn = MultiHeadAttention(
+            d_model, nhead, fused_projection, attention_chunk_size
+        )
         # Implementation of Feedforward model
         layers = tf.keras.layers
         self.ffn = tf.keras.Sequential(
@@ -300,6 +397,18 @@ class TransformerEncoderLayer(tf.keras.layers.Layer):
 
         return out
 
+    def call_with_cache(self, src, cache=None, mask=None):
+        """Pass the next chunk of a stream through the encoder layer for inference,
+        attending to the cached keys and values of the previous chunks.
+
+        Returns:
+            the output of the chunk, the keys and values of the cache and the chunk
+        """
+        out, cache = self.self_attn.call_with_cache(src, cache, mask=mask)
+        out = self.norm1(src + self.dropout(out, training=False))
+        out = self.norm2(out + self.ffn(out, training=False))
+        return out, cache
+
 
 class TransformerDecoderLayer(tf.keras.layers.Layer):
     """TransformerDecoderLayer is made up of self-attn, multi-head-attn and feedforward network.
@@ -315,6 +424,9 @@ class TransformerDecoderLayer(tf.keras.layers.Layer):
         dim_feedforward: the dimension of the feedforward network model (default=2048).
         dropout: the dropout value (default=0.1).
         activation: the activation function of intermediate layer, relu or gelu (default=relu).
+        fused_projection: fuse the Q, K and V projections of the attention (default=False).
+        attention_chunk_size: compute the attention in chunks of this size, 0 for the full
+            attention (default=0).
 
     Examples::
         >>> decoder_layer = TransformerDecoderLayer(d_model=512, nhead=8)
@@ -324,11 +436,16 @@ class TransformerDecoderLayer(tf.keras.layers.Layer):
     """
 
     def __init__(
-        self, d_model, nhead, dim_feedforward=2048, dropout=0.1, activation="gelu"
+        self, d_model, nhead, dim_feedforward=2048, dropout=0.1, activation="gelu",
+        fused_projection=False, attention_chunk_size=0
     ):
         super().__init__()
-        self.attn1 = MultiHeadAttention(d_model, nhead)
-        self.attn2 = MultiHeadAttention(d_model, nhead)
+        self.attn1 = MultiHeadAttention(
+            d_model, nhead, fused_projection, attention_chunk_size
+        )
+        self.attn2 = MultiHeadAttention(
+            d_model, nhead, fused_projection, attention_chunk_size
+        )
         # Implementation of Feedforward model
         layers = tf.keras.layers
         self.ffn = tf.keras.Sequential(
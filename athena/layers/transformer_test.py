@@ -0,0 +1,58 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""The model tests the streaming of the chunk-wise encoder against its masked call."""
+
+import tensorflow as tf
+from athena.layers.transformer import TransformerEncoder, TransformerEncoderLayer
+
+
+class TransformerEncoderTest(tf.test.TestCase):
+    """
+        TransformerEncoder.stream against call, with a final partial chunk.
+    """
+    def check_stream(self, left_chunks, attention_chunk_size=0):
+        tf.random.set_seed(1)
+        layers = [
+            TransformerEncoderLayer(8, 2, 16, 0.0, attention_chunk_size=attention_chunk_size)
+            for _ in range(2)
+        ]
+        encoder = TransformerEncoder(layers, chunk_size=3, left_chunks=left_chunks)
+        src = tf.random.normal([2, 10, 8])
+        lengths = [10, 8]
+        src_mask = 1.0 - tf.sequence_mask(lengths, 10, dtype=tf.float32)
+        src_mask = src_mask[:, tf.newaxis, tf.newaxis, :]
+
+        expected = encoder(src, src_mask, training=False)
+        streamed = encoder.stream(src, src_mask)
+        for i, length in enumerate(lengths):
+            self.assertAllClose(expected[i, :length], streamed[i, :length], atol=1e-5)
+
+    def test_all_left_chunks(self):
+        self.check_stream(-1)
+
+    def test_no_left_chunk(self):
+        self.check_stream(0)
+
+    def test_one_left_chunk(self):
+        self.check_stream(1)
+
+    def test_chunked_attention(self):
+        self.check_stream(1, attention_chunk_size=4)
+
+
+if __name__ == "__main__":
+    tf.test.main()
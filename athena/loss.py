@@ -45,23 +45,100 @@ class CTCLoss(tf.keras.losses.Loss):
         return tf.reduce_mean(ctc_loss)
 
 
-class Seq2SeqSparseCategoricalCrossentropy(tf.keras.losses.CategoricalCrossentropy):
+def sparse_categorical_crossentropy(labels, logits, label_smoothing=0.0, from_logits=True):
+    """ the categorical crossentropy of sparse labels with label smoothing, which
+    equals to the one of tf.keras.losses.CategoricalCrossentropy on one-hot labels
+    without materializing them:
+
+        (1 - label_smoothing) * -log p[label] + label_smoothing * -mean(log p)
+
+    args: labels with shape [..., ] and logits (or probabilities if not from_logits)
+        with shape [..., num_classes]
+    returns: the loss with the shape of labels
+    """
+    if from_logits:
+        log_z = tf.reduce_logsumexp(logits, axis=-1)
+        log_probs_sum = tf.reduce_sum(logits, axis=-1) - log_z * tf.cast(
+            tf.shape(logits)[-1], logits.dtype)
+        label_log_probs = tf.gather(logits, labels, batch_dims=labels.shape.rank) - log_z
+    else:
+        epsilon = tf.keras.backend.epsilon()
+        log_probs = tf.math.log(tf.clip_by_value(logits, epsilon, 1.0 - epsilon))
+        log_probs_sum = tf.reduce_sum(log_probs, axis=-1)
+        label_log_probs = tf.gather(log_probs, labels, batch_dims=labels.shape.rank)
+    loss = -label_log_probs
+    if label_smoothing > 0.0:
+        num_classes = tf.cast(tf.shape(logits)[-1], logits.dtype)
+        loss = (1.0 - label_smoothing) * loss - label_smoothing * log_probs_sum / num_classes
+    return loss
+
+
+def load_unigrams(path, num_classes):
+    """ load the label counts written by athena/label_count_main.py as the unigram
+    distribution of the sampled softmax. The file holds one count per line in the
+    order of the labels and the count of eos last, which is used for the labels the
+    model adds after the vocabulary (sos and eos). Counts are add-one smoothed.
+    """
+    with open(path) as file:
+        counts = [float(line) for line in file if line.strip()]
+    eos_count = counts.pop()
+    counts = counts[:num_classes] + [eos_count] * max(num_classes - len(counts), 0)
+    return [count + 1.0 for count in counts]
+
+
+def sampled_softmax_crossentropy(labels, inputs, output_layer, num_sampled, unigrams=None):
+    """ the sampled softmax crossentropy of sparse labels, an estimate of the full
+    softmax crossentropy of output_layer(inputs) from the labels and num_sampled
+    classes drawn for the whole batch, from unigrams if given or uniformly otherwise.
+    Only the rows of the output kernel of these classes are multiplied.
+
+    args: labels with shape [..., ], inputs with shape [..., dim] and output_layer a
+        built Dense layer with num_classes units
+    returns: the loss with the shape of labels
+    """
+    num_classes = output_layer.units
+    flat_labels = tf.cast(tf.reshape(labels, [-1, 1]), tf.int64)
+    flat_inputs = tf.reshape(inputs, [-1, tf.shape(inputs)[-1]])
+    if unigrams is None:
+        sampled_values = tf.random.uniform_candidate_sampler(
+            flat_labels, 1, num_sampled, True, num_classes
+        )
+    else:
+        sampled_values = tf.random.fixed_unigram_candidate_sampler(
+            flat_labels, 1, num_sampled, True, num_classes, distortion=0.75,
+            unigrams=unigrams
+        )
+    loss = tf.nn.sampled_softmax_loss(
+        weights=tf.transpose(output_layer.kernel),
+        biases=output_layer.bias,
+        labels=flat_labels,
+        inputs=tf.cast(flat_inputs, output_layer.kernel.dtype),
+        num_sampled=num_sampled,
+        num_classes=num_classes,
+        sampled_values=sampled_values,
+    )
+    return tf.reshape(loss, tf.shape(labels))
+
+
+class Seq2SeqSparseCategoricalCrossentropy(tf.keras.losses.Loss):
     """ Seq2SeqSparseCategoricalCrossentropy LOSS
-    CategoricalCrossentropy calculated at each character for each sequence in a batch
+    CategoricalCrossentropy calculated at each character for each sequence in a batch,
+    the labels are not converted to one-hot
     """
 
     def __init__(self, num_classes, eos=-1, by_token=False, by_sequence=True,
                  from_logits=True, label_smoothing=0.0):
-        super().__init__(from_logits=from_logits, label_smoothing=label_smoothing, reduction="none")
+        super().__init__(reduction="none")
         self.by_token = by_token
         self.by_sequence = by_sequence
         self.num_classes = num_classes
+        self.from_logits = from_logits
+        self.label_smoothing = label_smoothing
         self.eos = num_classes + eos if eos < 0 else eos
 
     def __call__(self, logits, samples, logit_length=None):
         labels = insert_eos_in_labels(samples["output"], self.eos, samples["output_length"])
         mask = tf.math.logical_not(tf.math.equal(labels, 0))
-        labels = tf.one_hot(indices=labels, depth=self.num_classes)
         seq_len = tf.shape(labels)[1]
         logits = logits[:, :seq_len, :]
         loss = self.call(labels, logits)
@@ -74,26 +151,51 @@ class Seq2SeqSparseCategoricalCrossentropy(tf.keras.losses.CategoricalCrossentro
         return tf.reduce_mean(loss)
 
 
+    def call(self, y_true, y_pred):
+        """ the loss of each label """
+        return sparse_categorical_crossentropy(
+            y_true, y_pred, self.label_smoothing, self.from_logits
+        )
+
+
+class Seq2SeqSampledSoftmaxCrossentropy(Seq2SeqSparseCategoricalCrossentropy):
+    """ Seq2SeqSampledSoftmaxCrossentropy LOSS
+    the sampled softmax version of Seq2SeqSparseCategoricalCrossentropy, which is
+    called on the inputs of output_layer instead of its logits. It is only meant for
+    training, the full softmax of output_layer is still used by evaluation and decoding.
+    """
+
+    def __init__(self, num_classes, output_layer, num_sampled, unigrams=None, eos=-1,
+                 by_token=False, by_sequence=True):
+        super().__init__(num_classes, eos=eos, by_token=by_token, by_sequence=by_sequence)
+        self.output_layer = output_layer
+        self.num_sampled = num_sampled
+        self.unigrams = unigrams
+
+    def call(self, y_true, y_pred):
+        """ the loss of each label, y_pred being the inputs of output_layer """
+        return sampled_softmax_crossentropy(
+            y_true, y_pred, self.output_layer, self.num_sampled, self.unigrams
+        )
+
+
 class MPCLoss(tf.keras.losses.Loss):
     """MPC LOSS
-    L1 loss for each masked acoustic features in a batch
+    L1 loss for each masked acoustic features in a batch, averaged over all the frames.
+    Only the frames masked by samples["mpc_mask"] ([batch, num_frames], 0.0 for masked)
+    within logit_length are gathered, so the differences of the kept frames are never
+    computed
     """
 
     def __init__(self, name="MPCLoss"):
         super().__init__(name=name)
 
     def __call__(self, logits, samples, logit_length=None):
-        target = samples["output"]
         shape = tf.shape(logits)
-        target = tf.reshape(target, shape)
-        loss = target - logits
-        # mpc mask
-        mask = tf.cast(tf.math.equal(tf.reshape(samples["input"], shape), 0), loss.dtype)
-        loss *= mask
-        # sequence length mask
-        seq_mask = tf.sequence_mask(logit_length, shape[1], dtype=loss.dtype)
-        seq_mask = tf.tile(seq_mask[:, :, tf.newaxis], [1, 1, shape[2]])
-        loss *= seq_mask
-        loss = tf.reduce_sum(tf.abs(loss, name="L1_loss"), 2)
-        loss = tf.reduce_mean(loss)
-        return loss
+        target = tf.reshape(samples["output"], shape)
+        # masked frames within the sequence length
+        seq_mask = tf.sequence_mask(logit_length, shape[1])
+        frames = tf.where(tf.logical_and(tf.equal(samples["mpc_mask"], 0), seq_mask))
+        loss = tf.abs(tf.gather_nd(target, frames) - tf.gather_nd(logits, frames))
+        loss = tf.reduce_sum(loss, name="L1_loss")
+        return loss / tf.cast(shape[0] * shape[1], loss.dtype)
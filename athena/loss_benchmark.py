@@ -0,0 +1,98 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# Only support tensorflow 2.0
+# pylint: disable=invalid-name, no-member
+r""" benchmark the one-hot label smoothed crossentropy against the sparse one
+
+    python athena/loss_benchmark.py [num_classes] [label_length ...]
+
+For each label length, the forward and backward passes of both losses are timed on
+random logits (batch 32, label smoothing 0.1) and the largest difference of their
+values is checked. The peak device memory is reported when tensorflow can measure
+it (GPU with tensorflow 2.5 or later).
+"""
+import sys
+import time
+import tensorflow as tf
+from absl import logging
+from athena.loss import sparse_categorical_crossentropy
+from athena.attention_benchmark import peak_memory_mb, reset_peak_memory
+
+BATCH_SIZE = 32
+LABEL_SMOOTHING = 0.1
+NUM_RUNS = 5
+
+
+def one_hot_categorical_crossentropy(labels, logits):
+    """ the label smoothed crossentropy on one-hot labels, as computed before """
+    loss_fn = tf.keras.losses.CategoricalCrossentropy(
+        from_logits=True, label_smoothing=LABEL_SMOOTHING, reduction="none"
+    )
+    return loss_fn(tf.one_hot(labels, tf.shape(logits)[-1]), logits)
+
+
+def sparse_crossentropy(labels, logits):
+    """ the label smoothed crossentropy on sparse labels """
+    return sparse_categorical_crossentropy(labels, logits, LABEL_SMOOTHING)
+
+
+def benchmark(loss_fn, labels, logits):
+    """ time the forward and backward passes of loss_fn
+    returns: the loss, seconds per run and the peak memory in MB (None if unknown)
+    """
+    @tf.function
+    def step(labels, logits):
+        with tf.GradientTape() as tape:
+            tape.watch(logits)
+            loss = loss_fn(labels, logits)
+        return loss, tape.gradient(tf.reduce_sum(loss), logits)
+
+    step(labels, logits)  # trace
+    reset_peak_memory()
+    start = time.time()
+    for _ in range(NUM_RUNS):
+        loss, grads = step(labels, logits)
+    grads.numpy()
+    return loss, (time.time() - start) / NUM_RUNS, peak_memory_mb()
+
+
+def run_benchmark(num_classes, label_lengths):
+    """ print a markdown table comparing both losses """
+    losses = [("one-hot", one_hot_categorical_crossentropy), ("sparse", sparse_crossentropy)]
+    print("loss | label_length | sec/iter | peak memory (MB) | max abs diff |")
+    print(":-------:|:-------:|:-------:|:-------:|:-------:|")
+    for label_length in label_lengths:
+        logits = tf.random.normal([BATCH_SIZE, label_length, num_classes])
+        labels = tf.random.uniform(
+            [BATCH_SIZE, label_length], 0, num_classes, dtype=tf.int32
+        )
+        reference = None
+        for name, loss_fn in losses:
+            loss, sec_per_iter, peak_mb = benchmark(loss_fn, labels, logits)
+            if reference is None:
+                reference = loss
+            max_diff = float(tf.reduce_max(tf.abs(loss - reference)))
+            peak_mb = "n/a" if peak_mb is None else "%.1f" % peak_mb
+            print("%s | %d | %.4f | %s | %.2e |"
+                  % (name, label_length, sec_per_iter, peak_mb, max_diff), flush=True)
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    NUM_CLASSES = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    LABEL_LENGTHS = [int(n) for n in sys.argv[2:]] if len(sys.argv) > 2 else [32, 128, 512]
+    run_benchmark(NUM_CLASSES, LABEL_LENGTHS)
@@ -83,6 +83,10 @@ def build_model_from_jsonfile(jsonfile, rank=0, pre_run=True):
     p = parse_config(config)
     dataset_builder = SUPPORTED_DATASET_BUILDER[p.dataset_builder](p.dataset_config)
 
+    # the precision policy applies to the layers built after it is set
+    solver_config = p.solver_config if p.solver_config is not None else {}
+    BaseSolver.initialize_precision(solver_config.get("precision", "float32"))
+
     # models
     model = SUPPORTED_MODEL[p.model](
         num_classes=p.num_classes
@@ -98,16 +102,10 @@ def build_model_from_jsonfile(jsonfile, rank=0, pre_run=True):
         optimizer=optimizer,
     )
     if pre_run or p.pretrained_model is not None:
-        # pre_run for lazy initilize in keras
-        solver = BaseSolver(
-            model,
-            optimizer,
-            sample_signature=dataset_builder.sample_signature
-        )
-        if p.dev_csv is None:
-            raise ValueError("we currently need a dev_csv for pre-load")
-        dataset = dataset_builder.load_csv(p.dev_csv).as_dataset(p.batch_size)
-        solver.evaluate_step(model.prepare_samples(iter(dataset).next()))
+        # pre_run for lazy initilize in keras, zero samples of the signature shapes
+        # are enough to build the variables
+        samples = make_dummy_samples(dataset_builder.sample_signature)
+        model(model.prepare_samples(samples), training=False)
     return p, model, optimizer, checkpointer, dataset_builder
 
 
@@ -139,6 +137,7 @@ def train(jsonfile, Solver, rank_size=1, rank=0):
         optimizer,
         sample_signature=dataset_builder.sample_signature,
         config=p.solver_config,
+        batch_transform=dataset_builder.batch_transform,
     )
     while epoch < p.num_epochs:
         if rank == 0:
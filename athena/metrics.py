@@ -19,7 +19,7 @@
 from absl import logging
 import numpy as np
 import tensorflow as tf
-from .utils.misc import validate_seqs
+from .utils.misc import truncate_seqs, compact_seqs, edit_distance
 
 
 class CharactorAccuracy:
@@ -38,17 +38,23 @@ class CharactorAccuracy:
         self.error_count.reset_states()
         self.total_count.reset_states()
 
-    def update_state(self, sparse_predictions, samples, logit_length=None):
-        """ Accumulate errors and counts """
-        validated_label = tf.cast(
-            tf.sparse.from_dense(samples["output"]), dtype=tf.int64
-        )
-        labels_counter = tf.cast(tf.shape(validated_label.values)[0], tf.float32)
-
-        num_errs = tf.edit_distance(
-            sparse_predictions, validated_label, normalize=False
-        )
+    @staticmethod
+    def utterance_errors(predictions, labels):
+        """ the edit distance and the number of labels of each utterance, zeros in
+        predictions and labels being ignored. predictions may be a SparseTensor.
+        """
+        if isinstance(predictions, tf.SparseTensor):
+            predictions = tf.sparse.to_dense(predictions)
+        predictions, prediction_lengths = compact_seqs(tf.cast(predictions, tf.int64))
+        labels, label_lengths = compact_seqs(tf.cast(labels, tf.int64))
+        num_errs = edit_distance(predictions, prediction_lengths, labels, label_lengths)
+        return tf.cast(num_errs, tf.float32), tf.cast(label_lengths, tf.float32)
+
+    def update_state(self, predictions, samples, logit_length=None):
+        """ Accumulate errors and counts, predictions being dense and padded with 0 """
+        num_errs, labels_counter = self.utterance_errors(predictions, samples["output"])
         num_errs = tf.reduce_sum(num_errs)
+        labels_counter = tf.reduce_sum(labels_counter)
         self.error_count(num_errs)
         self.total_count(labels_counter)
         return num_errs, labels_counter
@@ -66,6 +72,29 @@ class CharactorAccuracy:
         return 1.0 - error_rate
 
 
+class ErrorRate(CharactorAccuracy):
+    """ ErrorRate
+    Inherits CharactorAccuracy and reports the error rate (CER or WER depending on
+    the labels) instead of the accuracy, together with the errors of each utterance
+    """
+
+    def __init__(self, name="ErrorRate"):
+        super().__init__(name=name)
+
+    def update_state(self, predictions, samples, logit_length=None):
+        """ Accumulate errors and counts
+        returns: the errors and the number of labels of each utterance
+        """
+        num_errs, labels_counter = self.utterance_errors(predictions, samples["output"])
+        self.error_count(tf.reduce_sum(num_errs))
+        self.total_count(tf.reduce_sum(labels_counter))
+        return num_errs, labels_counter
+
+    def result(self):
+        """ returns the error rate calculated as num_err/num_total """
+        return tf.math.divide_no_nan(self.error_count.result(), self.total_count.result())
+
+
 class Seq2SeqSparseCategoricalAccuracy(CharactorAccuracy):
     """ Seq2SeqSparseCategoricalAccuracy
     Inherits CharactorAccuracy and implements Attention accuracy calculation
@@ -78,7 +107,7 @@ class Seq2SeqSparseCategoricalAccuracy(CharactorAccuracy):
     def __call__(self, logits, samples, logit_length=None):
         """ Accumulate errors and counts """
         predictions = tf.argmax(logits, axis=2, output_type=tf.int64)
-        validated_preds, _ = validate_seqs(predictions, self.eos)
+        validated_preds = truncate_seqs(predictions, self.eos)
 
         self.update_state(validated_preds, samples, logit_length)
 
@@ -92,18 +121,27 @@ class CTCAccuracy(CharactorAccuracy):
         super().__init__(name=name)
         self.need_logit_length = True
 
+    @staticmethod
+    def greedy_decode(logits, logit_length):
+        """ the best path decoding of tf.nn.ctc_greedy_decoder on the dense logits,
+        which stays on their device: the argmax of each frame within logit_length,
+        without repeated labels and blanks (the last class)
+        returns: the decoded labels with shape [batch, time], padded with 0
+        """
+        best_path = tf.argmax(logits, axis=2, output_type=tf.int64)
+        previous = tf.pad(best_path[:, :-1], [[0, 0], [1, 0]], constant_values=-1)
+        blank = tf.cast(tf.shape(logits)[2] - 1, tf.int64)
+        keep = tf.logical_and(
+            tf.not_equal(best_path, previous), tf.not_equal(best_path, blank)
+        )
+        keep = tf.logical_and(keep, tf.sequence_mask(logit_length, tf.shape(logits)[1]))
+        return tf.where(keep, best_path, tf.zeros_like(best_path))
+
     def __call__(self, logits, samples, logit_length=None):
         """ Accumulate errors and counts, logit_length is the output length of encoder"""
         assert logit_length is not None
-        with tf.device("/cpu:0"):
-            # this only implemented in cpu
-            # ignore if the input length is larger than the output length
-            if tf.shape(logits)[1] <= tf.shape(samples["output"])[1] + 1:
-                logging.warning("the length of logits is shorter than that of labels")
-            else:
-                decoded, _ = tf.nn.ctc_greedy_decoder(
-                    tf.transpose(logits, [1, 0, 2]),
-                    tf.cast(logit_length, tf.int32),
-                )
-
-                self.update_state(decoded[0], samples)
+        # ignore if the input length is larger than the output length
+        if tf.shape(logits)[1] <= tf.shape(samples["output"])[1] + 1:
+            logging.warning("the length of logits is shorter than that of labels")
+        else:
+            self.update_state(self.greedy_decode(logits, logit_length), samples)
@@ -34,16 +34,17 @@ class BaseModel(tf.keras.Model):
         raise NotImplementedError()
 
     #pylint: disable=not-callable
-    def get_loss(self, logits, samples, training=None):
-        """ get loss """
+    def get_loss(self, logits, samples, training=None, compute_metrics=True):
+        """ get loss, and the metrics if compute_metrics """
         if self.loss_function is None:
             loss = 0.0
         else:
             logit_length = self.compute_logit_length(samples)
             loss = self.loss_function(logits, samples, logit_length)
-        if self.metric is None:
+        if self.metric is None or not compute_metrics:
             metrics = {}
         else:
+            logit_length = self.compute_logit_length(samples)
             self.metric(logits, samples, logit_length)
             metrics = {self.metric.name: self.metric.result()}
         return loss, metrics
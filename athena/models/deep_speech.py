@@ -74,7 +74,7 @@ class DeepSpeechModel(BaseModel):
             )(inner)
             inner = layers.BatchNormalization()(inner)
         inner = layers.Dense(rnn_hidden_size, activation=tf.nn.relu6)(inner)
-        inner = layers.Dense(self.num_classes)(inner)
+        inner = layers.Dense(self.num_classes, dtype=tf.float32)(inner)
         self.net = tf.keras.Model(inputs=input_feature, outputs=inner)
         logging.info(self.net.summary())
 
@@ -50,7 +50,11 @@ class MaskedPredictCoding(BaseModel):
         "rate": 0.1,
         "chunk_size": 3,
         "keep_probability": 0.85,
-        "input_dropout_rate": 0.0
+        "input_dropout_rate": 0.0,
+        "fused_projection": False,
+        "attention_chunk_size": 0,
+        "encoder_chunk_size": 0,
+        "encoder_left_chunks": -1
     }
 
     def __init__(self, num_classes, sample_shape, config=None):
@@ -106,11 +110,17 @@ class MaskedPredictCoding(BaseModel):
                 self.hparams.dff,
                 self.hparams.rate,
                 "gelu",
+                fused_projection=self.hparams.fused_projection,
+                attention_chunk_size=self.hparams.attention_chunk_size,
             )
             for _ in range(self.hparams.num_encoder_layers)
         ]
-        self.encoder = TransformerEncoder(encoder_layers)
-        self.final_layer = layers.Dense(self.num_classes, input_shape=(d_model,))
+        self.encoder = TransformerEncoder(
+            encoder_layers, self.hparams.encoder_chunk_size, self.hparams.encoder_left_chunks
+        )
+        self.final_layer = layers.Dense(
+            self.num_classes, input_shape=(d_model,), dtype=tf.float32
+        )
         self.randomizer = tf.random_uniform_initializer(0, 1)
 
     def call(self, samples, training: bool = None):
@@ -127,10 +137,11 @@ class MaskedPredictCoding(BaseModel):
         x = self.encoder(x, None, training=training)
         return self.final_layer(x)
 
-    def get_loss(self, logits, samples, training=None):
+    def get_loss(self, logits, samples, training=None, compute_metrics=True):
         """get MPC loss
         Args:
             logitsdd: MPC output
+            compute_metrics: ignored, the average loss is always updated
         Return:
             MPC L1 loss
         """
@@ -150,36 +161,31 @@ class MaskedPredictCoding(BaseModel):
     def generate_mpc_mask(self, input_data):
         """ generate mask for pretraining
         Args:
-            acoustic features: i.e F-bank
+            acoustic features: i.e F-bank, whose length is a multiple of downsample_scale
         Return:
-            mask tensor
+            mask tensor with shape [batch, seq_len // downsample_scale], one value for
+            each downsample_scale frames, i.e. for each frame of the MPC outputs:
+            1.0 for keep, 0.0 for masked
         """
         dtype = input_data.dtype
-        chunk_size = self.hparams.chunk_size * self.downsample_scale
-        batch, seq_len, dim, num_channels = input_data.get_shape().as_list()
-        if (1 - self.hparams.keep_probability) * seq_len <= chunk_size:
-            chunk_size = self.downsample_scale
-        num_chunk = tf.cast(
-            tf.math.ceil(
-                tf.divide(tf.cast(seq_len, tf.float32), tf.cast(chunk_size, tf.float32))
-            ),
-            tf.int32,
+        batch, seq_len = tf.shape(input_data)[0], tf.shape(input_data)[1]
+        # the chunk size in frames of the MPC outputs, 1 for short inputs
+        chunk_size = tf.where(
+            (1 - self.hparams.keep_probability) * tf.cast(seq_len, tf.float32)
+            <= self.hparams.chunk_size * self.downsample_scale,
+            1,
+            self.hparams.chunk_size,
         )
+        num_rows = seq_len // self.downsample_scale
+        num_chunk = -(-num_rows // chunk_size)
 
         # generate mask with shape [batch, num_chunk]: 1.0 for keep, 0.0 for masked
-        ones = tf.ones([batch, num_chunk], dtype=dtype)
-        zeros = tf.zeros([batch, num_chunk], dtype=dtype)
-        probability = ones * self.hparams.keep_probability
         random = self.randomizer([batch, num_chunk], dtype=dtype)
-        mask = tf.where(tf.less(random, probability), ones, zeros)
+        mask = tf.cast(tf.less(random, self.hparams.keep_probability), dtype)
 
-        # change the mask for [batch, seq_len]
+        # repeat each chunk for its frames, the features are masked by broadcasting
         mask = tf.tile(mask[:, :, tf.newaxis], [1, 1, chunk_size])
-        mask = tf.reshape(mask, [batch, -1])[:, :seq_len]
-
-        # change the mask into masks with the shape [batch, seq_len, dim, num_channels]
-        masks = tf.tile(mask[:, :, tf.newaxis, tf.newaxis], [1, 1, dim, num_channels])
-        return masks
+        return tf.reshape(mask, [batch, -1])[:, :num_rows]
 
     def prepare_samples(self, samples):
         """ for special data prepare
@@ -192,8 +198,13 @@ class MaskedPredictCoding(BaseModel):
         )
         mpc_data = mpc_data[:, :seq_len, :, :]
         batch_size, seq_len, dim, num_channels = tf.shape(mpc_data)
-        # input
-        samples["input"] = mpc_data * self.generate_mpc_mask(mpc_data)
+        # input, masked by broadcasting the compact mask over the downsampled frames
+        mpc_mask = self.generate_mpc_mask(mpc_data)
+        masked_data = tf.reshape(
+            mpc_data, [batch_size, -1, self.downsample_scale, dim, num_channels]
+        ) * mpc_mask[:, :, tf.newaxis, tf.newaxis, tf.newaxis]
+        samples["input"] = tf.reshape(masked_data, tf.shape(mpc_data))
+        samples["mpc_mask"] = mpc_mask
         # output
         samples["output"] = tf.reshape(mpc_data, [batch_size, seq_len, dim * num_channels])
         # length
@@ -29,6 +29,7 @@ from ..utils.hparam import register_and_parse_hparams
 from ..tools.beam_search import BeamSearchDecoder
 from ..tools.ctc_scorer import CTCPrefixScorer
 from ..tools.lm_scorer import NGramScorer
+from ..utils.profiler import profile_stage
 
 
 class MtlTransformerCtc(BaseModel):
@@ -60,7 +61,7 @@ class MtlTransformerCtc(BaseModel):
         self.model = self.SUPPORTED_MODEL[self.hparams.model](
             num_classes, sample_shape, self.hparams.model_config
         )
-        self.decoder = Dense(self.num_classes)
+        self.decoder = Dense(self.num_classes, dtype=tf.float32)
         self.ctc_logits = None
 
     def call(self, samples, training=None):
@@ -69,16 +70,19 @@ class MtlTransformerCtc(BaseModel):
         self.ctc_logits = self.decoder(encoder_output, training=training)
         return output
 
-    def get_loss(self, logits, samples, training=None):
-        """ get loss used for training """
+    def get_loss(self, logits, samples, training=None, compute_metrics=True):
+        """ get loss used for training, and the metrics if compute_metrics """
         logit_length = self.compute_logit_length(samples)
         extra_loss = self.loss_function(self.ctc_logits, samples, logit_length)
-        self.metric(self.ctc_logits, samples, logit_length)
 
-        main_loss, metrics = self.model.get_loss(logits, samples, training=training)
+        main_loss, metrics = self.model.get_loss(
+            logits, samples, training=training, compute_metrics=compute_metrics
+        )
         mtl_weight = self.hparams.mtl_weight
         loss = mtl_weight * main_loss + (1.0 - mtl_weight) * extra_loss
-        metrics[self.metric.name] = self.metric.result()
+        if compute_metrics:
+            self.metric(self.ctc_logits, samples, logit_length)
+            metrics[self.metric.name] = self.metric.result()
         return loss, metrics
 
     def compute_logit_length(self, samples):
@@ -122,9 +126,10 @@ class MtlTransformerCtc(BaseModel):
                 num_classes=self.num_classes,
                 ctc_weight=hparams.ctc_weight,
             )
-            ctc_logits = self.decoder(encoder_output, training=False)
-            ctc_logits = tf.math.log(tf.nn.softmax(ctc_logits))
-            init_cand_states = ctc_scorer.initial_state(init_cand_states, ctc_logits)
+            with profile_stage("ctc_scorer"):
+                ctc_logits = self.decoder(encoder_output, training=False)
+                ctc_logits = tf.math.log(tf.nn.softmax(ctc_logits))
+                init_cand_states = ctc_scorer.initial_state(init_cand_states, ctc_logits)
             beam_search_decoder.add_scorer(ctc_scorer)
         if hparams.lm_weight != 0:
             if hparams.lm_path is None:
@@ -21,6 +21,8 @@
 import tensorflow as tf
 from .base import BaseModel
 from ..utils.misc import insert_eos_in_labels, insert_sos_in_labels
+from ..loss import sparse_categorical_crossentropy, sampled_softmax_crossentropy
+from ..loss import load_unigrams
 from ..utils.hparam import register_and_parse_hparams
 from ..layers.commons import SUPPORTED_RNNS
 
@@ -35,7 +37,9 @@ class RNNLM(BaseModel):
         "num_layer": 2,       # the number of rnn layer
         "dropout_rate": 0.1,  # dropout for model
         "sos": -1,            # sos can be -1 or -2
-        "eos": -1             # eos can be -1 or -2
+        "eos": -1,            # eos can be -1 or -2
+        "num_sampled": 0,     # the number of sampled classes of the sampled softmax
+        "unigram_counts": None  # the label counts to sample from, uniform if None
     }
     def __init__(self, num_classes, sample_shape, config=None):
         """ config including the params for build lm """
@@ -60,11 +64,20 @@ class RNNLM(BaseModel):
                 return_sequences=True
             )(inner)
         inner = tf.keras.layers.Dropout(p.dropout_rate)(inner)
-        inner = tf.keras.layers.Dense(self.num_classes)(inner)
-        self.rnnlm = tf.keras.Model(inputs=input_features, outputs=inner)
+        self.output_layer = tf.keras.layers.Dense(self.num_classes, dtype=tf.float32)
+        logits = self.output_layer(inner)
+        self.rnnlm = tf.keras.Model(inputs=input_features, outputs=logits)
+        # the inputs of the output layer for the sampled softmax in training
+        self.rnnlm_hidden = tf.keras.Model(inputs=input_features, outputs=inner)
+        self.num_sampled = p.num_sampled
+        self.unigrams = None
+        if p.unigram_counts is not None:
+            self.unigrams = load_unigrams(p.unigram_counts, self.num_classes)
 
     def call(self, samples, training: bool = None):
         x = insert_sos_in_labels(samples['input'], self.sos)
+        if training and self.num_sampled > 0:
+            return self.rnnlm_hidden(x, training=training)
         return self.rnnlm(x, training=training)
 
     def save_model(self, path):
@@ -75,12 +88,16 @@ class RNNLM(BaseModel):
         """
         self.rnnlm.save(path)        
 
-    def get_loss(self, logits, samples, training=None):
-        """ get loss """
+    def get_loss(self, logits, samples, training=None, compute_metrics=True):
+        """ get loss, the average loss metric is always updated """
         labels = samples['output']
         labels = insert_eos_in_labels(labels, self.eos, samples['output_length'])
-        labels = tf.one_hot(labels, self.num_classes)
-        loss = tf.nn.softmax_cross_entropy_with_logits(labels=labels, logits=logits)
+        if training and self.num_sampled > 0:
+            loss = sampled_softmax_crossentropy(
+                labels, logits, self.output_layer, self.num_sampled, self.unigrams
+            )
+        else:
+            loss = sparse_categorical_crossentropy(labels, logits)
         n_token = tf.cast(tf.reduce_sum(samples['output_length'] + 1), tf.float32)
         self.metric.update_state(loss)
         metrics = {self.metric.name: self.metric.result()}
@@ -23,7 +23,8 @@
 from absl import logging
 import tensorflow as tf
 from .base import BaseModel
-from ..loss import Seq2SeqSparseCategoricalCrossentropy
+from ..loss import Seq2SeqSparseCategoricalCrossentropy, Seq2SeqSampledSoftmaxCrossentropy
+from ..loss import load_unigrams
 from ..metrics import Seq2SeqSparseCategoricalAccuracy
 from ..utils.misc import generate_square_subsequent_mask, insert_sos_in_labels
 from ..layers.commons import PositionalEncoding
@@ -31,6 +32,7 @@ from ..layers.transformer import Transformer
 from ..utils.hparam import register_and_parse_hparams
 from ..tools.beam_search import BeamSearchDecoder
 from ..tools.lm_scorer import NGramScorer
+from ..utils.profiler import profile_stage
 
 
 class SpeechTransformer(BaseModel):
@@ -47,7 +49,13 @@ class SpeechTransformer(BaseModel):
         "dff": 1280,
         "rate": 0.1,
         "schedual_sampling_rate": 0.9,
-        "label_smoothing_rate": 0.0
+        "label_smoothing_rate": 0.0,
+        "fused_projection": False,
+        "attention_chunk_size": 0,
+        "encoder_chunk_size": 0,
+        "encoder_left_chunks": -1,
+        "num_sampled": 0,
+        "unigram_counts": None
     }
 
     def __init__(self, num_classes, sample_shape, config=None):
@@ -113,10 +121,29 @@ class SpeechTransformer(BaseModel):
             self.hparams.num_decoder_layers,
             self.hparams.dff,
             self.hparams.rate,
+            fused_projection=self.hparams.fused_projection,
+            attention_chunk_size=self.hparams.attention_chunk_size,
+            encoder_chunk_size=self.hparams.encoder_chunk_size,
+            encoder_left_chunks=self.hparams.encoder_left_chunks,
         )
 
         # last layer for output
-        self.final_layer = layers.Dense(self.num_classes, input_shape=(d_model,))
+        # logits stay in float32 under mixed precision
+        self.final_layer = layers.Dense(
+            self.num_classes, input_shape=(d_model,), dtype=tf.float32
+        )
+
+        # the sampled softmax loss of the decoder output for training
+        self.sampled_loss_function = None
+        if self.hparams.num_sampled > 0:
+            self.final_layer.build((None, d_model))
+            unigrams = None
+            if self.hparams.unigram_counts is not None:
+                unigrams = load_unigrams(self.hparams.unigram_counts, self.num_classes)
+            self.sampled_loss_function = Seq2SeqSampledSoftmaxCrossentropy(
+                self.num_classes, self.final_layer, self.hparams.num_sampled,
+                unigrams=unigrams, eos=self.eos
+            )
 
         # some temp function
         self.random_num = tf.random_uniform_initializer(0, 1)
@@ -137,15 +164,30 @@ class SpeechTransformer(BaseModel):
             training=training,
             return_encoder_output=True,
         )
-        y = self.final_layer(y)
+        if not (training and self.sampled_loss_function is not None):
+            # with the sampled softmax, the loss projects the decoder output itself
+            y = self.final_layer(y)
         if self.hparams.return_encoder_output:
             return y, encoder_output
         return y
 
+    def get_loss(self, logits, samples, training=None, compute_metrics=True):
+        """ get the sampled softmax loss of the decoder output in training if
+        num_sampled is set, the loss of the logits otherwise. The accuracy is not
+        computed for the sampled softmax since there are no logits.
+        """
+        if training and self.sampled_loss_function is not None:
+            return self.sampled_loss_function(logits, samples), {}
+        return super().get_loss(
+            logits, samples, training=training, compute_metrics=compute_metrics
+        )
+
     @staticmethod
     def _create_masks(x, input_length, y):
         r""" Generate a square mask for the sequence. The masked positions are
         filled with float(1.0). Unmasked positions are filled with float(0.0).
+        The masks are float32 whatever the dtype of x, since they are applied
+        to the attention logits in float32.
         """
         input_mask, output_mask = None, None
         if x is not None:
@@ -199,10 +241,16 @@ class SpeechTransformer(BaseModel):
         """ beam search decoding """
         x0 = samples["input"]
         batch = tf.shape(x0)[0]
-        x = self.x_net(x0, training=False)
-        input_length = self.compute_logit_length(samples)
-        input_mask, _ = self._create_masks(x, input_length, None)
-        encoder_output = self.transformer.encoder(x, input_mask, training=False)
+        with profile_stage("x_net"):
+            x = self.x_net(x0, training=False)
+        with profile_stage("encoder"):
+            input_length = self.compute_logit_length(samples)
+            input_mask, _ = self._create_masks(x, input_length, None)
+            if self.hparams.encoder_chunk_size > 0:
+                # chunk by chunk with cached left context, as a streaming recognizer
+                encoder_output = self.transformer.encoder.stream(x, input_mask)
+            else:
+                encoder_output = self.transformer.encoder(x, input_mask, training=False)
         if return_encoder:
             return encoder_output, input_mask
         # init op
@@ -257,6 +305,12 @@ class SpeechTransformer2(SpeechTransformer):
     """ Decoder for SpeechTransformer2 works in time_propagate fashion, it also supports
     scheduled sampling """
 
+    def __init__(self, num_classes, sample_shape, config=None):
+        super().__init__(num_classes, sample_shape, config)
+        if self.sampled_loss_function is not None:
+            raise ValueError("SpeechTransformer2 feeds back its predictions in training, "
+                             "which needs the full softmax, num_sampled should be 0")
+
     def call(self, samples, training: bool = None):
         """ TODO: docstring """
         x0 = samples["input"]
@@ -0,0 +1,114 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# pylint: disable=invalid-name
+r""" pack the audio of csv files into large archive shards
+
+The audio referenced by the csv files generated by prepare_data.py is packed, in
+ascending length order, into shards named audio-00000.pack, audio-00001.pack ...
+under output_dir. Each shard comes with an index file (.idx) that maps the original
+audio paths to their offset and length. The csv files are rewritten into output_dir
+with wav_filename replaced by "archive.pack:offset:length", read by ReadWav with
+fast_read set to true.
+"""
+import os
+import sys
+from absl import logging
+from athena.transform.feats.read_audio import read_audio, archive_header
+
+SHARD_SIZE_MB = 1024
+
+
+def load_csv_lines(csv_file):
+    """ load the header and the lines of a tab separated csv file """
+    with open(csv_file, "r", encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    headers = lines[0].split("\t")
+    lines = [line.split("\t") for line in lines[1:]]
+    return headers, lines
+
+
+def pack_audio_files(audio_files, output_dir, shard_size_mb=SHARD_SIZE_MB):
+    """ pack audio files into archive shards
+    args:
+        audio_files: a list of audio paths, packed in the given order
+        output_dir: the directory to write shards into
+        shard_size_mb: a new shard is started once a shard exceeds this size
+    returns: a dict maps each audio path to its "archive.pack:offset:length"
+    """
+    shard_size = shard_size_mb * 1024 * 1024 // 2
+    references = {}
+    shard_index, shard, index_file = -1, None, None
+    shard_path, shard_rate, offset = None, None, shard_size
+    for audio_file in audio_files:
+        samples, sample_rate = read_audio(audio_file)
+        if offset >= shard_size or sample_rate != shard_rate:
+            if shard is not None:
+                shard.close()
+                index_file.close()
+            shard_index += 1
+            shard_path = os.path.abspath(
+                os.path.join(output_dir, "audio-{:05d}.pack".format(shard_index)))
+            shard = open(shard_path, "wb")
+            index_file = open(shard_path[: -len(".pack")] + ".idx", "w", encoding="utf-8")
+            shard.write(archive_header(int(sample_rate)))
+            shard_rate, offset = sample_rate, 0
+            logging.info("writing archive {}".format(shard_path))
+        shard.write(samples.astype("<i2").tobytes())
+        index_file.write("{}\t{}\t{}\n".format(audio_file, offset, len(samples)))
+        references[audio_file] = "{}:{}:{}".format(shard_path, offset, len(samples))
+        offset += len(samples)
+    if shard is not None:
+        shard.close()
+        index_file.close()
+    return references
+
+
+def pack_csv_files(csv_files, output_dir, shard_size_mb=SHARD_SIZE_MB):
+    """ pack the audio of csv files and rewrite the csv files into output_dir,
+    audio shared by several csv files is packed only once
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    csv_lines = [load_csv_lines(csv_file) for csv_file in csv_files]
+    audio_lengths = {}
+    for headers, lines in csv_lines:
+        wav_index = headers.index("wav_filename")
+        length_index = headers.index("wav_length_ms")
+        for line in lines:
+            audio_lengths[line[wav_index]] = float(line[length_index])
+    # batches are drawn from length sorted entries, so packing by length keeps
+    # the utterances of a batch adjacent in one shard
+    audio_files = sorted(audio_lengths, key=lambda audio_file: audio_lengths[audio_file])
+    references = pack_audio_files(audio_files, output_dir, shard_size_mb)
+    for csv_file, (headers, lines) in zip(csv_files, csv_lines):
+        wav_index = headers.index("wav_filename")
+        out_csv_file = os.path.join(output_dir, os.path.basename(csv_file))
+        with open(out_csv_file, "w", encoding="utf-8") as file:
+            file.write("\t".join(headers) + "\n")
+            for line in lines:
+                line[wav_index] = references[line[wav_index]]
+                file.write("\t".join(line) + "\n")
+        logging.info("Successfully generated csv file {}".format(out_csv_file))
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    if len(sys.argv) < 3:
+        logging.warning(
+            "Usage: python {} output_dir data_csv_file [data_csv_file ...]".format(sys.argv[0]))
+        sys.exit()
+    pack_csv_files(sys.argv[2:], sys.argv[1])
@@ -0,0 +1,214 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# Only support tensorflow 2.0
+# pylint: disable=invalid-name, no-member
+r""" post-training int8 quantization of an exported model
+
+    python athena/quantize_main.py config.json export_dir calibration_csv output_dir
+        [dynamic|static] [num_calibration]
+
+The encode and decode_steps signatures of the SavedModel in export_dir (written by
+athena/export_main.py) are converted to TFLite models in output_dir by
+athena/tools/tflite.py, for one utterance padded to the longest one of
+calibration_csv and of the test_csv of the config, in float32 as the baseline and
+in int8:
+
+  * dynamic: the weights of the Dense and Conv2D layers are int8 and the
+    activations are quantized on the fly
+  * static: the activations are int8 too, with their ranges calibrated on the
+    first num_calibration (default 200) utterances of calibration_csv
+
+Both are then decoded greedily on the test_csv of the config, and the error rate of
+CharactorAccuracy, the size and the time per utterance are printed as a markdown table.
+The attention models are decoded for at most the max_decode_length of the SavedModel.
+"""
+import os
+import sys
+import json
+import time
+import numpy as np
+import tensorflow as tf
+from absl import logging
+from athena import CharactorAccuracy, CTCAccuracy
+from athena.main import parse_config, SUPPORTED_DATASET_BUILDER
+from athena.tools.tflite import (
+    static_signatures,
+    convert,
+    pad_input,
+    max_decode_length_of,
+    TFLiteFunction,
+)
+from athena.utils.misc import truncate_seqs
+
+NUM_CALIBRATION = 200
+
+
+def load_samples(dataset_builder, csv_file, num_samples=-1):
+    """ the samples of csv_file one by one, with the batch_transform applied """
+    dataset_builder.load_csv(csv_file).compute_cmvn_if_necessary(True)
+    samples_list = []
+    for samples in dataset_builder.as_dataset(batch_size=1).take(num_samples):
+        if dataset_builder.batch_transform is not None:
+            samples = dataset_builder.batch_transform(samples)
+        samples_list.append(samples)
+    return samples_list
+
+
+def calibration_inputs(saved_model, functions, samples_list, max_frames):
+    """ the inputs of each function to convert on samples_list, those of decode_steps
+    being the greedy decoding histories of the float model
+    """
+    inputs = {"encode": [], "decode_steps": []}
+    history_length = max_decode_length_of(saved_model) + 1
+    sos, eos = int(saved_model.sos.numpy()), int(saved_model.eos.numpy())
+    for samples in samples_list:
+        encode_inputs = {
+            "input": tf.constant(pad_input(samples["input"].numpy(), max_frames)),
+            "input_length": samples["input_length"],
+        }
+        inputs["encode"].append(encode_inputs)
+        if "decode_steps" not in functions:
+            continue
+        encoded = functions["encode"](**encode_inputs)
+        decoded = saved_model.signatures["greedy_decode"](
+            input=samples["input"], input_length=samples["input_length"]
+        )
+        length = int(decoded["lengths"][0])
+        history = np.full([1, history_length], eos, dtype=np.int32)
+        history[0, 0] = sos
+        history[0, 1 : length + 1] = decoded["predictions"][0, :length].numpy()
+        inputs["decode_steps"].append({
+            "encoder_output": encoded["encoder_output"],
+            "input_mask": encoded["input_mask"],
+            "history": history,
+        })
+    return inputs
+
+
+class TFLiteDecoder:
+    """ greedy decoding of one utterance with the TFLite models of encode and, for
+    attention models, decode_steps, for at most max_decode_length steps. CTC models
+    are decoded by the best path of their logits
+    """
+
+    def __init__(self, files, functions, max_frames, sos=None, eos=None,
+                 max_decode_length=None):
+        self.files = list(files.values())
+        self.encode = TFLiteFunction(files["encode"], functions["encode"])
+        self.decode_steps = None
+        if "decode_steps" in files:
+            self.decode_steps = TFLiteFunction(files["decode_steps"], functions["decode_steps"])
+        self.max_frames = max_frames
+        self.sos = sos
+        self.eos = eos
+        self.max_decode_length = max_decode_length
+
+    @property
+    def size_mb(self):
+        """ the size of the TFLite models """
+        return sum(os.path.getsize(file) for file in self.files) / 1024 / 1024
+
+    def __call__(self, inputs, input_length):
+        """ the predictions padded with 0 """
+        encoded = self.encode(
+            input=pad_input(inputs, self.max_frames), input_length=input_length
+        )
+        if self.decode_steps is None:
+            return CTCAccuracy.greedy_decode(encoded["logits"], encoded["logit_length"])
+        # the history padded with eos, the logprobs of a step not depending on the padding
+        history = np.full([1, self.max_decode_length + 1], self.eos, dtype=np.int32)
+        history[0, 0] = self.sos
+        for step in range(self.max_decode_length):
+            logprobs = self.decode_steps(
+                encoder_output=encoded["encoder_output"],
+                input_mask=encoded["input_mask"],
+                history=history,
+            )["logprobs"]
+            history[0, step + 1] = np.argmax(logprobs[0, step])
+            if history[0, step + 1] == self.eos:
+                break
+        return truncate_seqs(history[:, 1:], self.eos)
+
+
+def report(decoders, samples_list):
+    """ print the error rate, the size and the speed of each decoder on samples_list """
+    print("model | size (MB) | error rate | sec/utterance |")
+    print(":-------:|:-------:|:-------:|:-------:|")
+    for name, decoder in decoders:
+        metric = CharactorAccuracy()
+        start = time.time()
+        for samples in samples_list:
+            predictions = decoder(samples["input"].numpy(), samples["input_length"].numpy())
+            metric.update_state(predictions, samples)
+        sec_per_utterance = (time.time() - start) / max(len(samples_list), 1)
+        print("%s | %.1f | %.4f | %.4f |" % (
+            name, decoder.size_mb, 1.0 - metric.result(), sec_per_utterance), flush=True)
+
+
+def quantize(jsonfile, export_dir, calibration_csv, output_dir, mode="dynamic",
+             num_calibration=NUM_CALIBRATION):
+    """ quantize the exported model and report its error rate against its speed """
+    with open(jsonfile) as file:
+        p = parse_config(json.load(file))
+    if p.dataset_config is not None and "speed_permutation" in p.dataset_config:
+        p.dataset_config["speed_permutation"] = [1.0]
+    dataset_builder = SUPPORTED_DATASET_BUILDER[p.dataset_builder](p.dataset_config)
+    saved_model = tf.saved_model.load(export_dir)
+    test_samples = load_samples(dataset_builder, p.test_csv)
+    calibration_samples = []
+    if mode == "static":
+        calibration_samples = load_samples(dataset_builder, calibration_csv, num_calibration)
+    max_frames = max(samples["input"].shape[1]
+                     for samples in test_samples + calibration_samples)
+    functions = static_signatures(saved_model, max_frames)
+    representative_inputs = {}
+    if mode == "static":
+        representative_inputs = calibration_inputs(
+            saved_model, functions, calibration_samples, max_frames
+        )
+
+    os.makedirs(output_dir, exist_ok=True)
+    decoders = []
+    for model_mode in ["float", mode]:
+        files = {}
+        for key, function in functions.items():
+            tflite_file = os.path.join(output_dir, "{}_{}.tflite".format(key, model_mode))
+            files[key] = convert(function, tflite_file, model_mode, representative_inputs.get(key))
+            logging.info("converted %s to %s (%s)" % (key, tflite_file, model_mode))
+        if "decode_steps" in functions:
+            decoder = TFLiteDecoder(files, functions, max_frames,
+                                    sos=int(saved_model.sos.numpy()),
+                                    eos=int(saved_model.eos.numpy()),
+                                    max_decode_length=max_decode_length_of(saved_model))
+        else:
+            decoder = TFLiteDecoder(files, functions, max_frames)
+        decoders.append((model_mode, decoder))
+    report(decoders, test_samples)
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    if len(sys.argv) < 5:
+        logging.warning(
+            "Usage: python {} config.json export_dir calibration_csv output_dir "
+            "[dynamic|static] [num_calibration]".format(sys.argv[0]))
+        sys.exit()
+    MODE = sys.argv[5] if len(sys.argv) > 5 else "dynamic"
+    if MODE not in ["dynamic", "static"]:
+        raise ValueError("unsupported quantization mode: {}".format(MODE))
+    NUM = int(sys.argv[6]) if len(sys.argv) > 6 else NUM_CALIBRATION
+    quantize(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], MODE, NUM)
@@ -0,0 +1,123 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# Only support tensorflow 2.0
+# pylint: disable=invalid-name, no-member, broad-except
+r""" a local inference server with dynamic batching of the requests
+
+    python athena/server_main.py config.json [port] [max_batch_size] [max_latency_ms]
+
+The model of the json config is restored from the best checkpoint and serves on
+127.0.0.1:port (default 8000) the protocol of athena/tools/server.py. The concurrent
+requests are batched up to max_batch_size (default 8) utterances, waiting at most
+max_latency_ms (default 50) for the batch to fill. The wav files of a batch are
+featurized one by one, padded and decoded together by the batched encoder and beam
+search of athena/tools/inference.py (greedy decoding if beam_search is false in
+decode_config). A wav file which fails to be featurized fails its request only, the
+others of the batch being decoded. A local client:
+
+    from athena.tools.server import transcribe, server_stats
+    with open("test.wav", "rb") as file:
+        print(transcribe(file.read(), port=8000)["transcript"])
+    print(server_stats(port=8000))
+"""
+import sys
+import asyncio
+import tensorflow as tf
+from absl import logging
+from athena.main import build_model_from_jsonfile
+from athena.tools.inference import build_inference_module
+from athena.tools.server import InferenceServer
+
+
+class BatchTranscriber:
+    """ transcribe a list of wav bytes as one batch, the exception of the featurization
+    taking the place of the transcript of an invalid wav
+    """
+
+    def __init__(self, module, dataset_builder, beam_search=True):
+        self.module = module
+        self.dataset_builder = dataset_builder
+        self.decode = module.beam_decode if beam_search else module.greedy_decode
+
+    def featurize(self, wav):
+        """ the features of wav bytes and their length """
+        audio, sample_rate = tf.audio.decode_wav(wav, desired_channels=1)
+        # the featurizer takes the samples in int16 scale
+        samples = self.dataset_builder.featurize(audio[:, 0] * 32768.0, sample_rate)
+        return samples["input"][0], samples["input_length"][0]
+
+    def __call__(self, wavs):
+        results = []
+        for wav in wavs:
+            try:
+                results.append(self.featurize(wav))
+            except Exception as error:
+                results.append(error)
+        valid = [index for index, result in enumerate(results)
+                 if not isinstance(result, Exception)]
+        if not valid:
+            return results
+        feats, lengths = zip(*[results[index] for index in valid])
+        max_length = max(int(length) for length in lengths)
+        inputs = tf.stack([
+            tf.pad(feat, [[0, max_length - tf.shape(feat)[0]], [0, 0], [0, 0]])
+            for feat in feats
+        ])
+        outputs = self.decode(inputs, tf.stack(lengths))
+        for index, predictions, length in zip(valid, outputs["predictions"], outputs["lengths"]):
+            results[index] = self.dataset_builder.text_featurizer.decode(
+                predictions[:length].numpy().tolist()
+            )
+        return results
+
+
+async def serve(server, port):
+    """ serve until interrupted """
+    await server.start(port=port)
+    logging.info("serving on 127.0.0.1:%d" % port)
+    await asyncio.Event().wait()
+
+
+def run_server(jsonfile, port=8000, max_batch_size=8, max_latency_ms=50.0):
+    """ restore the best checkpoint of the model in jsonfile and serve it """
+    p, model, _, checkpointer, dataset_builder = build_model_from_jsonfile(jsonfile)
+    checkpointer.restore_from_best()
+    decode_config = p.decode_config if p.decode_config is not None else {}
+    module = build_inference_module(
+        model,
+        dataset_builder.sample_signature[0]["input"],
+        beam_size=decode_config.get("beam_size", 4),
+    )
+    transcriber = BatchTranscriber(
+        module, dataset_builder, decode_config.get("beam_search", True)
+    )
+    server = InferenceServer(transcriber, max_batch_size, max_latency_ms)
+    asyncio.run(serve(server, port))
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    tf.random.set_seed(1)
+    if len(sys.argv) < 2:
+        logging.warning(
+            "Usage: python {} config.json [port] [max_batch_size] [max_latency_ms]".format(
+                sys.argv[0]))
+        sys.exit()
+    PORT = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+    MAX_BATCH_SIZE = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    MAX_LATENCY_MS = float(sys.argv[4]) if len(sys.argv) > 4 else 50.0
+    run_server(sys.argv[1], PORT, MAX_BATCH_SIZE, MAX_LATENCY_MS)
@@ -17,37 +17,89 @@
 # pylint: disable=no-member
 """Base class for cross entropy model."""
 
+import os
+import contextlib
+import functools
 import warnings
 import time
+import numpy as np
 import tensorflow as tf
 from absl import logging
 import horovod.tensorflow as hvd
 from .utils import hparam
 from .utils.metric_check import MetricChecker
-from .utils.misc import validate_seqs
-from .metrics import CharactorAccuracy
+from .utils.misc import truncate_seqs, tensorflow_version, require_tensorflow
+from .utils.profiler import DecodeProfiler, profile_stage
+from .metrics import ErrorRate
+from .loss import CTCLoss
 
 
 class BaseSolver(tf.keras.Model):
     """Base Solver.
     """
+    # whether the gradient computation can be compiled by XLA with jit_compile
+    supports_jit_compile = True
     default_config = {
         "clip_norm": 100.0,
         "log_interval": 10,
-        "enable_tf_function": True
+        "enable_tf_function": True,
+        "precision": "float32",
+        "accum_steps": 1,
+        "metric_interval": -1,
+        "clip_mode": "tensor",
+        "jit_compile": False,
+        "time_bucket_boundaries": [256, 512, 768, 1024, 1280, 1536, 2048],
+        "label_bucket_boundaries": [16, 32, 48, 64, 96, 128]
     }
-    def __init__(self, model, optimizer, sample_signature, config=None, **kwargs):
+    def __init__(self, model, optimizer, sample_signature, config=None,
+                 batch_transform=None, **kwargs):
         super().__init__(**kwargs)
         self.model = model
         self.optimizer = optimizer
         self.metric_checker = MetricChecker(self.optimizer)
         self.sample_signature = sample_signature
+        self.batch_transform = batch_transform
+        self.accum_grads = None
+        # the step functions are compiled once and reused by every epoch
+        self.train_step_fns = None
+        self.evaluate_step_fn = None
+        # the number of XLA compilations of each function with jit_compile
+        self.compile_counts = {}
+        self.jit_compute_gradients = None
 
         self.hparams = hparam.HParams(cls=self.__class__)
         for keys in self.default_config:
             self.hparams.add_hparam(keys, self.default_config[keys])
         if config is not None:
             self.hparams.override_from_dict(config)
+        self.loss_scaling = False
+        if optimizer is None:
+            # nothing to train, e.g. the DecoderSolver with its own default_config
+            return
+        if self.hparams.clip_mode not in ["tensor", "global"]:
+            raise ValueError("unsupported clip_mode: {}".format(self.hparams.clip_mode))
+        if self.hparams.jit_compile:
+            self.check_jit_compile()
+            self.jit_compute_gradients = self.jit_function(
+                self.compute_local_gradients, "compute_gradients"
+            )
+        # the global norm of the last update and the number of updates skipped
+        # for non-finite gradients, only tracked with clip_mode "global"
+        self.grad_norm = tf.Variable(0.0, trainable=False, name="grad_norm")
+        self.num_skipped_updates = tf.Variable(
+            0, dtype=tf.int64, trainable=False, name="num_skipped_updates"
+        )
+
+        # float16 gradients underflow without loss scaling, bfloat16 does not need it
+        if self.hparams.precision == "mixed_float16":
+            require_tensorflow("2.1", "mixed precision training")
+            if tensorflow_version() >= (2, 4):
+                self.optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+            else:
+                self.optimizer = tf.keras.mixed_precision.experimental.LossScaleOptimizer(
+                    optimizer, loss_scale="dynamic"
+                )
+            self.loss_scaling = True
 
     @staticmethod
     def initialize_devices(visible_gpu_idx=None):
@@ -60,6 +112,36 @@ class BaseSolver(tf.keras.Model):
             for idx in visible_gpu_idx:
                 tf.config.experimental.set_visible_devices(gpus[idx], "GPU")
 
+    @staticmethod
+    def initialize_precision(precision="float32"):
+        """ set the keras mixed precision policy, should be called before the models
+        are built. precision is one of "float32", "mixed_float16" and "mixed_bfloat16",
+        the mixed policies need tensorflow 2.1 or later
+        """
+        if precision not in ["float32", "mixed_float16", "mixed_bfloat16"]:
+            raise ValueError("unsupported precision: {}".format(precision))
+        if precision == "float32":
+            return
+        require_tensorflow("2.1", "the precision {}".format(precision))
+        logging.info("using the mixed precision policy %s" % precision)
+        if tensorflow_version() >= (2, 4):
+            tf.keras.mixed_precision.set_global_policy(precision)
+        else:
+            policy = tf.keras.mixed_precision.experimental.Policy(precision)
+            tf.keras.mixed_precision.experimental.set_policy(policy)
+
+    def scale_loss(self, loss):
+        """ scale the loss for mixed_float16 """
+        if self.loss_scaling:
+            return self.optimizer.get_scaled_loss(loss)
+        return loss
+
+    def unscale_gradients(self, grads):
+        """ unscale the gradients of a scaled loss for mixed_float16 """
+        if self.loss_scaling:
+            return self.optimizer.get_unscaled_gradients(grads)
+        return grads
+
     @staticmethod
     def clip_by_norm(grads, norm):
         """ clip norm using tf.clip_by_norm """
@@ -71,29 +153,322 @@ class BaseSolver(tf.keras.Model):
         ]
         return grads
 
-    def train_step(self, samples):
-        """ train the model 1 step """
+    @staticmethod
+    def clip_by_global_norm(grads, norm):
+        """ clip the gradients by their global norm, which is computed once over all
+        of them and used to rescale them together
+        returns: the clipped gradients and the global norm before clipping
+        """
+        grad_norm = tf.linalg.global_norm(grads)
+        if norm <= 0:
+            return grads, grad_norm
+        grads, _ = tf.clip_by_global_norm(grads, norm, use_norm=grad_norm)
+        return grads, grad_norm
+
+    def prepare_samples(self, samples):
+        """ apply the batch_transform of the dataset builder (e.g. deltas of static
+        features) on the device, then the data preparation of the model
+        """
+        if self.batch_transform is not None:
+            samples = self.batch_transform(samples)
+        if self.hparams.get("jit_compile", False):
+            samples = self.pad_to_buckets(samples)
+        return self.model.prepare_samples(samples)
+
+    def compute_gradients(self, samples, compute_metrics=True):
+        """ compute the local gradients of 1 batch, still scaled for mixed_float16.
+        The metrics are empty if not compute_metrics. With jit_compile, this is the
+        only part of the train step compiled by XLA
+        """
+        if self.jit_compute_gradients is not None:
+            return self.jit_compute_gradients(samples, compute_metrics)
+        return self.compute_local_gradients(samples, compute_metrics)
+
+    def compute_local_gradients(self, samples, compute_metrics=True):
+        """ the forward pass, the loss and the backward pass of compute_gradients """
         with tf.GradientTape() as tape:
             logits = self.model(samples, training=True)
-            loss, metrics = self.model.get_loss(logits, samples, training=True)
-        grads = tape.gradient(loss, self.model.trainable_variables)
-        grads = self.clip_by_norm(grads, self.hparams.clip_norm)
-        self.optimizer.apply_gradients(zip(grads, self.model.trainable_variables))
+            loss, metrics = self.model.get_loss(
+                logits, samples, training=True, compute_metrics=compute_metrics
+            )
+            scaled_loss = self.scale_loss(loss)
+        grads = tape.gradient(scaled_loss, self.model.trainable_variables)
+        return loss, metrics, grads
+
+    def reduce_gradients(self, grads):
+        """ reduce the gradients across workers, nothing to do for a single worker """
+        return grads
+
+    def apply_gradients(self, grads):
+        """ reduce, unscale, clip and apply the gradients. The gradients are reduced
+        while still scaled, so that float16 compression does not underflow.
+
+        With clip_mode "global", the update is skipped if the global norm is not
+        finite, which protects the model from NaN and Inf gradients
+        """
+        grads = self.reduce_gradients(grads)
+        grads = self.unscale_gradients(grads)
+        variables = self.model.trainable_variables
+        if self.hparams.clip_mode == "tensor":
+            grads = self.clip_by_norm(grads, self.hparams.clip_norm)
+            self.optimizer.apply_gradients(zip(grads, variables))
+            return
+        grads, grad_norm = self.clip_by_global_norm(grads, self.hparams.clip_norm)
+        self.grad_norm.assign(grad_norm)
+        if self.loss_scaling:
+            # the LossScaleOptimizer skips non-finite gradients itself and needs
+            # to see them to lower the loss scale
+            self.optimizer.apply_gradients(zip(grads, variables))
+            return
+
+        def apply_fn():
+            self.optimizer.apply_gradients(zip(grads, variables))
+            return tf.constant(True)
+
+        def skip_fn():
+            self.num_skipped_updates.assign_add(1)
+            return tf.constant(False)
+        tf.cond(tf.math.is_finite(grad_norm), apply_fn, skip_fn)
+
+    def train_step(self, samples, compute_metrics=True):
+        """ train the model 1 step """
+        loss, metrics, grads = self.compute_gradients(samples, compute_metrics)
+        self.apply_gradients(grads)
         return loss, metrics
 
-    def train(self, dataset, total_batches=-1):
-        """ Update the model in 1 epoch """
-        train_step = self.train_step
+    def accumulate_step(self, samples, compute_metrics=True):
+        """ compute the gradients of 1 micro-batch and add them to the buffers """
+        loss, metrics, grads = self.compute_gradients(samples, compute_metrics)
+        for accum_grad, grad in zip(self.accum_grads, grads):
+            if grad is not None:
+                accum_grad.assign_add(tf.convert_to_tensor(grad))
+        return loss, metrics
+
+    def accumulate_and_apply_step(self, samples, num_steps, compute_metrics=True):
+        """ train on the final micro-batch of an update, whose gradients are added
+        to the buffers and applied in the same step. Each gradient can then be
+        reduced as soon as the backward pass produced it
+        """
+        loss, metrics, grads = self.compute_gradients(samples, compute_metrics)
+        grads = [
+            accum_grad + tf.convert_to_tensor(grad) if grad is not None else accum_grad
+            for accum_grad, grad in zip(self.accum_grads, grads)
+        ]
+        self._apply_average(grads, num_steps)
+        return loss, metrics
+
+    def apply_accumulated_gradients(self, num_steps):
+        """ apply the average of the accumulated gradients and reset the buffers """
+        grads = [tf.convert_to_tensor(accum_grad) for accum_grad in self.accum_grads]
+        self._apply_average(grads, num_steps)
+
+    def _apply_average(self, grads, num_steps):
+        """ apply the average of summed gradients and reset the buffers """
+        self.apply_gradients([grad / num_steps for grad in grads])
+        for accum_grad in self.accum_grads:
+            accum_grad.assign(tf.zeros_like(accum_grad))
+
+    def get_train_step(self):
+        """ the train step functions, built and compiled once per solver """
+        if self.train_step_fns is None:
+            self.train_step_fns = self.build_train_step()
+        return self.train_step_fns
+
+    def get_evaluate_step(self):
+        """ the evaluate step function, built and compiled once per solver """
+        if self.evaluate_step_fn is None:
+            evaluate_step = self.evaluate_step
+            if self.hparams.jit_compile:
+                evaluate_step = self.jit_function(evaluate_step, "evaluate_step")
+            self.evaluate_step_fn = self.compile_function(
+                evaluate_step, self.sample_signature, "evaluate_step"
+            )
+        return self.evaluate_step_fn
+
+    def check_jit_compile(self):
+        """ raise an error if jit_compile cannot work: XLA compilation needs
+        tensorflow 2.1 or later, and has no kernels for the allreduce of Horovod and
+        for tf.nn.ctc_loss
+        """
+        require_tensorflow("2.1", "jit_compile")
+        if not self.supports_jit_compile:
+            raise ValueError("jit_compile is not supported by {}".format(
+                type(self).__name__))
+        if isinstance(getattr(self.model, "loss_function", None), CTCLoss):
+            raise ValueError("jit_compile is not supported by {}, whose CTC loss has no "
+                             "XLA kernel".format(type(self.model).__name__))
+
+    def jit_function(self, function, name):
+        """ compile function by XLA. It is traced without an input_signature, i.e.
+        once per padded shape bucket, every trace being an XLA compilation, which is
+        counted in compile_counts and logged
+        """
+        self.compile_counts[name] = 0
+
+        def counted_function(samples, *args):
+            self.compile_counts[name] += 1
+            logging.info("jit compiling %s for shapes %s, %d compilations so far"
+                         % (name, samples["input"].shape, self.compile_counts[name]))
+            return function(samples, *args)
+        if tensorflow_version() >= (2, 5):
+            return tf.function(counted_function, jit_compile=True)
+        return tf.function(counted_function, experimental_compile=True)
+
+    def compile_function(self, function, input_signature, name):
+        """ wrap function in a tf.function if enable_tf_function is set.
+
+        With jit_compile, the function is traced without the input_signature, as
+        the XLA compiled functions it calls are traced once per padded shape bucket
+        """
+        if self.hparams.jit_compile:
+            logging.info("tracing %s once per shape bucket for jit_compile" % name)
+            return tf.function(function)
         if self.hparams.enable_tf_function:
             logging.info("please be patient, enable tf.function, it takes time ...")
-            train_step = tf.function(train_step, input_signature=self.sample_signature)
+            return tf.function(function, input_signature=input_signature)
+        return function
+
+    def compile_metric_variants(self, function, input_signature, name):
+        """ compile function with and without the training metrics, which are chosen
+        by the python argument compute_metrics. Each variant is traced on its first call
+        returns: a dict from compute_metrics to the compiled function
+        """
+        return {
+            True: self.compile_function(function, input_signature, name),
+            False: self.compile_function(
+                functools.partial(function, compute_metrics=False),
+                input_signature,
+                name + "_without_metrics",
+            ),
+        }
+
+    @staticmethod
+    def bucket_length(length, boundaries):
+        """ the smallest boundary not less than length, or the multiple of the last
+        boundary above it
+        """
+        for boundary in boundaries:
+            if length <= boundary:
+                return boundary
+        return -(-length // boundaries[-1]) * boundaries[-1]
+
+    def pad_to_buckets(self, samples):
+        """ pad the time dim of "input" and the label dim of "output" up to the
+        time_bucket_boundaries and the label_bucket_boundaries, so that jit_compile
+        sees a few shapes only. The lengths are left untouched and the padding is 0
+        """
+        buckets = [
+            ("input", self.hparams.time_bucket_boundaries),
+            ("output", self.hparams.label_bucket_boundaries),
+        ]
+        for key, boundaries in buckets:
+            if key not in samples or len(samples[key].shape) < 2:
+                continue
+            length = int(tf.shape(samples[key])[1])
+            paddings = [[0, 0] for _ in range(len(samples[key].shape))]
+            paddings[1][1] = self.bucket_length(length, boundaries) - length
+            samples[key] = tf.pad(samples[key], paddings)
+        return samples
+
+    def build_train_step(self):
+        """ return 2 functions: step(batch, samples) trains on the batch-th batch of
+        an epoch and returns the loss, the metrics and whether the model was
+        updated, finish(num_batches) applies what is left at the end of the epoch.
+        With accum_steps > 1, the gradients of accum_steps batches are summed in
+        tf.Variable buffers and applied once, so optimizer.iterations (the step of
+        the learning rate schedules) counts updates rather than batches.
+        The metrics are only computed and returned on the batches of is_metric_step
+        """
+        accum_steps = self.hparams.accum_steps
+        if accum_steps <= 1:
+            train_step = self.compile_metric_variants(
+                self.train_step, self.sample_signature, "train_step"
+            )
+
+            def step(batch, samples):
+                loss, metrics = train_step[self.is_metric_step(batch)](samples)
+                return loss, metrics, True
+
+            def finish(num_batches):
+                pass
+            return step, finish
+
+        if self.accum_grads is None:
+            self.accum_grads = [
+                tf.Variable(tf.zeros_like(var), trainable=False)
+                for var in self.model.trainable_variables
+            ]
+        num_steps_spec = tf.TensorSpec([], tf.float32)
+        accumulate_step = self.compile_metric_variants(
+            self.accumulate_step, self.sample_signature, "accumulate_step"
+        )
+        final_step = self.compile_metric_variants(
+            self.accumulate_and_apply_step,
+            list(self.sample_signature) + [num_steps_spec],
+            "accumulate_and_apply_step"
+        )
+        apply_step = self.compile_function(
+            self.apply_accumulated_gradients, [num_steps_spec], "apply_accumulated_gradients"
+        )
+
+        def step(batch, samples):
+            compute_metrics = self.is_metric_step(batch)
+            if (batch + 1) % accum_steps != 0:
+                loss, metrics = accumulate_step[compute_metrics](samples)
+                return loss, metrics, False
+            loss, metrics = final_step[compute_metrics](
+                samples, tf.constant(accum_steps, tf.float32)
+            )
+            return loss, metrics, True
+
+        def finish(num_batches):
+            if num_batches % accum_steps != 0:
+                apply_step(tf.constant(num_batches % accum_steps, tf.float32))
+        return step, finish
+
+    def is_log_step(self, batch, updated):
+        """ log once every log_interval updates """
+        num_updates = (batch + 1) // max(self.hparams.accum_steps, 1)
+        return updated and (num_updates - 1) % self.hparams.log_interval == 0
+
+    def is_metric_step(self, batch):
+        """ whether the training metrics are computed on the batch-th batch: on the
+        logging steps, which report them, and every metric_interval batches if it is
+        positive, so that the reported metrics average over more batches
+        """
+        accum_steps = max(self.hparams.accum_steps, 1)
+        if self.is_log_step(batch, (batch + 1) % accum_steps == 0):
+            return True
+        metric_interval = self.hparams.metric_interval
+        return metric_interval > 0 and batch % metric_interval == 0
+
+    def log_train_step(self, loss, metrics):
+        """ log the loss, the metrics and, with clip_mode "global", the gradient norm """
+        grad_norm = None
+        if self.hparams.clip_mode == "global":
+            grad_norm = tf.convert_to_tensor(self.grad_norm)
+        logging.info(self.metric_checker(loss, metrics, grad_norm=grad_norm))
+        self.model.reset_metrics()
+
+    def log_skipped_updates(self):
+        """ warn about the updates skipped for non-finite gradients """
+        num_skipped_updates = int(self.num_skipped_updates.numpy())
+        if num_skipped_updates > 0:
+            logging.warning("%d updates skipped for non-finite gradients so far"
+                            % num_skipped_updates)
+
+    def train(self, dataset, total_batches=-1):
+        """ Update the model in 1 epoch """
+        train_step, finish = self.get_train_step()
+        batch = -1
         for batch, samples in enumerate(dataset.take(total_batches)):
             # train 1 step
-            samples = self.model.prepare_samples(samples)
-            loss, metrics = train_step(samples)
-            if batch % self.hparams.log_interval == 0:
-                logging.info(self.metric_checker(loss, metrics))
-                self.model.reset_metrics()
+            samples = self.prepare_samples(samples)
+            loss, metrics, updated = train_step(batch, samples)
+            if self.is_log_step(batch, updated):
+                self.log_train_step(loss, metrics)
+        finish(batch + 1)
+        self.log_skipped_updates()
 
     def evaluate_step(self, samples):
         """ evaluate the model 1 step """
@@ -105,13 +480,10 @@ class BaseSolver(tf.keras.Model):
         """ evaluate the model """
         loss_metric = tf.keras.metrics.Mean(name="AverageLoss")
         loss, metrics = None, None
-        evaluate_step = self.evaluate_step
-        if self.hparams.enable_tf_function:
-            logging.info("please be patient, enable tf.function, it takes time ...")
-            evaluate_step = tf.function(evaluate_step, input_signature=self.sample_signature)
+        evaluate_step = self.get_evaluate_step()
         self.model.reset_metrics()  # init metric.result() with 0
         for batch, samples in enumerate(dataset):
-            samples = self.model.prepare_samples(samples)
+            samples = self.prepare_samples(samples)
             loss, metrics = evaluate_step(samples)
             if batch % self.hparams.log_interval == 0:
                 logging.info(self.metric_checker(loss, metrics, -2))
@@ -121,13 +493,47 @@ class BaseSolver(tf.keras.Model):
         return loss_metric.result()
 
 class HorovodSolver(BaseSolver):
-    """ A multi-processer solver based on Horovod """
+    """ A multi-processer solver based on Horovod, without jit_compile
+
+    The gradients are all-reduced tensor by tensor inside the compiled train step,
+    so each allreduce starts as soon as the backward pass produced its gradient,
+    overlapping the communication with the rest of the backward pass, and are then
+    clipped once by their global norm (clip_mode "global"). Horovod fuses
+    the tensors ready within hvd_cycle_time_ms into buckets of at most
+    hvd_fusion_threshold_mb, and hvd_compression "fp16" halves the bytes sent.
+    """
+    default_config = {
+        **BaseSolver.default_config,
+        "hvd_fusion_threshold_mb": 64,
+        "hvd_cycle_time_ms": 5.0,
+        "hvd_compression": "none",
+        "clip_mode": "global"
+    }
+    supports_jit_compile = False
+
+    def __init__(self, model, optimizer, sample_signature, config=None,
+                 batch_transform=None, **kwargs):
+        super().__init__(model, optimizer, sample_signature, config=config,
+                         batch_transform=batch_transform, **kwargs)
+        compressions = {"none": hvd.Compression.none, "fp16": hvd.Compression.fp16}
+        if self.hparams.hvd_compression not in compressions:
+            raise ValueError("unsupported hvd_compression: {}".format(
+                self.hparams.hvd_compression))
+        self.compression = compressions[self.hparams.hvd_compression]
 
     @staticmethod
-    def initialize_devices(visible_gpu_idx=None):
-        """ initialize hvd devices, should be called firstly """
+    def initialize_devices(visible_gpu_idx=None, solver_config=None):
+        """ initialize hvd devices, should be called firstly. The fusion settings of
+        solver_config are passed to Horovod, which reads them in hvd.init()
+        """
         if visible_gpu_idx is not None:
             warnings.warn("we can not set the visible gpu idx like this")
+        config = dict(HorovodSolver.default_config)
+        if solver_config is not None:
+            config.update(solver_config)
+        os.environ["HOROVOD_FUSION_THRESHOLD"] = str(
+            int(config["hvd_fusion_threshold_mb"] * 1024 * 1024))
+        os.environ["HOROVOD_CYCLE_TIME"] = str(config["hvd_cycle_time_ms"])
         hvd.init()
         gpus = tf.config.experimental.list_physical_devices("GPU")
         for gpu in gpus:
@@ -135,52 +541,46 @@ class HorovodSolver(BaseSolver):
         if gpus:
             tf.config.experimental.set_visible_devices(gpus[hvd.local_rank()], "GPU")
 
-    def train_step(self, samples):
-        """ train the model 1 step """
-        with tf.GradientTape() as tape:
-            logits = self.model(samples, training=True)
-            loss, metrics = self.model.get_loss(logits, samples, training=True)
-        # Horovod: add Horovod Distributed GradientTape.
-        tape = hvd.DistributedGradientTape(tape)
-        grads = tape.gradient(loss, self.model.trainable_variables)
-        grads = self.clip_by_norm(grads, self.hparams.clip_norm)
-        self.optimizer.apply_gradients(zip(grads, self.model.trainable_variables))
-        return loss, metrics
+    def reduce_gradients(self, grads):
+        """ average the gradients over the workers, called once per update, i.e. on
+        the final micro-batch only when accumulating gradients
+        """
+        return [
+            None if grad is None else hvd.allreduce(grad, compression=self.compression)
+            for grad in grads
+        ]
 
     def train(self, dataset, total_batches=-1):
         """ Update the model in 1 epoch """
-        train_step = self.train_step
-        if self.hparams.enable_tf_function:
-            logging.info("please be patient, enable tf.function, it takes time ...")
-            train_step = tf.function(train_step, input_signature=self.sample_signature)
+        train_step, finish = self.get_train_step()
+        batch = -1
         for batch, samples in enumerate(dataset.take(total_batches)):
             # train 1 step
-            samples = self.model.prepare_samples(samples)
-            loss, metrics = train_step(samples)
+            samples = self.prepare_samples(samples)
+            loss, metrics, updated = train_step(batch, samples)
             # Horovod: broadcast initial variable states from rank 0 to all other processes.
             # This is necessary to ensure consistent initialization of all workers when
             # training is started with random weights or restored from a checkpoint.
             #
             # Note: broadcast should be done after the first gradient step to ensure optimizer
             # initialization.
-            if batch == 0:
+            if updated and (batch + 1) // max(self.hparams.accum_steps, 1) == 1:
                 hvd.broadcast_variables(self.model.trainable_variables, root_rank=0)
                 hvd.broadcast_variables(self.optimizer.variables(), root_rank=0)
-            if batch % self.hparams.log_interval == 0 and hvd.local_rank() == 0:
-                logging.info(self.metric_checker(loss, metrics))
-                self.model.reset_metrics()
+            if self.is_log_step(batch, updated) and hvd.local_rank() == 0:
+                self.log_train_step(loss, metrics)
+        finish(batch + 1)
+        if hvd.local_rank() == 0:
+            self.log_skipped_updates()
 
     def evaluate(self, dataset, epoch=0):
         """ evaluate the model """
         loss_metric = tf.keras.metrics.Mean(name="AverageLoss")
         loss, metrics = None, None
-        evaluate_step = self.evaluate_step
-        if self.hparams.enable_tf_function:
-            logging.info("please be patient, enable tf.function, it takes time ...")
-            evaluate_step = tf.function(evaluate_step, input_signature=self.sample_signature)
+        evaluate_step = self.get_evaluate_step()
         self.model.reset_metrics()
         for batch, samples in enumerate(dataset):
-            samples = self.model.prepare_samples(samples)
+            samples = self.prepare_samples(samples)
             loss, metrics = evaluate_step(samples)
             if batch % self.hparams.log_interval == 0 and hvd.local_rank() == 0:
                 logging.info(self.metric_checker(loss, metrics, -2))
@@ -193,18 +593,30 @@ class HorovodSolver(BaseSolver):
 
 class DecoderSolver(BaseSolver):
     """ DecoderSolver
+
+    With "profile": true, the time of each decoding stage is accumulated per
+    utterance by a DecodeProfiler, whose RTF and percentiles by utterance duration
+    are logged at the end. The durations are the numbers of input frames times
+    frame_shift seconds. The stage data_wait is the wait for the next samples of the
+    dataset with their batch_transform, the features being computed by the input
+    pipeline. With "profile_trace_dir", a TensorBoard profile of the decoding is
+    written there as well, which needs tensorflow 2.2 or later.
     """
     default_config = {
         "beam_search":True,
         "beam_size":4,
         "ctc_weight":0.0,
         "lm_weight":0.1,
-        "lm_path":"examples/asr/hkust/data/lm.bin"
+        "lm_path":"examples/asr/hkust/data/lm.bin",
+        "profile":False,
+        "profile_length_buckets":[5.0, 10.0, 20.0],
+        "profile_trace_dir":None,
+        "frame_shift":0.01
     }
 
     # pylint: disable=super-init-not-called
-    def __init__(self, model, config=None):
-        super().__init__(model, None, None)
+    def __init__(self, model, config=None, batch_transform=None):
+        super().__init__(model, None, None, batch_transform=batch_transform)
         self.model = model
         self.hparams = hparam.HParams(cls=self.__class__)
         for keys in self.default_config:
@@ -216,23 +628,42 @@ class DecoderSolver(BaseSolver):
         """ decode the model """
         if dataset is None:
             return
-        metric = CharactorAccuracy()
-        for _, samples in enumerate(dataset):
-            begin = time.time()
-            samples = self.model.prepare_samples(samples)
-            predictions = self.model.decode(samples, self.hparams)
-            validated_preds = validate_seqs(predictions, self.model.eos)[0]
-            validated_preds = tf.cast(validated_preds, tf.int64)
-            num_errs, _ = metric.update_state(validated_preds, samples)
-            reports = (
-                "predictions: %s\tlabels: %s\terrs: %d\tavg_acc: %.4f\tsec/iter: %.4f"
-                % (
-                    predictions,
-                    samples["output"].numpy(),
-                    num_errs,
-                    metric.result(),
-                    time.time() - begin,
-                )
+        metric = ErrorRate()
+        profiler = None
+        if self.hparams.profile:
+            profiler = DecodeProfiler(
+                self.hparams.profile_length_buckets, self.hparams.profile_trace_dir
             )
-            logging.info(reports)
+        iterator = iter(dataset)
+        with profiler if profiler is not None else contextlib.nullcontext():
+            while True:
+                fetch_begin = time.time()
+                with profile_stage("data_wait"):
+                    samples = next(iterator, None)
+                    if samples is None:
+                        break
+                    samples = self.prepare_samples(samples)
+                begin = time.time()
+                predictions = self.model.decode(samples, self.hparams)
+                validated_preds = truncate_seqs(tf.cast(predictions, tf.int64), self.model.eos)
+                num_errs, num_labels = metric.update_state(validated_preds, samples)
+                if profiler is not None:
+                    duration = float(tf.reduce_sum(samples["input_length"])) \
+                        * self.hparams.frame_shift
+                    profiler.end_utterance(duration, time.time() - fetch_begin)
+                reports = (
+                    "predictions: %s\tlabels: %s\terrs: %s\terr_rates: %s\tavg_acc: %.4f"
+                    "\tsec/iter: %.4f"
+                    % (
+                        predictions,
+                        samples["output"].numpy(),
+                        num_errs.numpy().astype(int),
+                        np.round(tf.math.divide_no_nan(num_errs, num_labels).numpy(), 4),
+                        1.0 - metric.result(),
+                        time.time() - begin,
+                    )
+                )
+                logging.info(reports)
         logging.info("decoding finished")
+        if profiler is not None:
+            logging.info("decoding profile:\n%s" % profiler.report())
@@ -17,6 +17,7 @@
 """ the beam search decoder layer in encoder-decoder models """
 from collections import namedtuple
 import tensorflow as tf
+from ..utils.profiler import profile_stage
 
 CandidateHolder = namedtuple(
     "CandidateHolder",
@@ -78,9 +79,10 @@ class BeamSearchDecoder:
             tf.float32, size=0, dynamic_size=True, clear_after_read=False
         )
         cand_seqs = cand_seqs.unstack(tf.transpose(candidate_holder.cand_seqs, [1, 0]))
-        logits, new_cand_logits, states = self.decoder_one_step(
-            cand_logits, cand_seqs, self.states, encoder_outputs
-        )
+        with profile_stage("decoder_step"):
+            logits, new_cand_logits, states = self.decoder_one_step(
+                cand_logits, cand_seqs, self.states, encoder_outputs
+            )
         new_states = candidate_holder.cand_states
         self.states = states
         cand_scores = tf.expand_dims(candidate_holder.cand_scores, axis=1)
@@ -89,7 +91,8 @@ class BeamSearchDecoder:
         new_scores = logprobs + cand_scores  # shape: (cand_num, num_syms)
         if self.scorers:
             for scorer in self.scorers:
-                other_scores, new_states = scorer.score(candidate_holder, new_scores)
+                with profile_stage(scorer.stage):
+                    other_scores, new_states = scorer.score(candidate_holder, new_scores)
                 if other_scores is not None:
                     new_scores += other_scores
         new_cand_logits = tf.transpose(new_cand_logits.stack(), [1, 0, 2])
@@ -227,18 +230,19 @@ class BeamSearchDecoder:
                 candidate_holder, encoder_outputs
             )
             # extract seqs with end symbol
-            (
-                completed_scores,
-                completed_seqs,
-                completed_length,
-            ) = self.deal_with_completed(
-                completed_scores,
-                completed_seqs,
-                completed_length,
-                new_scores,
-                candidate_holder,
-                max_seq_len,
-            )
+            with profile_stage("top_k"):
+                (
+                    completed_scores,
+                    completed_seqs,
+                    completed_length,
+                ) = self.deal_with_completed(
+                    completed_scores,
+                    completed_seqs,
+                    completed_length,
+                    new_scores,
+                    candidate_holder,
+                    max_seq_len,
+                )
             if (pos + 1) >= max_seq_len:
                 break
             not_eos = tf.range(self.num_syms) != self.eos
@@ -260,9 +264,10 @@ class BeamSearchDecoder:
                 and max_new_score_rescale < min_completed_score_rescale
             ):
                 break
-            candidate_holder = self.deal_with_uncompleted(
-                new_scores, new_cand_logits, new_states, candidate_holder
-            )
+            with profile_stage("top_k"):
+                candidate_holder = self.deal_with_uncompleted(
+                    new_scores, new_cand_logits, new_states, candidate_holder
+                )
             encoder_output, input_mask = encoder_outputs
             encoder_output = tf.tile(
                 encoder_output[:1], [tf.shape(candidate_holder.cand_seqs)[0], 1, 1]
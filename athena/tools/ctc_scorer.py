@@ -24,6 +24,9 @@ class CTCPrefixScorer:
     "HYBRID CTC/ATTENTION ARCHITECTURE FOR END-TO-END SPEECH RECOGNITION,"
     """
 
+    # the name of its time in the decoding profile
+    stage = "ctc_scorer"
+
     def __init__(self, eos, ctc_beam, num_classes, blank=-1, ctc_weight=0.25):
         self.logzero = -10000000000.0
         self.eos = eos
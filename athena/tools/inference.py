@@ -0,0 +1,307 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# pylint: disable=invalid-name, protected-access
+""" the inference functions of the trained models in tf.Module, which are exported
+as the signatures of a SavedModel. The inputs are the features of the dataset
+builder, i.e. already normalized, with their lengths. The predictions are int32,
+without sos and eos and padded with 0.
+"""
+import numpy as np
+import tensorflow as tf
+from ..models.speech_transformer import SpeechTransformer
+from ..models.mtl_seq2seq import MtlTransformerCtc
+from ..models.deep_speech import DeepSpeechModel
+from ..metrics import CTCAccuracy
+from ..utils.misc import generate_square_subsequent_mask, compact_seqs
+
+MAX_DECODE_LENGTH = 100
+
+
+def count_before_eos(seqs, eos):
+    """ the number of labels before the first eos of each sequence """
+    not_eos = tf.cast(tf.not_equal(seqs, eos), tf.int32)
+    return tf.reduce_sum(tf.math.cumprod(not_eos, axis=1), axis=1)
+
+
+class Seq2SeqInference(tf.Module):
+    """ the inference functions of SpeechTransformer, also of the one inside
+    MtlTransformerCtc, whose CTC branch is not used:
+
+        encode(input, input_length) -> encoder_output, input_mask
+        decode_step(encoder_output, input_mask, history) -> logprobs
+        decode_steps(encoder_output, input_mask, history) -> logprobs
+        greedy_decode(input, input_length) -> predictions, lengths
+        beam_decode(input, input_length) -> predictions, lengths, scores
+
+    history starts with sos and logprobs are those of the label after it, after each
+    of its prefixes for decode_steps, which the TFLite models of athena/tools/tflite.py
+    take to decode a padded history. beam_decode
+    keeps beam_size beams per utterance, ranked by length normalized scores as
+    BeamSearchDecoder but without the scorers of the LM and CTC. The ids of sos and
+    eos are saved as the variables sos and eos for the clients of decode_step, with
+    max_decode_length, the maximal number of decoding steps.
+    """
+
+    def __init__(self, model, input_spec, beam_size=4, max_decode_length=MAX_DECODE_LENGTH):
+        super().__init__()
+        self.model = model
+        self.beam_size = beam_size
+        self.sos = tf.Variable(model.sos, trainable=False, name="sos")
+        self.eos = tf.Variable(model.eos, trainable=False, name="eos")
+        self.max_decode_length = tf.Variable(
+            max_decode_length, trainable=False, name="max_decode_length"
+        )
+        input_spec = tf.TensorSpec(input_spec.shape, tf.float32, name="input")
+        length_spec = tf.TensorSpec([None], tf.int32, name="input_length")
+        encoder_spec = tf.TensorSpec(
+            [None, None, model.hparams.d_model], tf.float32, name="encoder_output"
+        )
+        mask_spec = tf.TensorSpec([None, 1, 1, None], tf.float32, name="input_mask")
+        history_spec = tf.TensorSpec([None, None], tf.int32, name="history")
+        self.encode = tf.function(self._encode, input_signature=[input_spec, length_spec])
+        self.decode_step = tf.function(
+            self._decode_step, input_signature=[encoder_spec, mask_spec, history_spec]
+        )
+        self.decode_steps = tf.function(
+            self._decode_steps, input_signature=[encoder_spec, mask_spec, history_spec]
+        )
+        self.greedy_decode = tf.function(
+            self._greedy_decode, input_signature=[input_spec, length_spec]
+        )
+        self.beam_decode = tf.function(
+            self._beam_decode, input_signature=[input_spec, length_spec]
+        )
+
+    def signatures(self):
+        """ the signatures to export """
+        return {
+            "encode": self.encode,
+            "decode_step": self.decode_step,
+            "decode_steps": self.decode_steps,
+            "greedy_decode": self.greedy_decode,
+            "beam_decode": self.beam_decode,
+        }
+
+    def _encode(self, inputs, input_length):
+        """ the encoder output and its mask """
+        x = self.model.x_net(inputs, training=False)
+        logit_length = self.model.compute_logit_length({"input_length": input_length})
+        input_mask, _ = self.model._create_masks(x, logit_length, None)
+        encoder_output = self.model.transformer.encoder(x, input_mask, training=False)
+        return {"encoder_output": tf.cast(encoder_output, tf.float32), "input_mask": input_mask}
+
+    def decoder_output(self, encoder_output, input_mask, history):
+        """ the decoder output of each position of the histories """
+        decoder = self.model.transformer.decoder
+        y = self.model.y_net(history, training=False)
+        return decoder(
+            y,
+            tf.cast(encoder_output, decoder.compute_dtype),
+            tgt_mask=generate_square_subsequent_mask(tf.shape(history)[1]),
+            memory_mask=input_mask,
+            training=False,
+        )
+
+    def _decode_step(self, encoder_output, input_mask, history):
+        """ the log probabilities of the next label of each history """
+        y = self.decoder_output(encoder_output, input_mask, history)
+        logits = self.model.final_layer(y[:, -1, :])
+        return {"logprobs": tf.nn.log_softmax(logits)}
+
+    def _decode_steps(self, encoder_output, input_mask, history):
+        """ the log probabilities of the label after each prefix of the histories """
+        logits = self.model.final_layer(self.decoder_output(encoder_output, input_mask, history))
+        return {"logprobs": tf.nn.log_softmax(logits)}
+
+    def _greedy_decode(self, inputs, input_length):
+        """ decode the best label step by step until eos or max_decode_length """
+        encoded = self._encode(inputs, input_length)
+        sos, eos = self.model.sos, self.model.eos
+        batch = tf.shape(inputs)[0]
+
+        def cond(step, history, finished):
+            return tf.logical_and(
+                step < self.max_decode_length, tf.logical_not(tf.reduce_all(finished))
+            )
+
+        def body(step, history, finished):
+            logprobs = self._decode_step(
+                encoded["encoder_output"], encoded["input_mask"], history
+            )["logprobs"]
+            predictions = tf.argmax(logprobs, axis=-1, output_type=tf.int32)
+            predictions = tf.where(finished, eos, predictions)
+            history = tf.concat([history, predictions[:, tf.newaxis]], axis=1)
+            return step + 1, history, tf.logical_or(finished, tf.equal(predictions, eos))
+
+        _, history, _ = tf.while_loop(
+            cond,
+            body,
+            [0, tf.fill([batch, 1], sos), tf.zeros([batch], tf.bool)],
+            shape_invariants=[
+                tf.TensorShape([]), tf.TensorShape([None, None]), tf.TensorShape([None])
+            ],
+        )
+        predictions = history[:, 1:]
+        lengths = count_before_eos(predictions, eos)
+        predictions *= tf.sequence_mask(lengths, tf.shape(predictions)[1], tf.int32)
+        return {"predictions": predictions, "lengths": lengths}
+
+    def _beam_decode(self, inputs, input_length):
+        """ beam search of each utterance with beam_size beams, the beams of all the
+        utterances being decoded together as a batch of batch * beam_size histories
+        """
+        encoded = self._encode(inputs, input_length)
+        sos, eos = self.model.sos, self.model.eos
+        num_classes = self.model.num_classes
+        beam_size = self.beam_size
+        batch = tf.shape(inputs)[0]
+        # the utterance of each beam, the beams of an utterance following each other
+        utterances = tf.range(batch * beam_size) // beam_size
+        encoder_output = tf.gather(encoded["encoder_output"], utterances)
+        input_mask = tf.gather(encoded["input_mask"], utterances)
+        # the index of the first beam of each utterance in the batch of beams
+        offsets = tf.range(batch)[:, tf.newaxis] * beam_size
+        # a finished beam can only be followed by eos, at no cost
+        eos_only = tf.where(tf.equal(tf.range(num_classes), eos), 0.0, -np.inf)
+        # all the beams start from the same sos, only the first one is kept
+        init_scores = tf.tile(
+            tf.concat([[0.0], tf.fill([beam_size - 1], -np.inf)], axis=0)[tf.newaxis, :],
+            [batch, 1],
+        )
+
+        def cond(step, seqs, scores, finished):
+            return tf.logical_and(
+                step < self.max_decode_length, tf.logical_not(tf.reduce_all(finished))
+            )
+
+        def body(step, seqs, scores, finished):
+            logprobs = self._decode_step(encoder_output, input_mask, seqs)["logprobs"]
+            logprobs = tf.where(finished[:, tf.newaxis], eos_only[tf.newaxis, :], logprobs)
+            candidates = tf.reshape(scores, [-1, 1]) + logprobs
+            scores, indices = tf.math.top_k(
+                tf.reshape(candidates, [batch, beam_size * num_classes]), k=beam_size
+            )
+            parents = tf.reshape(indices // num_classes + offsets, [-1])
+            labels = tf.reshape(indices % num_classes, [-1])
+            seqs = tf.concat([tf.gather(seqs, parents), labels[:, tf.newaxis]], axis=1)
+            finished = tf.logical_or(tf.gather(finished, parents), tf.equal(labels, eos))
+            return step + 1, seqs, scores, finished
+
+        _, seqs, scores, _ = tf.while_loop(
+            cond,
+            body,
+            [
+                0,
+                tf.fill([batch * beam_size, 1], sos),
+                init_scores,
+                tf.zeros([batch * beam_size], tf.bool),
+            ],
+            shape_invariants=[
+                tf.TensorShape([]), tf.TensorShape([None, None]),
+                tf.TensorShape([None, None]), tf.TensorShape([None])
+            ],
+        )
+        predictions = seqs[:, 1:]
+        lengths = count_before_eos(predictions, eos)
+        # the scores are normalized by the lengths including eos
+        normalized = scores / tf.cast(tf.reshape(lengths, [batch, beam_size]) + 1, tf.float32)
+        best = tf.argmax(normalized, axis=1, output_type=tf.int32) + offsets[:, 0]
+        predictions = tf.gather(predictions, best)
+        lengths = tf.gather(lengths, best)
+        predictions *= tf.sequence_mask(lengths, tf.shape(predictions)[1], tf.int32)
+        scores = tf.gather(tf.reshape(scores, [-1]), best)
+        return {"predictions": predictions, "lengths": lengths, "scores": scores}
+
+
+class CTCInference(tf.Module):
+    """ the inference functions of CTC models like DeepSpeechModel:
+
+        encode(input, input_length) -> logits, logit_length
+        greedy_decode(input, input_length) -> predictions, lengths
+        beam_decode(input, input_length) -> predictions, lengths, scores
+
+    beam_decode is the CTC prefix beam search of tf.nn.ctc_beam_search_decoder.
+    """
+
+    def __init__(self, model, input_spec, beam_size=4):
+        super().__init__()
+        self.model = model
+        self.beam_size = beam_size
+        input_spec = tf.TensorSpec(input_spec.shape, tf.float32, name="input")
+        length_spec = tf.TensorSpec([None], tf.int32, name="input_length")
+        self.encode = tf.function(self._encode, input_signature=[input_spec, length_spec])
+        self.greedy_decode = tf.function(
+            self._greedy_decode, input_signature=[input_spec, length_spec]
+        )
+        self.beam_decode = tf.function(
+            self._beam_decode, input_signature=[input_spec, length_spec]
+        )
+
+    def signatures(self):
+        """ the signatures to export """
+        return {
+            "encode": self.encode,
+            "greedy_decode": self.greedy_decode,
+            "beam_decode": self.beam_decode,
+        }
+
+    def _encode(self, inputs, input_length):
+        """ the logits and their lengths """
+        samples = {"input": inputs, "input_length": input_length}
+        logits = self.model(samples, training=False)
+        logit_length = self.model.compute_logit_length(samples)
+        return {"logits": tf.cast(logits, tf.float32), "logit_length": logit_length}
+
+    def _greedy_decode(self, inputs, input_length):
+        """ the best path without repeated labels and blanks """
+        encoded = self._encode(inputs, input_length)
+        predictions = CTCAccuracy.greedy_decode(encoded["logits"], encoded["logit_length"])
+        predictions, lengths = compact_seqs(tf.cast(predictions, tf.int32))
+        return {"predictions": predictions, "lengths": lengths}
+
+    def _beam_decode(self, inputs, input_length):
+        """ the best path of the CTC prefix beam search """
+        encoded = self._encode(inputs, input_length)
+        decoded, log_probs = tf.nn.ctc_beam_search_decoder(
+            tf.transpose(encoded["logits"], [1, 0, 2]),
+            encoded["logit_length"],
+            beam_width=self.beam_size,
+            top_paths=1,
+        )
+        decoded = tf.cast(decoded[0], tf.int32)
+        ones = tf.SparseTensor(
+            decoded.indices, tf.ones_like(decoded.values), decoded.dense_shape
+        )
+        return {
+            "predictions": tf.sparse.to_dense(decoded),
+            "lengths": tf.sparse.reduce_sum(ones, axis=1),
+            "scores": log_probs[:, 0],
+        }
+
+
+def build_inference_module(model, input_spec, beam_size=4,
+                           max_decode_length=MAX_DECODE_LENGTH):
+    """ the inference module of a SpeechTransformer, MtlTransformerCtc or
+    DeepSpeechModel, input_spec being the "input" of the sample_signature
+    """
+    if isinstance(model, MtlTransformerCtc):
+        model = model.model
+    if isinstance(model, SpeechTransformer):
+        return Seq2SeqInference(model, input_spec, beam_size, max_decode_length)
+    if isinstance(model, DeepSpeechModel):
+        return CTCInference(model, input_spec, beam_size)
+    raise ValueError("inference is not supported for {}".format(type(model).__name__))
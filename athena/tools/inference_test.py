@@ -0,0 +1,85 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""The model tests the inference signatures of a tiny SpeechTransformer."""
+
+import tensorflow as tf
+from athena.models.speech_transformer import SpeechTransformer
+from athena.tools.inference import build_inference_module
+
+CONFIG = {
+    "num_filters": 4,
+    "d_model": 8,
+    "num_heads": 2,
+    "num_encoder_layers": 1,
+    "num_decoder_layers": 1,
+    "dff": 16,
+    "rate": 0.0,
+}
+
+
+class Seq2SeqInferenceTest(tf.test.TestCase):
+    """
+        greedy_decode and beam_decode of a randomly initialized SpeechTransformer.
+    """
+    def build_module(self, beam_size):
+        tf.random.set_seed(1)
+        model = SpeechTransformer(5, {"input": tf.TensorShape([None, 20, 1])}, CONFIG)
+        input_spec = tf.TensorSpec([None, None, 20, 1], tf.float32)
+        return build_inference_module(model, input_spec, beam_size, max_decode_length=6)
+
+    def check_outputs(self, outputs, batch):
+        predictions, lengths = outputs["predictions"], outputs["lengths"]
+        self.assertEqual(predictions.shape[0], batch)
+        self.assertLessEqual(predictions.shape[1], 6)
+        self.assertAllEqual(
+            predictions * tf.sequence_mask(lengths, predictions.shape[1], tf.int32),
+            predictions,
+        )
+
+    def test_decode(self):
+        module = self.build_module(beam_size=3)
+        inputs = tf.random.normal([2, 32, 20, 1])
+        input_length = tf.constant([32, 24])
+        self.check_outputs(module.greedy_decode(inputs, input_length), 2)
+        outputs = module.beam_decode(inputs, input_length)
+        self.check_outputs(outputs, 2)
+        self.assertEqual(outputs["scores"].shape, [2])
+
+    def test_single_beam(self):
+        # a single beam follows the greedy path
+        module = self.build_module(beam_size=1)
+        inputs = tf.random.normal([2, 32, 20, 1])
+        input_length = tf.constant([32, 24])
+        greedy = module.greedy_decode(inputs, input_length)
+        beam = module.beam_decode(inputs, input_length)
+        self.assertAllEqual(greedy["lengths"], beam["lengths"])
+        self.assertAllEqual(greedy["predictions"], beam["predictions"])
+
+    def test_saved_model(self):
+        module = self.build_module(beam_size=2)
+        export_dir = self.get_temp_dir()
+        tf.saved_model.save(module, export_dir, signatures=module.signatures())
+        saved_model = tf.saved_model.load(export_dir)
+        outputs = saved_model.signatures["beam_decode"](
+            input=tf.random.normal([1, 16, 20, 1]), input_length=tf.constant([16])
+        )
+        self.check_outputs(outputs, 1)
+        self.assertEqual(int(saved_model.max_decode_length.numpy()), 6)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -7,6 +7,9 @@ class NGramScorer(object):
     KenLM language model
     """
 
+    # the name of its time in the decoding profile
+    stage = "lm_scorer"
+
     def __init__(self, lm_path, sos, eos, num_syms, lm_weight=0.1):
         """
         Basic params will be initialized, the kenlm model will be created from
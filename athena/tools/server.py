@@ -0,0 +1,208 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# pylint: disable=broad-except
+""" a local inference server on asyncio sockets, batching the concurrent requests.
+
+A request is a command byte and the length of its payload as a big endian uint32,
+followed by the payload:
+
+    b"T" + length + wav bytes: transcribe, answered by {"transcript", "latency_ms"}
+    b"S" + length + b"": the stats, queue depth and latency percentiles
+
+A response is the length of its utf-8 json as a big endian uint32 followed by the
+json, {"error": message} when the request failed. A connection can send several
+requests one after another.
+"""
+import json
+import time
+import struct
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+REQUEST_HEADER = struct.Struct(">cI")
+RESPONSE_HEADER = struct.Struct(">I")
+TRANSCRIBE = b"T"
+STATS = b"S"
+
+
+class InferenceServer:
+    """ queue the wav bytes of the requests and transcribe them in batches:
+    a batch starts with the oldest queued request and takes the following ones until
+    it has max_batch_size requests or the oldest one has waited max_latency_ms.
+    transcribe_batch maps a list of wav bytes to their transcripts, an exception in
+    place of a transcript failing that request only. It runs in a single thread beside
+    the event loop so that the requests keep being queued while a batch is decoded.
+
+        server = InferenceServer(transcribe_batch)
+        port = await server.start(port=8000)
+        ...
+        await server.stop()
+    """
+
+    def __init__(self, transcribe_batch, max_batch_size=8, max_latency_ms=50.0,
+                 num_latencies=1000):
+        self.transcribe_batch = transcribe_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        # the latencies of the last num_latencies requests for the percentiles
+        self.latencies = collections.deque(maxlen=num_latencies)
+        self.num_requests = 0
+        self.num_batches = 0
+        self.num_batched = 0
+        self.queue = None
+        self.server = None
+        self.batcher = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def start(self, host="127.0.0.1", port=0):
+        """ start serving on host:port, returns the port, picked by the system if 0 """
+        self.queue = asyncio.Queue()
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        self.batcher = asyncio.ensure_future(self.run_batches())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """ close the server and cancel the batching """
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        try:
+            await self.batcher
+        except asyncio.CancelledError:
+            pass
+        self.executor.shutdown()
+
+    async def next_batch(self):
+        """ the next requests to transcribe together """
+        batch = [await self.queue.get()]
+        deadline = batch[0][2] + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # the requests which waited during the previous batch are already late
+        while len(batch) < self.max_batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def run_batches(self):
+        """ transcribe the queued requests batch by batch """
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self.next_batch()
+            try:
+                transcripts = await loop.run_in_executor(
+                    self.executor, self.transcribe_batch, [wav for wav, _, _ in batch]
+                )
+                if len(transcripts) != len(batch):
+                    raise RuntimeError("{} transcripts for a batch of {} requests".format(
+                        len(transcripts), len(batch)))
+            except Exception as error:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.num_batches += 1
+            self.num_batched += len(batch)
+            for (_, future, _), transcript in zip(batch, transcripts):
+                if future.done():
+                    continue
+                if isinstance(transcript, Exception):
+                    future.set_exception(transcript)
+                else:
+                    future.set_result(transcript)
+
+    async def transcribe(self, wav):
+        """ queue wav and wait for its transcript """
+        self.num_requests += 1
+        arrival = time.time()
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((wav, future, arrival))
+        try:
+            transcript = await future
+        except Exception as error:
+            return {"error": "{}: {}".format(type(error).__name__, error)}
+        latency = time.time() - arrival
+        self.latencies.append(latency)
+        return {"transcript": transcript, "latency_ms": latency * 1000}
+
+    def stats(self):
+        """ the queue depth, the batching and the percentiles of the latencies """
+        latencies = np.array(self.latencies) * 1000
+        stats = {
+            "queue_depth": self.queue.qsize(),
+            "requests": self.num_requests,
+            "batches": self.num_batches,
+            "mean_batch_size": self.num_batched / self.num_batches if self.num_batches else 0.0,
+        }
+        for percentile in [50, 95, 99]:
+            stats["p{}_ms".format(percentile)] = (
+                float(np.percentile(latencies, percentile)) if len(latencies) > 0 else None
+            )
+        return stats
+
+    async def handle_client(self, reader, writer):
+        """ answer the requests of a connection until it is closed """
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(REQUEST_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                command, length = REQUEST_HEADER.unpack(header)
+                payload = await reader.readexactly(length)
+                if command == TRANSCRIBE:
+                    response = await self.transcribe(payload)
+                elif command == STATS:
+                    response = self.stats()
+                else:
+                    response = {"error": "unknown command {!r}".format(command)}
+                response = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                writer.write(RESPONSE_HEADER.pack(len(response)) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def request(command, payload=b"", host="127.0.0.1", port=8000):
+    """ send one request to the server and return its json response """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(REQUEST_HEADER.pack(command, len(payload)) + payload)
+        await writer.drain()
+        (length,) = RESPONSE_HEADER.unpack(await reader.readexactly(RESPONSE_HEADER.size))
+        return json.loads((await reader.readexactly(length)).decode("utf-8"))
+    finally:
+        writer.close()
+
+
+def transcribe(wav, host="127.0.0.1", port=8000):
+    """ the response of the server to the wav bytes, for the local clients """
+    return asyncio.run(request(TRANSCRIBE, wav, host, port))
+
+
+def server_stats(host="127.0.0.1", port=8000):
+    """ the stats of the server, for the local clients """
+    return asyncio.run(request(STATS, b"", host, port))
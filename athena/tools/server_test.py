@@ -0,0 +1,110 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""The model tests the request batching of the inference server with local clients."""
+
+import time
+import asyncio
+import tensorflow as tf
+from athena.tools.server import InferenceServer, request, TRANSCRIBE, STATS
+
+
+class FakeTranscriber:
+    """ transcribe the wav bytes as their text, recording the batch sizes. b"bad" fails
+    with a ValueError, b"lost" drops the last transcript of its batch
+    """
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, wavs):
+        self.batch_sizes.append(len(wavs))
+        time.sleep(0.05)
+        transcripts = [
+            ValueError("bad wav") if wav == b"bad" else wav.decode("utf-8") for wav in wavs
+        ]
+        if b"lost" in wavs:
+            transcripts.pop()
+        return transcripts
+
+
+def run_clients(server, wavs):
+    """ send wavs concurrently, then ask the stats """
+
+    async def clients():
+        port = await server.start()
+        try:
+            responses = await asyncio.gather(
+                *[request(TRANSCRIBE, wav, port=port) for wav in wavs]
+            )
+            return responses, await request(STATS, port=port)
+        finally:
+            await server.stop()
+
+    return asyncio.run(clients())
+
+
+class InferenceServerTest(tf.test.TestCase):
+    """
+        Dynamic batching test with concurrent local clients.
+    """
+    def test_batching(self):
+        transcriber = FakeTranscriber()
+        server = InferenceServer(transcriber, max_batch_size=4, max_latency_ms=200)
+        wavs = [str(i).encode("utf-8") for i in range(8)]
+        responses, stats = run_clients(server, wavs)
+
+        self.assertEqual([response["transcript"] for response in responses],
+                         [str(i) for i in range(8)])
+        self.assertEqual(sum(transcriber.batch_sizes), 8)
+        self.assertLessEqual(max(transcriber.batch_sizes), 4)
+        self.assertLess(len(transcriber.batch_sizes), 8)
+        self.assertEqual(stats["requests"], 8)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+
+    def test_error(self):
+        transcriber = FakeTranscriber()
+        server = InferenceServer(transcriber, max_batch_size=1)
+        responses, stats = run_clients(server, [b"bad", b"good"])
+
+        self.assertIn("bad wav", responses[0]["error"])
+        self.assertEqual(responses[1]["transcript"], "good")
+        self.assertEqual(stats["batches"], 2)
+
+    def test_error_in_batch(self):
+        transcriber = FakeTranscriber()
+        server = InferenceServer(transcriber, max_batch_size=4, max_latency_ms=200)
+        responses, stats = run_clients(server, [b"bad", b"good", b"ok"])
+
+        self.assertEqual(transcriber.batch_sizes, [3])
+        self.assertIn("bad wav", responses[0]["error"])
+        self.assertEqual(responses[1]["transcript"], "good")
+        self.assertEqual(responses[2]["transcript"], "ok")
+        self.assertEqual(stats["batches"], 1)
+
+    def test_missing_transcripts(self):
+        transcriber = FakeTranscriber()
+        server = InferenceServer(transcriber, max_batch_size=4, max_latency_ms=200)
+        responses, stats = run_clients(server, [b"lost", b"good"])
+
+        for response in responses:
+            self.assertIn("1 transcripts for a batch of 2 requests", response["error"])
+        self.assertEqual(stats["batches"], 0)
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,135 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# pylint: disable=invalid-name
+""" the TFLite models of a SavedModel exported by athena/export_main.py.
+
+The TFLite converter of tensorflow 2.0 converts one concrete function whose inputs
+have static shapes, so each model is converted from a signature whose inputs are
+given static shapes: one utterance padded to max_frames frames for encode and,
+for decode_steps of the attention models, a history padded to max_decode_length
++ 1 labels. The logprobs of the label after history[:, :step + 1] are then
+those of position step, the look-ahead mask of the decoder keeping the padding
+from changing them.
+
+    functions = static_signatures(tf.saved_model.load(export_dir), max_frames)
+    convert(functions["encode"], "encode.tflite")
+    encode = TFLiteFunction("encode.tflite", functions["encode"])
+    outputs = encode(input=pad_input(feats, max_frames), input_length=lengths)
+"""
+import numpy as np
+import tensorflow as tf
+from .inference import MAX_DECODE_LENGTH
+
+MAX_FRAMES = 3000
+
+
+def max_decode_length_of(saved_model):
+    """ the max_decode_length of saved_model, the default one for the SavedModels
+    exported before it was saved
+    """
+    if hasattr(saved_model, "max_decode_length"):
+        return int(saved_model.max_decode_length.numpy())
+    return MAX_DECODE_LENGTH
+
+
+def input_names(function):
+    """ the names of the inputs of a concrete function, in the order of the inputs of
+    its TFLite model
+    """
+    return [tensor.name.split(":")[0] for tensor in function.inputs
+            if tensor.dtype != tf.resource]
+
+
+def static_signatures(saved_model, max_frames=MAX_FRAMES):
+    """ the encode and, for the attention models, decode_steps signatures of
+    saved_model with static input shapes. The signatures of saved_model then only
+    take inputs of these shapes
+    """
+    encode = saved_model.signatures["encode"]
+    shapes = {tensor.name.split(":")[0]: tensor.shape.as_list() for tensor in encode.inputs}
+    shapes["input"] = [1, max_frames] + shapes["input"][2:]
+    shapes["input_length"] = [1]
+    encoded = encode(
+        input=tf.zeros(shapes["input"]), input_length=tf.constant([max_frames])
+    )
+    functions = {"encode": encode}
+    if "decode_steps" in saved_model.signatures:
+        functions["decode_steps"] = saved_model.signatures["decode_steps"]
+        shapes["encoder_output"] = encoded["encoder_output"].shape.as_list()
+        shapes["input_mask"] = encoded["input_mask"].shape.as_list()
+        shapes["history"] = [1, max_decode_length_of(saved_model) + 1]
+    for function in functions.values():
+        for tensor in function.inputs:
+            if tensor.dtype != tf.resource:
+                tensor.set_shape(shapes[tensor.name.split(":")[0]])
+    return functions
+
+
+def convert(function, tflite_file, mode="float", representative_inputs=None):
+    """ convert the concrete function to tflite_file, in float32 if mode is "float",
+    with int8 weights if "dynamic", with int8 weights and activations if "static",
+    calibrated on representative_inputs, dicts of the inputs of function by name.
+    The ops without TFLite or int8 kernels are kept in float32 as tensorflow ops
+    """
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([function])
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS,
+        tf.lite.OpsSet.SELECT_TF_OPS,
+    ]
+    if mode != "float":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "static":
+        names = input_names(function)
+        converter.representative_dataset = tf.lite.RepresentativeDataset(
+            lambda: ([np.asarray(inputs[name]) for name in names]
+                     for inputs in representative_inputs)
+        )
+        converter.target_spec.supported_ops.insert(0, tf.lite.OpsSet.TFLITE_BUILTINS_INT8)
+    with open(tflite_file, "wb") as file:
+        file.write(converter.convert())
+    return tflite_file
+
+
+def pad_input(inputs, max_frames=MAX_FRAMES):
+    """ pad the features of one utterance, (1, num_frames, dim, channels), to max_frames """
+    num_frames = inputs.shape[1]
+    if num_frames > max_frames:
+        raise ValueError("{} frames is longer than the {} frames of the TFLite model".format(
+            num_frames, max_frames))
+    return np.pad(inputs, [[0, 0], [0, max_frames - num_frames], [0, 0], [0, 0]])
+
+
+class TFLiteFunction:
+    """ a TFLite model called as the concrete function it was converted from, with
+    its inputs and outputs by name
+    """
+
+    def __init__(self, tflite_file, function):
+        self.interpreter = tf.lite.Interpreter(model_path=tflite_file)
+        self.interpreter.allocate_tensors()
+        self.input_names = input_names(function)
+        # the outputs are flattened in the order of their sorted names
+        self.output_names = sorted(function.structured_outputs)
+
+    def __call__(self, **inputs):
+        for name, detail in zip(self.input_names, self.interpreter.get_input_details()):
+            self.interpreter.set_tensor(detail["index"], np.asarray(inputs[name], detail["dtype"]))
+        self.interpreter.invoke()
+        return {
+            name: self.interpreter.get_tensor(detail["index"])
+            for name, detail in zip(self.output_names, self.interpreter.get_output_details())
+        }
@@ -0,0 +1,86 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""The model tests the padded TFLite models against the SavedModel signatures."""
+
+import os
+import numpy as np
+import tensorflow as tf
+from athena.models.speech_transformer import SpeechTransformer
+from athena.tools.inference import build_inference_module
+from athena.tools.tflite import static_signatures, convert, pad_input, TFLiteFunction
+
+CONFIG = {
+    "num_filters": 4,
+    "d_model": 8,
+    "num_heads": 2,
+    "num_encoder_layers": 1,
+    "num_decoder_layers": 1,
+    "dff": 16,
+    "rate": 0.0,
+}
+
+
+class TFLiteTest(tf.test.TestCase):
+    """
+        The float TFLite models of a tiny SpeechTransformer, on a padded utterance
+        and a padded history.
+    """
+    def test_float_models(self):
+        tf.random.set_seed(1)
+        model = SpeechTransformer(5, {"input": tf.TensorShape([None, 20, 1])}, CONFIG)
+        module = build_inference_module(
+            model, tf.TensorSpec([None, None, 20, 1], tf.float32), max_decode_length=4
+        )
+        export_dir = self.get_temp_dir()
+        tf.saved_model.save(module, export_dir, signatures=module.signatures())
+        saved_model = tf.saved_model.load(export_dir)
+        functions = static_signatures(tf.saved_model.load(export_dir), max_frames=40)
+        models = {
+            key: TFLiteFunction(
+                convert(function, os.path.join(export_dir, key + ".tflite")), function
+            )
+            for key, function in functions.items()
+        }
+
+        inputs = tf.random.normal([1, 32, 20, 1])
+        input_length = tf.constant([32])
+        expected = saved_model.signatures["encode"](input=inputs, input_length=input_length)
+        encoded = models["encode"](
+            input=pad_input(inputs.numpy(), 40), input_length=input_length.numpy()
+        )
+        self.assertAllClose(
+            encoded["encoder_output"][:, :8], expected["encoder_output"], atol=1e-4
+        )
+
+        history = np.array([[model.sos, 1, 2]], dtype=np.int32)
+        expected = saved_model.signatures["decode_step"](
+            encoder_output=encoded["encoder_output"],
+            input_mask=encoded["input_mask"],
+            history=history,
+        )
+        padded_history = np.full([1, 5], model.eos, dtype=np.int32)
+        padded_history[:, :3] = history
+        logprobs = models["decode_steps"](
+            encoder_output=encoded["encoder_output"],
+            input_mask=encoded["input_mask"],
+            history=padded_history,
+        )["logprobs"]
+        self.assertAllClose(logprobs[:, 2], expected["logprobs"], atol=1e-4)
+
+
+if __name__ == "__main__":
+    tf.test.main()
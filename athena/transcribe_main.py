@@ -0,0 +1,226 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# Only support tensorflow 2.0
+# pylint: disable=invalid-name, no-member
+r""" batch transcription of a manifest with parallel worker processes
+
+    python athena/transcribe_main.py config.json manifest.csv output_dir [num_workers]
+
+The manifest is a tab separated csv with a header, whose wav_filename column is
+required. The wav_length_ms, transcript and speaker columns are optional, the
+length being read from the wav header when it is missing, the transcript being the
+reference of the error count.
+
+The manifest is sharded across num_workers (default 1) processes, each restoring
+its own model from the best checkpoint of the config. The GPUs of solver_gpu are
+assigned to the workers in turn, the CPU cores are split evenly between them. The
+utterances are decoded by the beam_decode of athena/tools/inference.py (greedy_decode
+if beam_search is false in decode_config), i.e. without the LM and CTC scorers.
+Worker i appends one json line per utterance to output_dir/part-i.jsonl as soon as
+it is decoded:
+
+    {"wav_filename": ..., "hypothesis": ..., "score": ..., "duration": ...,
+     "featurize_sec": ..., "decode_sec": ..., "rtf": ..., ["reference": ...,
+     "errors": ..., "reference_length": ...]}
+
+Rerunning the same command resumes an interrupted job: the utterances already in
+output_dir are skipped, whatever the number of workers was. The number of utterances,
+the audio and decoding time, the real time factor (decoding time over audio
+duration), the throughput of this run and the error rate are printed at the end.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import wave
+import multiprocessing
+import tensorflow as tf
+from absl import logging
+from athena.main import parse_config, build_model_from_jsonfile
+from athena.tools.inference import build_inference_module
+from athena.utils.misc import edit_distance
+
+PART_PATTERN = "part-*.jsonl"
+
+
+def read_manifest(manifest):
+    """ the rows of the manifest as dicts of its header """
+    with open(manifest, "r", encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    headers = lines[0].split("\t")
+    if "wav_filename" not in headers:
+        raise ValueError("no wav_filename column in {}".format(manifest))
+    return [dict(zip(headers, line.split("\t"))) for line in lines[1:] if line]
+
+
+def audio_duration(entry):
+    """ the duration in seconds of the audio of a manifest row """
+    if entry.get("wav_length_ms"):
+        return float(entry["wav_length_ms"]) / 1000
+    with wave.open(entry["wav_filename"]) as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+
+def load_results(output_dir):
+    """ the results already written to output_dir. A line cut by an interruption is
+    removed from its file so that the worker appending to it starts on a new line
+    """
+    results = []
+    for part_file in sorted(glob.glob(os.path.join(output_dir, PART_PATTERN))):
+        with open(part_file, "r+", encoding="utf-8") as file:
+            content = file.read()
+            complete = content[: content.rfind("\n") + 1]
+            if len(complete) != len(content):
+                logging.warning("removing an incomplete line from %s" % part_file)
+                file.seek(0)
+                file.write(complete)
+                file.truncate()
+        results.extend(json.loads(line) for line in complete.splitlines() if line)
+    return results
+
+
+def initialize_worker(worker_id, num_workers, solver_gpu):
+    """ the devices and threads of a worker, before tensorflow is initialized """
+    gpus = tf.config.experimental.list_physical_devices("GPU")
+    if gpus and solver_gpu:
+        gpu = gpus[solver_gpu[worker_id % len(solver_gpu)]]
+        tf.config.experimental.set_memory_growth(gpu, True)
+        tf.config.experimental.set_visible_devices(gpu, "GPU")
+    else:
+        tf.config.experimental.set_visible_devices([], "GPU")
+    num_threads = max(os.cpu_count() // num_workers, 1)
+    tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(num_threads)
+
+
+def run_worker(jsonfile, entries, part_file, worker_id, num_workers):
+    """ transcribe entries and append their results to part_file """
+    with open(jsonfile) as file:
+        p = parse_config(json.load(file))
+    initialize_worker(worker_id, num_workers, p.solver_gpu)
+    p, model, _, checkpointer, dataset_builder = build_model_from_jsonfile(jsonfile)
+    checkpointer.restore_from_best()
+    decode_config = p.decode_config if p.decode_config is not None else {}
+    module = build_inference_module(
+        model,
+        dataset_builder.sample_signature[0]["input"],
+        beam_size=decode_config.get("beam_size", 4),
+    )
+    beam_search = decode_config.get("beam_search", True)
+    text_featurizer = dataset_builder.text_featurizer
+
+    with open(part_file, "a", encoding="utf-8") as file:
+        for entry in entries:
+            begin = time.time()
+            samples = dataset_builder.featurize(
+                entry["wav_filename"], speaker=entry.get("speaker", "global")
+            )
+            featurize_sec = time.time() - begin
+            begin = time.time()
+            if beam_search:
+                outputs = module.beam_decode(samples["input"], samples["input_length"])
+            else:
+                outputs = module.greedy_decode(samples["input"], samples["input_length"])
+            length = int(outputs["lengths"][0])
+            predictions = outputs["predictions"][0, :length].numpy().tolist()
+            decode_sec = time.time() - begin
+            duration = audio_duration(entry)
+            result = {
+                "wav_filename": entry["wav_filename"],
+                "hypothesis": text_featurizer.decode(predictions),
+                "score": float(outputs["scores"][0]) if "scores" in outputs else None,
+                "duration": duration,
+                "featurize_sec": featurize_sec,
+                "decode_sec": decode_sec,
+                "rtf": (featurize_sec + decode_sec) / duration if duration > 0 else None,
+            }
+            if entry.get("transcript"):
+                labels = text_featurizer.encode(entry["transcript"])
+                errors = edit_distance(
+                    tf.constant([predictions], tf.int32), tf.constant([length]),
+                    tf.constant([labels], tf.int32), tf.constant([len(labels)]),
+                )
+                result["reference"] = entry["transcript"]
+                result["errors"] = int(errors[0])
+                result["reference_length"] = len(labels)
+            file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            file.flush()
+    logging.info("worker %d transcribed %d utterances" % (worker_id, len(entries)))
+
+
+def report(results, done, wall_sec):
+    """ print the throughput summary of results as a markdown table, the throughput
+    of this run being that of the results not in done
+    """
+    audio_sec = sum(result["duration"] for result in results)
+    decode_sec = sum(result["featurize_sec"] + result["decode_sec"] for result in results)
+    run_audio_sec = sum(
+        result["duration"] for result in results if result["wav_filename"] not in done
+    )
+    labeled = [result for result in results if "errors" in result]
+    print("utterances | audio (s) | decoding (s) | RTF | this run (audio s/s) | error rate |")
+    print(":-------:|:-------:|:-------:|:-------:|:-------:|:-------:|")
+    print("%d | %.1f | %.1f | %.4f | %.2f | %s |" % (
+        len(results),
+        audio_sec,
+        decode_sec,
+        decode_sec / audio_sec if audio_sec > 0 else 0.0,
+        run_audio_sec / wall_sec if wall_sec > 0 else 0.0,
+        "%.4f" % (sum(result["errors"] for result in labeled)
+                  / max(sum(result["reference_length"] for result in labeled), 1))
+        if labeled else "n/a",
+    ), flush=True)
+
+
+def transcribe(jsonfile, manifest, output_dir, num_workers=1):
+    """ transcribe the utterances of manifest not yet in output_dir """
+    os.makedirs(output_dir, exist_ok=True)
+    done = set(result["wav_filename"] for result in load_results(output_dir))
+    entries = [entry for entry in read_manifest(manifest) if entry["wav_filename"] not in done]
+    logging.info("%d utterances done, %d to transcribe with %d workers"
+                 % (len(done), len(entries), num_workers))
+
+    start = time.time()
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for worker_id in range(min(num_workers, len(entries))):
+        part_file = os.path.join(output_dir, "part-{}.jsonl".format(worker_id))
+        worker = context.Process(
+            target=run_worker,
+            args=(jsonfile, entries[worker_id::num_workers], part_file, worker_id, num_workers),
+        )
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        worker.join()
+    failed = [worker_id for worker_id, worker in enumerate(workers) if worker.exitcode != 0]
+    if failed:
+        raise RuntimeError("workers {} failed, rerun to resume the job".format(failed))
+
+    report(load_results(output_dir), done, time.time() - start)
+
+
+if __name__ == "__main__":
+    logging.set_verbosity(logging.INFO)
+    if len(sys.argv) < 4:
+        logging.warning(
+            "Usage: python {} config.json manifest.csv output_dir [num_workers]".format(
+                sys.argv[0]))
+        sys.exit()
+    NUM_WORKERS = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+    transcribe(sys.argv[1], sys.argv[2], sys.argv[3], NUM_WORKERS)
@@ -15,6 +15,7 @@
 # ==============================================================================
 """The model provides a general interface for feature extraction."""
 
+import time
 import tensorflow as tf
 from athena.transform import feats
 
@@ -50,35 +51,102 @@ class AudioFeaturizer:
         if self.name != "ReadWav":
             self.read_wav = getattr(feats, "ReadWav").params(config).instantiate()
 
+        # the trace of every input kind is made once, speed is a tensor argument
+        self.trace_counts = {"file": 0, "waveform": 0, "feature": 0}
+        self.diagnostics_hook = None
+        self.__file_func = tf.function(
+            self.__featurize_file,
+            input_signature=[tf.TensorSpec([], tf.string), tf.TensorSpec([], tf.float32)],
+        )
+        self.__waveform_func = tf.function(
+            self.__featurize_waveform,
+            input_signature=[tf.TensorSpec([None], tf.float32), tf.TensorSpec([], tf.int32)],
+        )
+        self.__feature_func = tf.function(
+            self.__normalize_feature,
+            input_signature=[tf.TensorSpec(None, tf.float32)],
+        )
+
     #pylint:disable=invalid-name
     def __call__(self, audio=None, sr=None, speed=1.0):
         """extract feature from audo data
         :param audio data or audio file
         :sr sample rate
+        :speed speed of audio file, a float or a float32 scalar tensor
         :return feature
         """
-
+        begin = time.time()
         if audio is not None and not tf.is_tensor(audio):
             audio = tf.convert_to_tensor(audio)
-        if sr is not None and not tf.is_tensor(sr):
-            sr = tf.convert_to_tensor(sr)
 
-        return self.__impl(audio, sr, speed)
+        if self.name == "CMVN":
+            kind = "feature"
+            feat = self.__feature_func(tf.cast(audio, tf.float32))
+        elif audio.dtype is tf.string:
+            kind = "file"
+            feat = self.__file_func(audio, tf.cast(speed, tf.float32))
+        else:
+            kind = "waveform"
+            if sr is None:
+                sr = 16000
+            feat = self.__waveform_func(tf.cast(audio, tf.float32), tf.cast(sr, tf.int32))
+
+        if self.diagnostics_hook is not None:
+            self.diagnostics_hook(kind, self.trace_counts[kind], time.time() - begin)
+        return feat
 
-    @tf.function
-    def __impl(self, audio=None, sr=None, speed=1.0):
+    def set_diagnostics_hook(self, hook):
+        """set a function called after each call as hook(kind, trace_count, latency),
+        kind is "file", "waveform" or "feature", trace_count is the number of
+        traces of that kind so far and latency is the call time in seconds
         """
-        :param audio data or audio file, a tensor
-        :sr sample rate, a tensor
-        :return feature
+        self.diagnostics_hook = hook
+
+    def __featurize_file(self, audio, speed):
+        """
+        :param audio file, a string tensor
+        :speed speed, a float32 tensor
+        :return feature, or audio data and sample rate for ReadWav
         """
-        if self.name == "ReadWav" or self.name == "CMVN":
+        self.trace_counts["file"] += 1
+        if self.name == "ReadWav":
             return self.feat(audio, speed)
-        elif audio.dtype is tf.string:
-            audio_data, sr = self.read_wav(audio, speed)
-            return self.feat(audio_data, sr)
-        else:
-            return self.feat(audio, sr)
+        audio_data, sr = self.read_wav(audio, speed)
+        return self.feat(audio_data, sr)
+
+    def __featurize_waveform(self, audio, sr):
+        """
+        :param audio data, a float32 tensor in int16 scale
+        :sr sample rate, a int32 tensor
+        :return feature
+        """
+        self.trace_counts["waveform"] += 1
+        return self.feat(audio, sr)
+
+    def __normalize_feature(self, feature):
+        """
+        :param feature, a float32 tensor
+        :return normalized feature by CMVN
+        """
+        self.trace_counts["feature"] += 1
+        return self.feat(feature)
+
+    def multi_speed(self, audio, speeds):
+        """extract features of one audio file under several speeds, the file
+        is read and decoded only once
+        :param audio audio file
+        :param speeds a list of speed, e.g. [0.9, 1.0, 1.1]
+        :return a list of features, one for each speed
+        """
+        if self.name == "CMVN":
+            raise ValueError("CMVN does not support speed permutation")
+        if not tf.is_tensor(audio):
+            audio = tf.convert_to_tensor(audio)
+        read_wav = self.feat if self.name == "ReadWav" else self.read_wav
+        audio_list, sr = read_wav.call_multi_speed(audio, list(speeds))
+        if self.name == "ReadWav":
+            return audio_list
+        return [self.feat(audio_data, sr) for audio_data in audio_list]
 
     @property
     def dim(self):
@@ -87,6 +155,18 @@ class AudioFeaturizer:
     """
         return self.feat.dim()
 
+    @property
+    def batch_delta(self):
+        """return (order, window) if Fbank emits static features only and leaves
+    the deltas to be computed after batching, else None
+    """
+        if self.name != "Fbank":
+            return None
+        p = self.feat.config
+        if p.delta_delta and p.static_only:
+            return p.order, p.window
+        return None
+
     @property
     def num_channels(self):
         """return the channel of the feature"""
@@ -0,0 +1,49 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""The model tests the AudioFeaturizer interface """
+
+import os
+from pathlib import Path
+import tensorflow as tf
+from athena.transform.audio_featurizer import AudioFeaturizer
+
+os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+
+class AudioFeaturizerTest(tf.test.TestCase):
+    """
+    AudioFeaturizer test.
+    """
+    def test_no_retracing(self):
+        wav_path = str(Path(os.environ['MAIN_ROOT']).joinpath('examples/sm1_cln.wav'))
+
+        featurizer = AudioFeaturizer({"type": "Fbank"})
+        latencies = []
+        featurizer.set_diagnostics_hook(
+            lambda kind, trace_count, latency: latencies.append((kind, trace_count)))
+        for speed in [1.0, 0.9, 1.1, 1.0]:
+            feat = featurizer(wav_path, speed=speed)
+            self.assertEqual(feat.shape[1], featurizer.dim)
+        audio_data, sample_rate = AudioFeaturizer({"type": "ReadWav"})(wav_path)
+        featurizer(audio_data, sample_rate)
+        featurizer(audio_data[:16000], sample_rate)
+        self.assertEqual(featurizer.trace_counts["file"], 1)
+        self.assertEqual(featurizer.trace_counts["waveform"], 1)
+        self.assertEqual(len(latencies), 6)
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -76,6 +76,10 @@ class Fbank(BaseFrontend):
                                              (float, default = 23)
                 --dither			    	: Dithering constant (0.0 means no dither).
                                              (float, default = 1) [add robust to training]
+                --static_only				: If true, emit static features only even if delta_delta
+                                              is set, the deltas are computed after batching
+                                              by athena.layers.commons.DeltaDelta.
+                                              (bool, default = false)
         :return: An object of class HParams, which is a set of hyperparameters as name-value pairs.
         """
 
@@ -99,6 +103,7 @@ class Fbank(BaseFrontend):
         hparams.add_hparam("delta_delta", delta_delta)
         hparams.add_hparam("order", order)
         hparams.add_hparam("window", window)
+        hparams.add_hparam("static_only", False)
 
         if config is not None:
             hparams.parse(config, True)
@@ -106,7 +111,7 @@ class Fbank(BaseFrontend):
         hparams.type = "Fbank"
 
         hparams.add_hparam("channel", 1)
-        if hparams.delta_delta:
+        if hparams.delta_delta and not hparams.static_only:
             hparams.channel = hparams.order + 1
 
         return hparams
@@ -139,7 +144,7 @@ class Fbank(BaseFrontend):
             shape = tf.shape(fbank)
             nframe = shape[0]
             nfbank = shape[1]
-            if p.delta_delta:
+            if p.delta_delta and not p.static_only:
                 fbank = py_x_ops.delta_delta(fbank, p.order, p.window)
             if p.type == 'Fbank':
                 fbank = self.cmvn(fbank)
@@ -21,6 +21,7 @@ import tensorflow as tf
 from tensorflow.python.framework.ops import disable_eager_execution
 from athena.transform.feats.read_wav import ReadWav
 from athena.transform.feats.fbank import Fbank
+from athena.layers.commons import DeltaDelta
 
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 
@@ -90,6 +91,31 @@ class FbankTest(tf.test.TestCase):
                 del read_wav
                 del fbank
 
+    def test_fbank_static_only(self):
+        wav_path = str(Path(os.environ["MAIN_ROOT"]).joinpath("examples/sm1_cln.wav"))
+
+        with self.session():
+            read_wav = ReadWav.params().instantiate()
+            input_data, sample_rate = read_wav(wav_path)
+            conf = {"delta_delta": True, "dither": 0.0}
+            fbank = Fbank.params(conf).instantiate()
+            conf["static_only"] = True
+            static_fbank = Fbank.params(conf).instantiate()
+            self.assertEqual(static_fbank.num_channels(), 1)
+
+            fbank_feats = fbank(input_data, sample_rate)
+            static_feats = static_fbank(input_data, sample_rate)
+            # pad the batch to check that frames beyond the length are ignored
+            batch = tf.pad(tf.expand_dims(static_feats, 0), [[0, 0], [0, 7], [0, 0], [0, 0]])
+            delta_feats = DeltaDelta(order=2, window=2)(batch, tf.shape(static_feats)[:1])
+            delta_feats = delta_feats[0, : tf.shape(static_feats)[0]]
+            if tf.executing_eagerly():
+                self.assertAllClose(delta_feats.numpy(), fbank_feats.numpy(),
+                                    rtol=1e-05, atol=1e-05)
+            else:
+                self.assertAllClose(delta_feats.eval(), fbank_feats.eval(),
+                                    rtol=1e-05, atol=1e-05)
+
 
 if __name__ == "__main__":
 
@@ -72,6 +72,8 @@ class Framepow(BaseFrontend):
 
         p = self.config
         with tf.name_scope('framepow'):
+            # ReadWav with fast_read returns int16 samples
+            audio_data = tf.cast(audio_data, dtype=tf.float32)
             sample_rate = tf.cast(sample_rate, dtype=float)
             framepow = py_x_ops.frame_pow(
                 audio_data,
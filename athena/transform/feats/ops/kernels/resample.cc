@@ -165,6 +165,26 @@ void LinearResample::Resample(const vector<BaseFloat> &input,
   }
 }
 
+void LinearResample::ResampleOnce(const BaseFloat *input, int input_dim,
+                                  BaseFloat *output, int output_dim) const {
+  assert(output_dim <= NumSamplesOut(input_dim));
+  for (int samp_out = 0; samp_out < output_dim; samp_out++) {
+    int first_samp_in;
+    int samp_out_wrapped;
+    GetIndexes(samp_out, &first_samp_in, &samp_out_wrapped);
+    const vector<BaseFloat> &weights = weights_[samp_out_wrapped];
+    // equals Resample(input, false, output) on a freshly reset resampler:
+    // samples before the start of the input contribute zero.
+    BaseFloat this_output = 0.0;
+    for (int i = 0; i < int(weights.size()); i++) {
+      int input_index = first_samp_in + i;
+      if (input_index >= 0 && input_index < input_dim)
+        this_output += weights[i] * input[input_index];
+    }
+    output[samp_out] = this_output;
+  }
+}
+
 void LinearResample::SetRemainder(const vector<BaseFloat> &input) {
   vector<BaseFloat> old_remainder(input_remainder_);
   int max_remainder_needed = ceil(samp_rate_in_ * num_zeros_ /
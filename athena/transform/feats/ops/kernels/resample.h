@@ -78,6 +78,14 @@ class LinearResample {
 
   void Reset();
 
+  // Stateless single-pass resampling of a whole utterance. It does not touch
+  // the streaming state, so one resampler can be shared between threads.
+  int NumSamplesOut(int input_num_samp) const {
+    return GetNumOutputSamples(input_num_samp, false);
+  }
+  void ResampleOnce(const BaseFloat *input, int input_dim,
+                    BaseFloat *output, int output_dim) const;
+
   //// Return the input and output sampling rates (for checks, for example)
   inline int GetInputSamplingRate() { return samp_rate_in_; }
   inline int GetOutputSamplingRate() { return samp_rate_out_; }
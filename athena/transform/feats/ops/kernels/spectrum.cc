@@ -89,7 +89,8 @@ int Spectrum::init_spc(int input_size, float sample_rate) {
   return 1;
 }
 
-int Spectrum::proc_spc(const float* mic_buf, int input_size) {
+template <typename T>
+int Spectrum::proc_spc(const T* mic_buf, int input_size) {
   int n, k;
 
   if (input_size < i_WinLen)
@@ -114,7 +115,7 @@ int Spectrum::proc_spc(const float* mic_buf, int input_size) {
     for (int l = 0; l < i_WinLen; l++){
       int index = n * i_FrmLen + l;
       if (index < input_size) {
-        win_buf[l] = mic_buf[index];
+        win_buf[l] = static_cast<float>(mic_buf[index]);
       } else {
         win_buf[l] = 0.0f;
       }
@@ -186,6 +187,9 @@ int Spectrum::proc_spc(const float* mic_buf, int input_size) {
   return 1;
 }
 
+template int Spectrum::proc_spc<float>(const float* mic_buf, int input_size);
+template int Spectrum::proc_spc<int16>(const int16* mic_buf, int input_size);
+
 int Spectrum::get_spc(float* output) {
   std::memcpy((void*)output, (void*)pf_SPC, \
 		i_NumFrq * i_NumFrm * sizeof(float));
@@ -82,7 +82,9 @@ class Spectrum {
 
   int init_spc(int input_size, float sample_rate);
 
-  int proc_spc(const float* mic_buf, int input_size);
+  // mic_buf holds samples in int16 scale, either as float or as int16
+  template <typename T>
+  int proc_spc(const T* mic_buf, int input_size);
 
   int get_spc(float* output);
 
@@ -25,6 +25,7 @@ limitations under the License.
 
 namespace delta {
 
+template <typename T>
 class SpecOp : public OpKernel {
  public:
   explicit SpecOp(OpKernelConstruction* context) : OpKernel(context) {
@@ -87,7 +88,9 @@ class SpecOp : public OpKernel {
         context, context->allocate_output(0, TensorShape({i_NumFrm, i_FrqNum}),
                                           &output_tensor));
 
-    const float* input_flat = input_tensor.flat<float>().data();
+    // int16 input is converted frame by frame inside the spectrum class,
+    // so no full-length float copy of the waveform is made.
+    const T* input_flat = input_tensor.flat<T>().data();
     float* output_flat = output_tensor->flat<float>().data();
 
     int ret;
@@ -108,6 +111,11 @@ class SpecOp : public OpKernel {
   float dither_;
 };
 
-REGISTER_KERNEL_BUILDER(Name("Spectrum").Device(DEVICE_CPU), SpecOp);
+REGISTER_KERNEL_BUILDER(
+    Name("Spectrum").Device(DEVICE_CPU).TypeConstraint<float>("T"),
+    SpecOp<float>);
+REGISTER_KERNEL_BUILDER(
+    Name("Spectrum").Device(DEVICE_CPU).TypeConstraint<int16>("T"),
+    SpecOp<int16>);
 
 }  // namespace delta
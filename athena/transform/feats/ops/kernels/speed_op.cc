@@ -14,6 +14,11 @@ See the License for the specific language governing permissions and
 limitations under the License.
 ==============================================================================*/
 
+#include <algorithm>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <tuple>
 #include "kernels/resample.h"
 #include "tensorflow/core/framework/op_kernel.h"
 #include "tensorflow/core/framework/register_types.h"
@@ -24,6 +29,35 @@ limitations under the License.
 
 namespace delta {
 
+namespace {
+
+typedef std::tuple<int, int, int> ResampleKey;
+
+// The sinc weights of LinearResample only depend on the two sample rates and
+// the filter width, so they are computed once per process and shared by every
+// kernel instance instead of being rebuilt for each utterance.
+std::shared_ptr<const LinearResample> GetCachedResample(int sample_rate,
+                                                        int resample_freq,
+                                                        int filter_width) {
+  static std::mutex* cache_mutex = new std::mutex;
+  static std::map<ResampleKey, std::shared_ptr<const LinearResample>>* cache =
+      new std::map<ResampleKey, std::shared_ptr<const LinearResample>>;
+
+  const ResampleKey key(sample_rate, resample_freq, filter_width);
+  std::lock_guard<std::mutex> lock(*cache_mutex);
+  auto iter = cache->find(key);
+  if (iter != cache->end()) {
+    return iter->second;
+  }
+  float lowpass_cutoff = min(resample_freq / 2, sample_rate / 2);
+  std::shared_ptr<const LinearResample> resample(new LinearResample(
+      sample_rate, resample_freq, lowpass_cutoff, filter_width));
+  (*cache)[key] = resample;
+  return resample;
+}
+
+}  // namespace
+
 class SpeedOp : public OpKernel {
  public:
   explicit SpeedOp(OpKernelConstruction* context) : OpKernel(context) {
@@ -51,34 +85,92 @@ class SpeedOp : public OpKernel {
     const float* input_flat = input_tensor.flat<float>().data();
     const int L = input_tensor.dim_size(0);
 
-    lowpass_cutoff_ = min(resample_freq / 2, sample_rate / 2);
-    LinearResample cls_resample_(sample_rate, resample_freq,
-                                     lowpass_cutoff_,
-                                     lowpass_filter_width_);
-    vector<float> waveform(L);
-    for (int i = 0; i < L; i++){
-        waveform[i] = static_cast<float>(input_flat[i]);
-    }
-    vector<float> downsampled_wave;
-    cls_resample_.Resample(waveform, false, &downsampled_wave);
-    int output_length = downsampled_wave.size();
+    std::shared_ptr<const LinearResample> resample =
+        GetCachedResample(sample_rate, resample_freq, lowpass_filter_width_);
+    int output_length = resample->NumSamplesOut(L);
     Tensor* output_tensor = nullptr;
     OP_REQUIRES_OK(context, context->allocate_output(0, TensorShape({1, output_length}),
                                                      &output_tensor));
     float* output_flat = output_tensor->flat<float>().data();
-    for (int j = 0; j < output_length; j++)
-        output_flat[j] = downsampled_wave[j];
-
-    std::vector<float>().swap(downsampled_wave);
-    std::vector<float>().swap(waveform);
-    cls_resample_.Reset();
+    resample->ResampleOnce(input_flat, L, output_flat, output_length);
    }
 
  private:
-  float lowpass_cutoff_;
+  int lowpass_filter_width_;
+};
+
+// Applies several speed perturbations to one decoded waveform in a single
+// call, the results are zero padded to the longest one.
+class MultiSpeedOp : public OpKernel {
+ public:
+  explicit MultiSpeedOp(OpKernelConstruction* context) : OpKernel(context) {
+    OP_REQUIRES_OK(context,
+                   context->GetAttr("lowpass_filter_width", &lowpass_filter_width_));
+  }
+
+  void Compute(OpKernelContext* context) override {
+    const Tensor& input_tensor = context->input(0);
+    OP_REQUIRES(context, input_tensor.dims() == 1,
+                errors::InvalidArgument("input signal must be 1-dimensional",
+                                        input_tensor.shape().DebugString()));
+    const Tensor& sample_rate_tensor = context->input(1);
+    OP_REQUIRES(context, TensorShapeUtils::IsScalar(sample_rate_tensor.shape()),
+                errors::InvalidArgument(
+                    "Input sample_rate should be a scalar tensor, got ",
+                    sample_rate_tensor.shape().DebugString(), " instead."));
+    const Tensor& resample_rate_tensor = context->input(2);
+    OP_REQUIRES(context, TensorShapeUtils::IsVector(resample_rate_tensor.shape()),
+                errors::InvalidArgument(
+                    "Resample sample_rates should be a vector tensor, got ",
+                    resample_rate_tensor.shape().DebugString(), " instead."));
+    const int sample_rate = static_cast<int>(sample_rate_tensor.scalar<int32>()());
+    const auto resample_freqs = resample_rate_tensor.vec<int32>();
+    const int num_speeds = resample_rate_tensor.dim_size(0);
+    const float* input_flat = input_tensor.flat<float>().data();
+    const int L = input_tensor.dim_size(0);
+
+    std::vector<std::shared_ptr<const LinearResample>> resamples(num_speeds);
+    std::vector<int> output_lengths(num_speeds);
+    int max_length = 0;
+    for (int i = 0; i < num_speeds; i++) {
+      const int resample_freq = static_cast<int>(resample_freqs(i));
+      if (resample_freq == sample_rate) {
+        // speed 1.0, the waveform is passed through unchanged
+        output_lengths[i] = L;
+      } else {
+        resamples[i] = GetCachedResample(sample_rate, resample_freq,
+                                         lowpass_filter_width_);
+        output_lengths[i] = resamples[i]->NumSamplesOut(L);
+      }
+      max_length = std::max(max_length, output_lengths[i]);
+    }
+
+    Tensor* output_tensor = nullptr;
+    OP_REQUIRES_OK(context, context->allocate_output(
+                                0, TensorShape({num_speeds, max_length}),
+                                &output_tensor));
+    Tensor* length_tensor = nullptr;
+    OP_REQUIRES_OK(context, context->allocate_output(
+                                1, TensorShape({num_speeds}), &length_tensor));
+    float* output_flat = output_tensor->flat<float>().data();
+    auto length_flat = length_tensor->vec<int32>();
+    for (int i = 0; i < num_speeds; i++) {
+      float* row = output_flat + static_cast<int64>(i) * max_length;
+      if (resamples[i] == nullptr) {
+        std::copy(input_flat, input_flat + L, row);
+      } else {
+        resamples[i]->ResampleOnce(input_flat, L, row, output_lengths[i]);
+      }
+      std::fill(row + output_lengths[i], row + max_length, 0.0f);
+      length_flat(i) = output_lengths[i];
+    }
+  }
+
+ private:
   int lowpass_filter_width_;
 };
 
 REGISTER_KERNEL_BUILDER(Name("Speed").Device(DEVICE_CPU), SpeedOp);
+REGISTER_KERNEL_BUILDER(Name("MultiSpeed").Device(DEVICE_CPU), MultiSpeedOp);
 
-}  // namespace delta
\ No newline at end of file
+}  // namespace delta
@@ -112,8 +112,9 @@ Status FbankShapeFn(InferenceContext* c) {
 // spectorgram: tensorflow/tensorflow/lite/kernels/internal/spectrogram.h
 
 REGISTER_OP("Spectrum")
-    .Input("input_data: float")
+    .Input("input_data: T")
     .Input("sample_rate: float")
+    .Attr("T: {float, int16} = DT_FLOAT")
     .Attr("window_length: float = 0.025")
     .Attr("frame_length: float = 0.010")
     .Attr("window_type: string")
@@ -131,7 +132,7 @@ REGISTER_OP("Spectrum")
 //    .SetShapeFn(SpectrumShapeFn)
     .Doc(R"doc(
     Create spectrum feature files.
-    input_data: float, input wave, a tensor of shape [1, data_length].
+    input_data: float or int16, input wave in int16 scale, a tensor of shape [1, data_length].
     sample_rate: float, NB 8000, WB 16000 etc.
     window_length: float, window length in second.
     frame_length: float, frame length in second.
@@ -210,6 +211,25 @@ REGISTER_OP("Speed")
     sample_rate: float, NB 8000, WB 16000 etc.
     )doc");
 
+REGISTER_OP("MultiSpeed")
+    .Input("input_data: float")
+    .Input("sample_rate: int32")
+    .Input("resample_freqs: int32")
+    .Attr("lowpass_filter_width: int = 1")
+    .Output("output: float")
+    .Output("output_lengths: int32")
+    .SetShapeFn([](::tensorflow::shape_inference::InferenceContext* c){
+        return Status::OK();
+    })
+    .Doc(R"doc(
+    Apply several speed perturbations to one waveform.
+    input_data: float, input wave, a tensor of shape [data_length].
+    sample_rate: int32, NB 8000, WB 16000 etc.
+    resample_freqs: int32, one target sample rate per speed, a tensor of shape [num_speeds].
+    output: float, resampled waves padded with zeros, [num_speeds, max_length].
+    output_lengths: int32, the valid length of each resampled wave, [num_speeds].
+    )doc");
+
 REGISTER_OP("MfccDct")
     .Input("fbank: float")
     .Input("framepow: float")
@@ -32,3 +32,4 @@ pitch = gen_x_ops.pitch
 mfcc = gen_x_ops.mfcc_dct
 frame_pow = gen_x_ops.frame_pow
 speed = gen_x_ops.speed
+multi_speed = gen_x_ops.multi_speed
@@ -147,6 +147,8 @@ class Pitch(BaseFrontend):
         p = self.config
 
         with tf.name_scope('pitch'):
+            # ReadWav with fast_read returns int16 samples
+            audio_data = tf.cast(audio_data, dtype=tf.float32)
             sample_rate = tf.cast(sample_rate, dtype=tf.int32)
             pitch = py_x_ops.pitch(audio_data,
                                    sample_rate,
@@ -0,0 +1,228 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Read int16 samples from PCM wav, NIST SPHERE, FLAC and packed audio archives.
+
+PCM data is memory-mapped and returned as an int16 view, so no float copy of the
+waveform is made. An audio path may carry a segment suffix
+``path:channel:start_time:end_time`` (channel counts from 1 like sph2pipe, times
+in seconds), which allows featurizing conversation sides of SPHERE files in place.
+
+A packed archive is a large ``.pack`` shard holding a 16 bytes header (magic and
+sample rate) followed by the concatenated mono int16 PCM of many utterances. An
+utterance inside it is referenced as ``archive.pack:offset:length``, both counted
+in samples. Shards are opened and memory-mapped once per process.
+"""
+
+import re
+import struct
+import numpy as np
+
+SEGMENT_PATTERN = re.compile(r"^(.+):(\d+):(\d+(?:\.\d*)?):(\d+(?:\.\d*)?)$")
+ARCHIVE_PATTERN = re.compile(r"^(.+\.pack):(\d+):(\d+)$")
+ARCHIVE_MAGIC = b"ATHENAPK"
+ARCHIVE_HEADER_SIZE = 16
+_ARCHIVES = {}
+
+
+def _ulaw_table():
+    """ G.711 mu-law to int16 lookup table """
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+ULAW_TABLE = _ulaw_table()
+
+
+def _read_wav(path):
+    """ memory-map a RIFF wav file with 16 bits PCM samples
+    returns: samples with shape [num_samples, num_channels], sample_rate
+    """
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if len(data) < 12 or bytes(data[0:4]) != b"RIFF" or bytes(data[8:12]) != b"WAVE":
+        raise ValueError("{} is not a RIFF wav file".format(path))
+    pos = 12
+    num_channels, sample_rate, bits = None, None, None
+    while pos + 8 <= len(data):
+        chunk_id = bytes(data[pos : pos + 4])
+        chunk_size = struct.unpack("<I", bytes(data[pos + 4 : pos + 8]))[0]
+        pos += 8
+        if chunk_id == b"fmt ":
+            audio_format, num_channels, sample_rate = struct.unpack(
+                "<HHI", bytes(data[pos : pos + 8]))
+            bits = struct.unpack("<H", bytes(data[pos + 14 : pos + 16]))[0]
+            if audio_format == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE
+                audio_format = struct.unpack("<H", bytes(data[pos + 24 : pos + 26]))[0]
+            if audio_format != 1 or bits != 16:
+                raise ValueError(
+                    "only 16 bits PCM wav is supported, got format {} with {} bits in {}"
+                    .format(audio_format, bits, path))
+        elif chunk_id == b"data":
+            if num_channels is None:
+                raise ValueError("missing fmt chunk before data chunk in {}".format(path))
+            # streamed wav files may leave the data size unset
+            num_bytes = min(chunk_size, len(data) - pos)
+            num_samples = num_bytes // (2 * num_channels)
+            samples = np.frombuffer(
+                data, dtype="<i2", count=num_samples * num_channels, offset=pos)
+            return samples.reshape([num_samples, num_channels]), sample_rate
+        pos += chunk_size + (chunk_size & 1)
+    raise ValueError("no data chunk found in {}".format(path))
+
+
+def _read_sphere(path):
+    """ memory-map a NIST SPHERE file with pcm or ulaw samples
+    returns: samples with shape [num_samples, num_channels], sample_rate
+    """
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(data[0:8]) != b"NIST_1A\n":
+        raise ValueError("{} is not a NIST SPHERE file".format(path))
+    header_size = int(bytes(data[8:16]).decode("ascii").strip())
+    header = {}
+    for line in bytes(data[16:header_size]).decode("ascii", "ignore").splitlines():
+        fields = line.split(None, 2)
+        if fields[:1] == ["end_head"]:
+            break
+        if len(fields) == 3:
+            header[fields[0]] = fields[2].strip()
+    num_channels = int(header.get("channel_count", 1))
+    sample_rate = int(header["sample_rate"])
+    sample_bytes = int(header.get("sample_n_bytes", 2))
+    coding = header.get("sample_coding", "pcm")
+    if "shorten" in coding:
+        raise ValueError(
+            "shorten compressed SPHERE is not supported, convert {} with sph2pipe"
+            .format(path))
+    body = data[header_size:]
+    if coding.startswith("ulaw") or coding.startswith("mu-law"):
+        num_samples = len(body) // num_channels
+        samples = ULAW_TABLE[body[: num_samples * num_channels]]
+    elif coding.startswith("pcm") and sample_bytes == 2:
+        byte_order = "<" if header.get("sample_byte_format", "01") == "01" else ">"
+        num_samples = len(body) // (2 * num_channels)
+        samples = np.frombuffer(
+            data, dtype=byte_order + "i2", count=num_samples * num_channels,
+            offset=header_size)
+        if byte_order == ">":
+            samples = samples.astype(np.int16)
+    else:
+        raise ValueError(
+            "unsupported SPHERE sample coding {} with {} bytes in {}"
+            .format(coding, sample_bytes, path))
+    return samples.reshape([num_samples, num_channels]), sample_rate
+
+
+def _read_flac(path):
+    """ decode a FLAC file through soundfile (libsndfile), which ships with librosa
+    returns: samples with shape [num_samples, num_channels], sample_rate
+    """
+    try:
+        import soundfile
+    except ImportError:
+        raise ImportError("soundfile is required to read flac file {}".format(path))
+    samples, sample_rate = soundfile.read(path, dtype="int16", always_2d=True)
+    return samples, sample_rate
+
+
+def archive_header(sample_rate):
+    """ the header of a packed audio archive with the given sample rate """
+    return ARCHIVE_MAGIC + struct.pack("<II", sample_rate, 0)
+
+
+def _open_archive(path):
+    """ memory-map a packed audio archive once and keep it open
+    returns: int16 samples of the whole shard, sample_rate
+    """
+    archive = _ARCHIVES.get(path)
+    if archive is None:
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(data[0:8]) != ARCHIVE_MAGIC:
+            raise ValueError("{} is not a packed audio archive".format(path))
+        sample_rate = struct.unpack("<I", bytes(data[8:12]))[0]
+        num_samples = (len(data) - ARCHIVE_HEADER_SIZE) // 2
+        samples = np.frombuffer(
+            data, dtype="<i2", count=num_samples, offset=ARCHIVE_HEADER_SIZE)
+        archive = (samples, sample_rate)
+        _ARCHIVES[path] = archive
+    return archive
+
+
+def split_archive_path(audio_path):
+    """ split an ``archive.pack:offset:length`` reference
+    returns: (archive, offset, length), or (None, 0, 0) if audio_path does not
+        reference a packed archive
+    """
+    matched = ARCHIVE_PATTERN.match(audio_path)
+    if matched is None:
+        return None, 0, 0
+    archive, offset, length = matched.groups()
+    return archive, int(offset), int(length)
+
+
+def split_audio_path(audio_path):
+    """ split the optional segment suffix from an audio path
+    returns: (path, channel, start_time, end_time), channel counts from 1, a
+        channel of 0 and times of None mean the first channel and the whole file
+    """
+    matched = SEGMENT_PATTERN.match(audio_path)
+    if matched is None:
+        return audio_path, 0, None, None
+    path, channel, start_time, end_time = matched.groups()
+    return path, int(channel), float(start_time), float(end_time)
+
+
+def read_audio(audio_path):
+    """ read one channel of int16 samples from a wav, sph or flac file, or an
+    utterance of a packed archive
+    args:
+        audio_path: a file path, optionally with a segment suffix
+            ``:channel:start_time:end_time``, or ``archive.pack:offset:length``
+    returns: int16 samples with shape [num_samples], sample_rate
+    """
+    if isinstance(audio_path, bytes):
+        audio_path = audio_path.decode("utf-8")
+    archive, offset, length = split_archive_path(audio_path)
+    if archive is not None:
+        samples, sample_rate = _open_archive(archive)
+        if offset + length > len(samples):
+            raise ValueError("{} is out of the archive range".format(audio_path))
+        return samples[offset : offset + length], np.int32(sample_rate)
+    path, channel, start_time, end_time = split_audio_path(audio_path)
+    with open(path, "rb") as audio_file:
+        magic = audio_file.read(8)
+    if magic.startswith(b"RIFF"):
+        samples, sample_rate = _read_wav(path)
+    elif magic.startswith(b"NIST_1A"):
+        samples, sample_rate = _read_sphere(path)
+    elif magic.startswith(b"fLaC"):
+        samples, sample_rate = _read_flac(path)
+    else:
+        raise ValueError("unknown audio format of {}".format(path))
+    channel = max(channel - 1, 0)
+    if channel >= samples.shape[1]:
+        raise ValueError("{} has only {} channels".format(path, samples.shape[1]))
+    samples = samples[:, channel]
+    if start_time is not None:
+        samples = samples[int(start_time * sample_rate) : int(end_time * sample_rate)]
+    return samples, np.int32(sample_rate)
+
+
+def get_audio_length(audio_path):
+    """ get the duration of an audio file or segment in ms """
+    samples, sample_rate = read_audio(audio_path)
+    return int(len(samples) / sample_rate * 1000)
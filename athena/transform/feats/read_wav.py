@@ -19,6 +19,7 @@ import tensorflow as tf
 from athena.utils.hparam import HParams
 from athena.transform.feats.base_frontend import BaseFrontend
 from athena.transform.feats.ops import py_x_ops
+from athena.transform.feats.read_audio import read_audio
 
 
 class ReadWav(BaseFrontend):
@@ -32,7 +33,9 @@ class ReadWav(BaseFrontend):
     def params(cls, config=None):
         """
           Set params.
-           :param config: contains one optional parameters: audio_channels(int, default=1).
+           :param config: contains two optional parameters: audio_channels(int, default=1),
+                fast_read(bool, default=False): memory-map wav/sph/flac files and
+                return int16 samples without a float copy.
            :return: An object of class HParams, which is a set of hyperparameters as
                     name-value pairs.
            """
@@ -41,34 +44,92 @@ class ReadWav(BaseFrontend):
         hparams = HParams(cls=cls)
         hparams.add_hparam('type', 'ReadWav')
         hparams.add_hparam('audio_channels', audio_channels)
+        hparams.add_hparam('fast_read', False)
 
         if config is not None:
             hparams.parse(config, True)
 
         return hparams
 
+    def decode(self, wavfile):
+        """
+        Decode a wavfile into samples in int16 scale.
+        :param wavfile: filepath of wav, or of wav/sph/flac with an optional
+            segment suffix ":channel:start_time:end_time" if fast_read is set
+        :return: samples with shape [num_samples] and int32 sample rate. Samples
+            are int16 if fast_read is set, else float32.
+        """
+        p = self.config
+        if p.fast_read:
+            audio_data, sample_rate = tf.numpy_function(
+                read_audio, [wavfile], [tf.int16, tf.int32])
+            audio_data.set_shape([None])
+            sample_rate.set_shape([])
+            return audio_data, sample_rate
+        contents = tf.io.read_file(wavfile)
+        audio_data, sample_rate = tf.compat.v1.audio.decode_wav(
+            contents, desired_channels=p.audio_channels)
+        return tf.squeeze(audio_data * 32768, axis=-1), tf.cast(sample_rate, dtype=tf.int32)
+
     def call(self, wavfile, speed=1.0):
         """
         Get audio data and sample rate from a wavfile.
         :param wavfile: filepath of wav
-               speed: Speed of sample channels wanted (float, default=1.0)
+               speed: Speed of sample channels wanted (float or a float32 scalar
+               tensor, default=1.0)
         :return: 2 values. The first is a Tensor of audio data.
             The second return value isthe sample rate of the input wav
-            file, which is a tensor with float dtype.
+            file, which is a tensor with int32 dtype. Audio data is int16
+            when fast_read is set, else float32.
         """
-        p = self.config
-        contents = tf.io.read_file(wavfile)
-        audio_data, sample_rate = tf.compat.v1.audio.decode_wav(
-            contents, desired_channels=p.audio_channels)
+        audio_data, sample_rate = self.decode(wavfile)
+        if tf.is_tensor(speed):
+            speed_data = tf.cond(
+                tf.equal(speed, 1.0),
+                lambda: audio_data,
+                lambda: self.change_speed(audio_data, sample_rate, speed))
+            return speed_data, sample_rate
         if (speed == 1.0):
-            return tf.squeeze(audio_data * 32768, axis=-1), tf.cast(sample_rate, dtype=tf.int32)
+            return audio_data, sample_rate
         else:
-            resample_rate = tf.cast(sample_rate, dtype=tf.float32) * tf.cast(1.0 / speed, dtype=tf.float32)
-            speed_data = py_x_ops.speed(tf.squeeze(audio_data * 32768, axis=-1),
-                                        tf.cast(sample_rate, dtype=tf.int32),
-                                        tf.cast(resample_rate, dtype=tf.int32),
-                                        lowpass_filter_width=5)
-            return tf.squeeze(speed_data), tf.cast(sample_rate, dtype=tf.int32)
+            return self.change_speed(audio_data, sample_rate, speed), sample_rate
+
+    @staticmethod
+    def change_speed(audio_data, sample_rate, speed):
+        """
+        Resample audio data to change its speed, keeping its dtype.
+        """
+        resample_rate = tf.cast(sample_rate, dtype=tf.float32) \
+            * tf.cast(1.0 / speed, dtype=tf.float32)
+        speed_data = py_x_ops.speed(tf.cast(audio_data, dtype=tf.float32),
+                                    sample_rate,
+                                    tf.cast(resample_rate, dtype=tf.int32),
+                                    lowpass_filter_width=5)
+        speed_data = tf.squeeze(speed_data, axis=0)
+        if audio_data.dtype == tf.int16:
+            speed_data = tf.saturate_cast(tf.round(speed_data), tf.int16)
+        return speed_data
+
+    def call_multi_speed(self, wavfile, speeds):
+        """
+        Read and decode a wavfile once, then apply all speeds in one op call.
+        :param wavfile: filepath of wav
+               speeds: a list of speeds, e.g. [0.9, 1.0, 1.1]
+        :return: 2 values. The first is a list of Tensors of audio data, one
+            for each speed in order. The second return value is the sample
+            rate of the input wav file, which is a tensor with int32 dtype.
+        """
+        audio_data, sample_rate = self.decode(wavfile)
+        audio_data = tf.cast(audio_data, dtype=tf.float32)
+        resample_rates = tf.cast(sample_rate, dtype=tf.float32) * tf.constant(
+            [1.0 / speed for speed in speeds], dtype=tf.float32)
+        resample_rates = tf.cast(resample_rates, dtype=tf.int32)
+        speed_data, lengths = py_x_ops.multi_speed(audio_data,
+                                                   sample_rate,
+                                                   resample_rates,
+                                                   lowpass_filter_width=5)
+        audio_list = [speed_data[i, :lengths[i]] for i in range(len(speeds))]
+        return audio_list, sample_rate
 
 
 def read_wav(wavfile, audio_channels=1):
@@ -45,6 +45,38 @@ class ReadWavTest(tf.test.TestCase):
                     self.assertAllClose(input_data.eval() / 32768, audio_data_true)
                     self.assertAllClose(sample_rate.eval(), sample_rate_true)
 
+    def test_read_wav_multi_speed(self):
+        wav_path = str(Path(os.environ['MAIN_ROOT']).joinpath('examples/sm1_cln.wav'))
+
+        with self.session():
+            speeds = [0.9, 1.0, 1.1]
+            read_wav = ReadWav.params().instantiate()
+            audio_list, sample_rate = read_wav.call_multi_speed(wav_path, speeds)
+            self.assertEqual(len(audio_list), len(speeds))
+            for speed, multi_data in zip(speeds, audio_list):
+                input_data, _ = read_wav(wav_path, speed)
+                if tf.executing_eagerly():
+                    self.assertAllClose(multi_data.numpy(), input_data.numpy())
+                else:
+                    self.assertAllClose(multi_data.eval(), input_data.eval())
+
+    def test_read_wav_fast_read(self):
+        wav_path = str(Path(os.environ['MAIN_ROOT']).joinpath('examples/sm1_cln.wav'))
+
+        with self.session():
+            read_wav = ReadWav.params().instantiate()
+            fast_read_wav = ReadWav.params({'fast_read': True}).instantiate()
+            input_data, sample_rate = read_wav(wav_path)
+            fast_data, fast_sample_rate = fast_read_wav(wav_path)
+            self.assertEqual(fast_data.dtype, tf.int16)
+            fast_data = tf.cast(fast_data, tf.float32)
+            if tf.executing_eagerly():
+                self.assertAllClose(fast_data.numpy(), input_data.numpy())
+                self.assertAllClose(fast_sample_rate.numpy(), sample_rate.numpy())
+            else:
+                self.assertAllClose(fast_data.eval(), input_data.eval())
+                self.assertAllClose(fast_sample_rate.eval(), sample_rate.eval())
+
 
 if __name__ == '__main__':
 
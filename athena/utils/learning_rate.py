@@ -33,6 +33,9 @@ class WarmUpLearningSchedule(tf.keras.optimizers.schedules.LearningRateSchedule)
     Returns:
         return the learning rate
     Idea from the paper: Attention Is All You Need
+
+    The step is optimizer.iterations, which counts updates, so with gradient
+    accumulation warmup_steps is in updates rather than batches
     """
 
     def __init__(self, model_dim=512, warmup_steps=4000, k=1.0,
@@ -33,7 +33,7 @@ class MetricChecker:
         self.time_last_call = time.time()
         self.steps_last_call = 0
 
-    def __call__(self, loss, metrics, evaluate_epoch=-1):
+    def __call__(self, loss, metrics, evaluate_epoch=-1, grad_norm=None):
         """summary the basic metrics like loss, lr
         Args:
             loss:
@@ -43,14 +43,15 @@ class MetricChecker:
                 if evaluate_epoch >= 0: <evaluate mode>
                 if evaluate_epoch == -1: <train mode>
                 if evaluate_epoch < -1: <evaluate_log mode> (no tf.summary.write)
+            grad_norm: the global norm of the gradients in <train mode>, optional
         Returns:
             logging_str: return average and best(if improved) loss if training is False
         """
         if evaluate_epoch is -1:
-            return self.summary_train(loss, metrics)
+            return self.summary_train(loss, metrics, grad_norm)
         return self.summary_evaluate(loss, metrics, evaluate_epoch)
 
-    def summary_train(self, loss, metrics):
+    def summary_train(self, loss, metrics, grad_norm=None):
         """ generate summary of learning_rate, loss, metrics, speed and write on Tensorboard
         """
         global_steps = tf.convert_to_tensor(self.optimizer.iterations)
@@ -65,6 +66,8 @@ class MetricChecker:
         for name in metrics:
             metric = metrics[name]
             tf.summary.scalar(name, metric, step=global_steps)
+        if grad_norm is not None:
+            tf.summary.scalar("grad_norm", grad_norm, step=global_steps)
 
         reports = ""
         reports += "global_steps: %d\t" % (global_steps)
@@ -73,6 +76,8 @@ class MetricChecker:
         for name in metrics:
             metric = metrics[name]
             reports += "%s: %.4f\t" % (name, metric)
+        if grad_norm is not None:
+            reports += "grad_norm: %.4f\t" % (grad_norm)
         right_now = time.time()
         duration = right_now - self.time_last_call
         self.time_last_call = right_now
@@ -65,6 +65,111 @@ def generate_square_subsequent_mask(size):
     return mask
 
 
+def generate_chunk_mask(size, chunk_size, left_chunks=-1):
+    """  Generate a mask for chunk-wise self-attention. The sequence is split into chunks
+      of chunk_size, and each position attends to the positions of its own chunk and of
+      the left_chunks chunks before it (all of them if left_chunks < 0). The masked
+      positions are filled with float(1.0). Unmasked positions are filled with float(0.0).
+    """
+    chunks = tf.range(size) // chunk_size
+    query_chunks = chunks[:, tf.newaxis]
+    key_chunks = chunks[tf.newaxis, :]
+    visible = key_chunks <= query_chunks
+    if left_chunks >= 0:
+        visible = tf.logical_and(visible, key_chunks >= query_chunks - left_chunks)
+    return 1.0 - tf.cast(visible, tf.float32)
+
+
+def truncate_seqs(seqs, eos):
+    """  Replace end symbol and elements after end symbol with 0, vectorized with a
+      cumprod over time instead of a loop
+    Args:
+      seqs: tf.Tensor shape=(batch_size, seq_length)
+    Returns:
+      truncated seqs: tf.Tensor shape=(batch_size, seq_length)
+    """
+    eos = tf.cast(eos, seqs.dtype)
+    not_eos = tf.cast(tf.not_equal(seqs, eos), seqs.dtype)
+    if eos != 0:
+        # 1 before the first eos, 0 from it on
+        return seqs * tf.math.cumprod(not_eos, axis=1)
+    return seqs * not_eos
+
+
+def compact_seqs(seqs):
+    """  Move the non-zero elements of each sequence to its front in their order,
+      i.e. drop the zeros as tf.sparse.from_dense does, but keep the dense tensor
+    Args:
+      seqs: tf.Tensor shape=(batch_size, seq_length)
+    Returns:
+      compacted seqs: tf.Tensor shape=(batch_size, seq_length), padded with 0
+      lengths: tf.int32 Tensor shape=(batch_size,), the number of non-zero elements
+    """
+    nonzero = tf.not_equal(seqs, 0)
+    seq_length = tf.shape(seqs)[1]
+    positions = tf.range(seq_length)[tf.newaxis, :]
+    order = tf.argsort(tf.where(nonzero, positions, positions + seq_length), axis=1)
+    seqs = tf.gather(seqs, order, batch_dims=1)
+    lengths = tf.reduce_sum(tf.cast(nonzero, tf.int32), axis=1)
+    return seqs, lengths
+
+
+def cumulative_min(x):
+    """  The cumulative minimum of a 2-D int32 tensor along its last axis, computed in
+      log2(length) steps of shifted minimums
+    """
+    length = tf.shape(x)[1]
+    batch = tf.shape(x)[0]
+
+    def body(shift, x):
+        shifted = tf.concat(
+            [tf.fill([batch, shift], x.dtype.max), x[:, : length - shift]], axis=1
+        )
+        return shift * 2, tf.minimum(x, shifted)
+
+    _, x = tf.while_loop(lambda shift, _: shift < length, body, [1, x])
+    return x
+
+
+def edit_distance(hyps, hyp_lengths, refs, ref_lengths):
+    """  The Levenshtein distance between each pair of padded sequences, computed on
+      dense tensors without SparseTensors. The dynamic programming goes over the
+      positions of hyps, each step being vectorized over the batch and the positions
+      of refs, the insertions being resolved by a cumulative minimum.
+    Args:
+      hyps: tf.Tensor shape=(batch_size, hyp_length)
+      hyp_lengths: tf.int32 Tensor shape=(batch_size,)
+      refs: tf.Tensor shape=(batch_size, ref_length), the same dtype as hyps
+      ref_lengths: tf.int32 Tensor shape=(batch_size,)
+    Returns:
+      distances: tf.int32 Tensor shape=(batch_size,)
+    """
+    batch = tf.shape(refs)[0]
+    positions = tf.range(tf.shape(refs)[1] + 1)[tf.newaxis, :]
+    # distances from the empty prefix of hyps
+    row = tf.tile(positions, [batch, 1])
+    distances = tf.gather(row, ref_lengths, batch_dims=1)
+
+    def body(i, row, distances):
+        cost = tf.cast(tf.not_equal(hyps[:, i : i + 1], refs), tf.int32)
+        substitution = row[:, :-1] + cost
+        deletion = row[:, 1:] + 1
+        row = tf.concat([row[:, :1] + 1, tf.minimum(substitution, deletion)], axis=1)
+        # insertions: row[j] = min over k <= j of row[k] + j - k
+        row = cumulative_min(row - positions) + positions
+        distances = tf.where(
+            tf.equal(hyp_lengths, i + 1),
+            tf.gather(row, ref_lengths, batch_dims=1),
+            distances,
+        )
+        return i + 1, row, distances
+
+    _, _, distances = tf.while_loop(
+        lambda i, *_: i < tf.reduce_max(hyp_lengths), body, [0, row, distances]
+    )
+    return distances
+
+
 def validate_seqs(seqs, eos):
     """  Discard end symbol and elements after end symbol
     Args:
@@ -72,21 +177,7 @@ def validate_seqs(seqs, eos):
     Returns:
       validated_preds: tf.SparseTensor
     """
-    eos = tf.cast(eos, tf.int64)
-    if eos != 0:
-        indexes = tf.TensorArray(tf.bool, size=0, dynamic_size=True)
-        a = tf.not_equal(eos, seqs)
-        res = a[:, 0]
-        indexes = indexes.write(0, res)
-        for i in tf.range(1, tf.shape(a)[1]):
-            res = tf.logical_and(res, a[:, i])
-            indexes = indexes.write(i, res)
-        res = tf.transpose(indexes.stack(), [1, 0])
-        validated_preds = tf.where(tf.logical_not(res), tf.zeros_like(seqs), seqs)
-        validated_preds = tf.sparse.from_dense(validated_preds)
-    else:
-        validated_preds = tf.where(tf.equal(eos, seqs), tf.zeros_like(seqs), seqs)
-        validated_preds = tf.sparse.from_dense(validated_preds)
+    validated_preds = tf.sparse.from_dense(truncate_seqs(seqs, eos))
     counter = tf.cast(tf.shape(validated_preds.values)[0], tf.float32)
     return validated_preds, counter
 
@@ -145,6 +236,34 @@ def splice_numpy(x, context):
     spliced = np.reshape(spliced, (B, T, -1))
     return tf.convert_to_tensor(spliced)
 
+def make_dummy_samples(sample_signature, batch_size=2, length=64):
+    """ make zero samples with the shapes and dtypes of sample_signature, which
+    build the variables of a model without reading any data
+    Args:
+      sample_signature: the sample_signature of a dataset builder
+      batch_size: the size of the first dim
+      length: the size of the other unknown dims
+    Returns:
+      samples: a dict of tensors, where "<key>_length" is filled with the length
+        of "<key>", or with length if there is no such key
+    """
+    samples = {}
+    for key, spec in sample_signature[0].items():
+        if spec.shape.rank is None:
+            shape = [batch_size]
+        else:
+            shape = [
+                (batch_size if axis == 0 else length) if dim is None else dim
+                for axis, dim in enumerate(spec.shape.as_list())
+            ]
+        samples[key] = tf.zeros(shape, dtype=spec.dtype)
+    for key in samples:
+        if key.endswith("_length"):
+            source = samples.get(key[: -len("_length")])
+            value = length if source is None or source.shape.rank < 2 else source.shape[1]
+            samples[key] = tf.fill(tf.shape(samples[key]), tf.cast(value, samples[key].dtype))
+    return samples
+
 def set_default_summary_writer(summary_directory=None):
     if summary_directory is None:
         summary_directory = os.path.join(os.path.expanduser("~"), ".athena")
@@ -165,3 +284,18 @@ def tensor_shape(tensor):
         else shape_value[idx]
         for idx in range(len(shape_value))]
     return ret
+
+
+def tensorflow_version():
+    """ the (major, minor) version of the installed tensorflow """
+    return tuple(int(number) for number in tf.__version__.split(".")[:2])
+
+
+def require_tensorflow(version, feature):
+    """ raise a RuntimeError if the installed tensorflow is older than version,
+    e.g. "2.4", which feature needs
+    """
+    required = tuple(int(number) for number in version.split("."))
+    if tensorflow_version() < required:
+        raise RuntimeError("{} needs tensorflow >= {}, but {} is installed".format(
+            feature, version, tf.__version__))
@@ -0,0 +1,51 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""The model tests the dense edit distance and the sequence truncation."""
+
+import numpy as np
+import tensorflow as tf
+from athena.utils.misc import truncate_seqs, compact_seqs, edit_distance
+
+
+class EditDistanceTest(tf.test.TestCase):
+    """
+        Dense edit distance test against tf.edit_distance.
+    """
+    def test_edit_distance(self):
+        np.random.seed(1)
+        hyps = np.random.randint(0, 4, [16, 12]).astype(np.int64)
+        refs = np.random.randint(0, 4, [16, 9]).astype(np.int64)
+        hyps[0], refs[1] = 0, 0  # empty sequences
+
+        compact_hyps, hyp_lengths = compact_seqs(tf.constant(hyps))
+        compact_refs, ref_lengths = compact_seqs(tf.constant(refs))
+        distances = edit_distance(compact_hyps, hyp_lengths, compact_refs, ref_lengths)
+        expected = tf.edit_distance(
+            tf.sparse.from_dense(hyps), tf.sparse.from_dense(refs), normalize=False
+        )
+        self.assertAllEqual(distances, tf.cast(expected, tf.int32))
+
+    def test_truncate_seqs(self):
+        seqs = tf.constant([[3, 1, 5, 2, 5], [5, 1, 2, 3, 4], [1, 2, 3, 4, 1]])
+        self.assertAllEqual(
+            truncate_seqs(seqs, 5),
+            [[3, 1, 0, 0, 0], [0, 0, 0, 0, 0], [1, 2, 3, 4, 1]],
+        )
+
+
+if __name__ == "__main__":
+    tf.test.main()
@@ -0,0 +1,147 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+""" per-stage timing of the decoding. The stages are timed by the profile_stage blocks
+of the decoding code, which do nothing unless a DecodeProfiler is active:
+
+    profiler = DecodeProfiler()
+    with profiler:
+        for samples in dataset:
+            with profile_stage("encoder"):
+                ...
+            profiler.end_utterance(duration)
+    print(profiler.report())
+
+The stages are timed on the host in eager mode: the kernels launched asynchronously
+on a GPU may finish in the next stage, the time of an utterance being exact once
+its predictions are read back.
+"""
+import time
+import contextlib
+import collections
+import numpy as np
+import tensorflow as tf
+from .misc import require_tensorflow
+
+STAGES = ["data_wait", "x_net", "encoder", "decoder_step", "ctc_scorer", "lm_scorer", "top_k"]
+PERCENTILES = [50, 95, 99]
+
+_ACTIVE_PROFILERS = []
+
+
+def profile_stage(name):
+    """ time the block as the stage name of the active DecodeProfiler, if any """
+    if not _ACTIVE_PROFILERS:
+        return contextlib.nullcontext()
+    return _ACTIVE_PROFILERS[-1].stage(name)
+
+
+class DecodeProfiler:
+    """ accumulate the time of each stage per utterance and report the real time
+    factor and the percentiles of the stage times, by utterance duration in seconds:
+    [0, length_buckets[0]), [length_buckets[0], length_buckets[1]), ...
+    If trace_dir is given, a TensorBoard profile of the decoding is also written to
+    trace_dir with a trace event per stage, which needs tensorflow 2.2 or later
+    """
+
+    def __init__(self, length_buckets=(5.0, 10.0, 20.0), trace_dir=None):
+        if trace_dir is not None:
+            require_tensorflow("2.2", "profile_trace_dir")
+        self.length_buckets = list(length_buckets)
+        self.trace_dir = trace_dir
+        self.current = collections.defaultdict(float)
+        self.durations = []
+        self.utterances = []
+
+    def __enter__(self):
+        if self.trace_dir is not None:
+            tf.profiler.experimental.start(self.trace_dir)
+        _ACTIVE_PROFILERS.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _ACTIVE_PROFILERS.remove(self)
+        if self.trace_dir is not None:
+            tf.profiler.experimental.stop()
+        return False
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """ add the time of the block to the stage name of the current utterance """
+        begin = time.time()
+        try:
+            if self.trace_dir is not None:
+                with tf.profiler.experimental.Trace(name):
+                    yield
+            else:
+                yield
+        finally:
+            self.current[name] += time.time() - begin
+
+    def end_utterance(self, duration, total_sec=None):
+        """ close the current utterance of duration seconds, total_sec being its time
+        end to end, the sum of its stages by default
+        """
+        stages = dict(self.current)
+        stages["total"] = sum(stages.values()) if total_sec is None else total_sec
+        self.durations.append(duration)
+        self.utterances.append(stages)
+        self.current.clear()
+        return stages
+
+    def bucket_name(self, index):
+        """ the range of durations of the bucket index """
+        bounds = [0.0] + self.length_buckets + [np.inf]
+        return "[%g, %g)s" % (bounds[index], bounds[index + 1])
+
+    def report(self):
+        """ the RTF and the percentiles in ms of each stage as markdown tables,
+        for all the utterances and for each bucket of durations
+        """
+        if not self.utterances:
+            return "no utterance profiled"
+        durations = np.array(self.durations)
+        buckets = np.digitize(durations, self.length_buckets)
+        groups = [("all", np.ones_like(durations, dtype=bool))] + [
+            (self.bucket_name(index), buckets == index)
+            for index in range(len(self.length_buckets) + 1)
+            if np.any(buckets == index)
+        ]
+        stages = [stage for stage in STAGES
+                  if any(stage in utterance for utterance in self.utterances)]
+        stages += sorted(
+            set(stage for utterance in self.utterances for stage in utterance)
+            - set(stages) - set(["total"])
+        ) + ["total"]
+        lines = []
+        for name, selected in groups:
+            utterances = [utterance for utterance, keep in zip(self.utterances, selected) if keep]
+            audio_sec = float(np.sum(durations[selected]))
+            lines.append("")
+            lines.append("utterances %s: %d, audio: %.1fs" % (name, len(utterances), audio_sec))
+            lines.append("stage | RTF | share | "
+                         + " | ".join("p%d (ms)" % p for p in PERCENTILES) + " |")
+            lines.append(":-------:|" + ":-------:|" * (2 + len(PERCENTILES)))
+            total_sec = sum(utterance["total"] for utterance in utterances)
+            for stage in stages:
+                times = np.array([utterance.get(stage, 0.0) for utterance in utterances])
+                lines.append("%s | %.4f | %.1f%% | %s |" % (
+                    stage,
+                    np.sum(times) / audio_sec if audio_sec > 0 else 0.0,
+                    100.0 * np.sum(times) / total_sec if total_sec > 0 else 0.0,
+                    " | ".join("%.2f" % (np.percentile(times, p) * 1000) for p in PERCENTILES),
+                ))
+        return "\n".join(lines)
@@ -0,0 +1,54 @@
+# coding=utf-8
+# Copyright (C) ATHENA AUTHORS
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""The model tests the per-stage timing of the decoding profiler."""
+
+import time
+import tensorflow as tf
+from athena.utils.profiler import DecodeProfiler, profile_stage
+
+
+class DecodeProfilerTest(tf.test.TestCase):
+    """
+        Stage accumulation and report by utterance duration.
+    """
+    def test_stages(self):
+        with profile_stage("encoder"):
+            pass  # no active profiler
+        profiler = DecodeProfiler(length_buckets=[5.0])
+        with profiler:
+            for duration in [2.0, 8.0]:
+                with profile_stage("encoder"):
+                    time.sleep(0.01)
+                for _ in range(3):
+                    with profile_stage("decoder_step"):
+                        time.sleep(0.01)
+                stages = profiler.end_utterance(duration)
+        with profile_stage("encoder"):
+            pass
+        self.assertEqual(len(profiler.utterances), 2)
+        self.assertGreaterEqual(stages["decoder_step"], 0.03)
+        self.assertAllClose(stages["total"], stages["encoder"] + stages["decoder_step"])
+
+        report = profiler.report()
+        self.assertIn("utterances all: 2", report)
+        self.assertIn("utterances [0, 5)s: 1", report)
+        self.assertIn("utterances [5, inf)s: 1", report)
+        self.assertLess(report.index("encoder |"), report.index("decoder_step |"))
+
+
+if __name__ == "__main__":
+    tf.test.main()
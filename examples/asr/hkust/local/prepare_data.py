@@ -51,13 +51,16 @@ def normalize_hkust_trans(trans):
     return norm_trans
 
 
-def convert_audio_and_split_transcript(directory, subset, out_csv_file):
+def convert_audio_and_split_transcript(directory, subset, out_csv_file, in_place=False):
     """Convert SPH to WAV and split the transcript.
 
   Args:
     directory: the directory which holds the input dataset.
     subset: the name of the specified dataset. e.g. dev
     out_csv_file: the resulting output csv file
+    in_place: keep the SPH files and write segments as
+      "sph_file:channel:time_start:time_end", which are read directly by
+      ReadWav with fast_read
   """
     gfile = tf.compat.v1.gfile
     sph2pip = os.path.join(os.path.dirname(__file__), "../../../../athena/tools/sph2pipe")
@@ -82,6 +85,18 @@ def convert_audio_and_split_transcript(directory, subset, out_csv_file):
                 sph_file = os.path.join(root, filename)
                 sph_files_dict[sph_key] = sph_file
 
+    def append_transcript(wav_filename, wav_length, transcript, speaker_id):
+        transcript = normalize_hkust_trans(transcript)
+        transcript = text_featurizer.delete_punct(transcript)
+
+        if len(transcript) > 0:
+            for char in transcript:
+                if char in char_dict:
+                    char_dict[char] += 1
+                else:
+                    char_dict[char] = 0
+            files.append((wav_filename, wav_length, transcript, speaker_id))
+
     # Convert all SPH file into WAV format.
     # Generate the JSON file and char dict file.
     with TemporaryDirectory(dir="/tmp-data/tmp/") as output_tmp_wav_dir:
@@ -119,8 +134,18 @@ def convert_audio_and_split_transcript(directory, subset, out_csv_file):
                             channel = 2
                             speaker_id = speaker_B
 
-                        # Convert SPH to split WAV.
                         sph_file = sph_files_dict[sph_key]
+                        if in_place:
+                            sub_wav_file = "{}:{}:{:.2f}:{:.2f}".format(
+                                os.path.abspath(sph_file), channel, time_start, time_end
+                            )
+                            wav_length = int((time_end - time_start) * 1000)
+                            append_transcript(
+                                sub_wav_file, wav_length, transcript, speaker_id
+                            )
+                            continue
+
+                        # Convert SPH to split WAV.
                         wav_file = os.path.join(
                             output_tmp_wav_dir, sph_key + "." + speaker[0] + ".wav"
                         )
@@ -150,24 +175,9 @@ def convert_audio_and_split_transcript(directory, subset, out_csv_file):
                             tfm.build(wav_file, sub_wav_file)
 
                         wav_length = get_wave_file_length(sub_wav_file)
-
-                        transcript = normalize_hkust_trans(transcript)
-                        transcript = text_featurizer.delete_punct(transcript)
-
-                        if len(transcript) > 0:
-                            for char in transcript:
-                                if char in char_dict:
-                                    char_dict[char] += 1
-                                else:
-                                    char_dict[char] = 0
-                            files.append(
-                                (
-                                    os.path.abspath(sub_wav_file),
-                                    wav_length,
-                                    transcript,
-                                    speaker_id,
-                                )
-                            )
+                        append_transcript(
+                            os.path.abspath(sub_wav_file), wav_length, transcript, speaker_id
+                        )
 
     # Write to CSV file which contains three columns:
     # "wav_filename", "wav_length_ms", "labels".
@@ -178,7 +188,7 @@ def convert_audio_and_split_transcript(directory, subset, out_csv_file):
     logging.info("Successfully generated csv file {}".format(out_csv_file))
 
 
-def processor(dircetory, subset, force_process):
+def processor(dircetory, subset, force_process, in_place=False):
     """ download and process """
     if subset not in SUBSETS:
         raise ValueError(subset, "is not in HKUST")
@@ -187,7 +197,7 @@ def processor(dircetory, subset, force_process):
     if not force_process and os.path.exists(subset_csv):
         return subset_csv
     logging.info("Processing the HKUST subset {} in {}".format(subset, dircetory))
-    convert_audio_and_split_transcript(dircetory, subset, subset_csv)
+    convert_audio_and_split_transcript(dircetory, subset, subset_csv, in_place)
     logging.info("Finished processing HKUST subset {}".format(subset))
     return subset_csv
 
@@ -195,9 +205,10 @@ def processor(dircetory, subset, force_process):
 if __name__ == "__main__":
     logging.set_verbosity(logging.INFO)
     if len(sys.argv) < 2:
-        print('Usage: python {} data_dir (data_dir should contain audio and text '
-              'directory: LDC2005S15 and LDC2005T32)'.format(sys.argv[0]))
+        print('Usage: python {} data_dir [--in_place] (data_dir should contain audio and '
+              'text directory: LDC2005S15 and LDC2005T32)'.format(sys.argv[0]))
         exit(1)
     DIR = sys.argv[1]
+    IN_PLACE = "--in_place" in sys.argv[2:]
     for SUBSET in SUBSETS:
-        processor(DIR, SUBSET, True)
+        processor(DIR, SUBSET, True, IN_PLACE)